@@ -1,11 +1,10 @@
 import sys
-from src.secret_scanner.db.database import init_db
 from src.secret_scanner.cli.cli import cli
 
 def main():
     """Entry point for the Secret Scanner application."""
-    # Ensure database tables exist
-    init_db()
+    # The commands that use the database set it up themselves, so `--help`
+    # and `scan --no-db` never load SQLAlchemy
 
     # Pass CLI args through to click
     cli(prog_name="secret-scanner")
@@ -0,0 +1,82 @@
+import argparse
+import json
+import sys
+
+# -------------------
+# Compare two benchmark runs
+# -------------------
+# Reads two results files written by benchmarks.run and flags every metric
+# that got worse by more than the tolerance. Exits with status 1 when there
+# is a regression, so it can gate a CI job.
+
+# metric -> True when a higher value is better
+METRICS = {
+    "files_per_s": True,
+    "mb_per_s": True,
+    "time_to_first_finding": False,
+    "peak_rss_kb": False,
+}
+
+DEFAULT_TOLERANCE = 0.10
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """Return (rows, regressions) comparing two results documents case by case.
+
+    A row is (case, metric, baseline value, current value, relative change),
+    the change being positive when the current run is better.
+    """
+    rows = []
+    regressions = []
+    before = {result["case"]: result for result in baseline["results"]}
+    for result in current["results"]:
+        old = before.get(result["case"])
+        if old is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old_value, new_value = old.get(metric), result.get(metric)
+            if not old_value or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value
+            if not higher_is_better:
+                change = -change
+            row = (result["case"], metric, old_value, new_value, change)
+            rows.append(row)
+            if change < -tolerance:
+                regressions.append(row)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark results files.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative slowdown tolerated before it counts as a regression")
+    args = parser.parse_args(argv)
+
+    baseline, current = _load(args.baseline), _load(args.current)
+    if baseline["corpus"]["settings"] != current["corpus"]["settings"]:
+        print("warning: the runs used different corpora", file=sys.stderr)
+    if baseline["jobs"] != current["jobs"]:
+        print("warning: the runs used different --jobs", file=sys.stderr)
+    if bool(baseline.get("stats")) != bool(current.get("stats")):
+        print("warning: only one of the runs collected --stats, which slows a run down",
+              file=sys.stderr)
+    if baseline["machine"] != current["machine"]:
+        print("warning: the runs were made on different machines or setups", file=sys.stderr)
+
+    rows, regressions = compare(baseline, current, args.tolerance)
+    for case, metric, old_value, new_value, change in rows:
+        flag = "  REGRESSION" if (case, metric, old_value, new_value, change) in regressions else ""
+        print(f"{case:<20}{metric:<24}{old_value:>14,.2f}{new_value:>14,.2f}{change:>+9.1%}{flag}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
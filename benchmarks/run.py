@@ -0,0 +1,283 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+from benchmarks.corpus import add_spec_arguments, generate, spec_from_arguments
+
+# resource is Unix only - without it peak RSS isn't reported
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+# -------------------
+# Scanner benchmarks
+# -------------------
+# Every case scans a synthetic corpus (see corpus.py) and reports files/s,
+# MB/s, time to first finding and peak RSS. Each run of a case happens in a
+# FRESH interpreter, so the peak RSS is that case's own and no warm caches
+# (matchers, imports) carry over from one case to the next.
+#
+#     python -m benchmarks.run --output results.json
+#     python -m benchmarks.compare baseline.json results.json
+#
+# Results are JSON: the machine and corpus they were measured on plus one
+# entry per case, so two runs can be compared and regressions caught.
+
+RESULTS_VERSION = 1
+
+CASES = ("directory", "directory-parallel", "directory-async", "huge-file", "database")
+
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "secret_scanner_corpus")
+
+
+def _peak_rss_kb():
+    """Peak resident set size in KiB of this process or its biggest worker, or None."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux reports KiB, macOS bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _consume(findings, started):
+    """Drain a stream of findings, returning (count, seconds to the first one)."""
+    count = 0
+    first = None
+    for _ in findings:
+        if first is None:
+            first = time.perf_counter() - started
+        count += 1
+    return count, first
+
+
+def _scan_directory(root, jobs):
+    from src.secret_scanner.scanner.scanner import iter_findings
+    from src.secret_scanner.scanner.walk import DEFAULT_EXCLUDES, PathFilter
+
+    path_filter = PathFilter(excludes=DEFAULT_EXCLUDES + ("huge/",))
+    started = time.perf_counter()
+    count, first = _consume(iter_findings(root, jobs=jobs, path_filter=path_filter), started)
+    return time.perf_counter() - started, count, first
+
+
+def _scan_directory_async(root, jobs):
+    from src.secret_scanner.scanner.pipeline import scan_directory_pipelined
+    from src.secret_scanner.scanner.walk import DEFAULT_EXCLUDES, PathFilter
+
+    path_filter = PathFilter(excludes=DEFAULT_EXCLUDES + ("huge/",))
+    counts = {"findings": 0, "first": None}
+    started = time.perf_counter()
+
+    def handle(findings):
+        if counts["first"] is None:
+            counts["first"] = time.perf_counter() - started
+        counts["findings"] += len(findings)
+
+    scan_directory_pipelined(root, handle, jobs, path_filter=path_filter)
+    return time.perf_counter() - started, counts["findings"], counts["first"]
+
+
+def _scan_huge_file(path):
+    from src.secret_scanner.scanner.scanner import iter_findings
+
+    started = time.perf_counter()
+    count, first = _consume(iter_findings(path), started)
+    return time.perf_counter() - started, count, first
+
+
+def _scan_into_database(root):
+    """Scan the corpus and persist every finding the way `scan` does, into a scratch database."""
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+
+    from src.secret_scanner.db.database import Base, _apply_sqlite_pragmas
+    from src.secret_scanner.db.writer import FindingWriter
+    from src.secret_scanner.models.models import Scan
+    from src.secret_scanner.scanner.scanner import iter_findings
+    from src.secret_scanner.scanner.walk import DEFAULT_EXCLUDES, PathFilter
+
+    with tempfile.TemporaryDirectory() as scratch:
+        engine = create_engine(f"sqlite:///{os.path.join(scratch, 'bench.db')}")
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        scan_record = Scan(target_path=root, scan_type="directory")
+        db.add(scan_record)
+        db.commit()
+
+        path_filter = PathFilter(excludes=DEFAULT_EXCLUDES + ("huge/",))
+        started = time.perf_counter()
+        writer = FindingWriter(db, scan_record.id)
+        count, first = _consume(
+            (writer.add(f) for f in iter_findings(root, path_filter=path_filter)), started
+        )
+        writer.flush()
+        db.commit()
+        seconds = time.perf_counter() - started
+        db.close()
+        engine.dispose()
+    return seconds, count, first
+
+
+def _run_case(case, root, huge_file, jobs, collect_stats=False):
+    """Run one case once (in a fresh worker process) and return its raw measurements."""
+    stats = None
+    if collect_stats:
+        from src.secret_scanner.scanner.scanner import use_stats
+        stats = use_stats()
+    if case == "directory":
+        seconds, findings, first = _scan_directory(root, 1)
+    elif case == "directory-parallel":
+        seconds, findings, first = _scan_directory(root, jobs)
+    elif case == "directory-async":
+        seconds, findings, first = _scan_directory_async(root, jobs)
+    elif case == "huge-file":
+        seconds, findings, first = _scan_huge_file(os.path.join(root, huge_file))
+    else:
+        seconds, findings, first = _scan_into_database(root)
+    return {
+        "seconds": seconds,
+        "findings": findings,
+        "time_to_first_finding": first,
+        "peak_rss_kb": _peak_rss_kb(),
+        # The same numbers as `scan --stats` (they slow the run down, so
+        # compare times only between runs made the same way)
+        "stats": stats.snapshot() if stats is not None else None,
+    }
+
+
+def _measure(case, root, manifest, jobs, repeat, collect_stats=False):
+    """Run a case `repeat` times and summarize it. Times are the best of the runs."""
+    runs = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            runs.append(pool.submit(
+                _run_case, case, root, manifest["huge_file"], jobs, collect_stats
+            ).result())
+
+    totals = manifest["totals"]
+    huge_size = os.path.getsize(os.path.join(root, manifest["huge_file"])) if manifest["huge_file"] else 0
+    if case == "huge-file":
+        files, size = 1, huge_size
+    else:
+        files = totals["files"] - (1 if manifest["huge_file"] else 0)
+        size = totals["bytes"] - huge_size
+
+    seconds = min(run["seconds"] for run in runs)
+    firsts = [run["time_to_first_finding"] for run in runs if run["time_to_first_finding"] is not None]
+    peaks = [run["peak_rss_kb"] for run in runs if run["peak_rss_kb"] is not None]
+    return {
+        "case": case,
+        "files": files,
+        "bytes": size,
+        "findings": runs[0]["findings"],
+        "seconds": seconds,
+        "median_seconds": statistics.median(run["seconds"] for run in runs),
+        "files_per_s": files / seconds if seconds else None,
+        "mb_per_s": size / 1e6 / seconds if seconds else None,
+        "time_to_first_finding": min(firsts) if firsts else None,
+        "peak_rss_kb": max(peaks) if peaks else None,
+        "stats": runs[0]["stats"],
+    }
+
+
+def _git_commit():
+    """The commit being benchmarked, if this is a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _optional_modules():
+    """Which optional speed-ups are installed - they change the numbers a lot."""
+    present = {}
+    for name in ("ahocorasick", "numpy"):
+        try:
+            __import__(name)
+            present[name] = True
+        except ImportError:
+            present[name] = False
+    return present
+
+
+def run(root, manifest, cases=CASES, jobs=None, repeat=3, collect_stats=False):
+    """Run the benchmark cases over a generated corpus and return the results document."""
+    jobs = jobs or os.cpu_count()
+    if not manifest["huge_file"]:
+        cases = [case for case in cases if case != "huge-file"]
+    return {
+        "version": RESULTS_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "optional_modules": _optional_modules(),
+        },
+        "jobs": jobs,
+        "repeat": repeat,
+        "corpus": manifest,
+        "stats": collect_stats,
+        "results": [_measure(case, root, manifest, jobs, repeat, collect_stats) for case in cases],
+    }
+
+
+def _format(value, unit=""):
+    return "-" if value is None else f"{value:,.2f}{unit}"
+
+
+def print_table(results, out=sys.stderr):
+    """Print a results document as a human-readable table."""
+    print(f"{'case':<20}{'files/s':>12}{'MB/s':>10}{'first (s)':>11}{'peak RSS (MB)':>15}"
+          f"{'findings':>10}", file=out)
+    for result in results["results"]:
+        rss = result["peak_rss_kb"] / 1024 if result["peak_rss_kb"] is not None else None
+        print(f"{result['case']:<20}{_format(result['files_per_s']):>12}"
+              f"{_format(result['mb_per_s']):>10}{_format(result['time_to_first_finding']):>11}"
+              f"{_format(rss):>15}{result['findings']:>10}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scanner on a synthetic corpus.")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR,
+                        help="where the corpus is generated (reused when its settings match)")
+    parser.add_argument("--case", action="append", choices=CASES, dest="cases",
+                        help="case to run (repeatable, default: all)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="workers for the parallel and async cases (default: one per CPU)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the best time counts")
+    parser.add_argument("--output", help="write the JSON results here instead of to stdout")
+    parser.add_argument("--stats", action="store_true",
+                        help="also record per-stage and per-rule statistics (slows the runs down)")
+    add_spec_arguments(parser)
+    args = parser.parse_args(argv)
+
+    manifest = generate(args.corpus_dir, spec_from_arguments(args))
+    results = run(args.corpus_dir, manifest, args.cases or CASES, args.jobs, args.repeat, args.stats)
+    print_table(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,21 +5,27 @@ from logging.config import fileConfig
 from sqlalchemy import engine_from_config, pool
 from alembic import context
 
-# --- Make 'src' visible so imports like `secret_scanner.models.models` work ---
+# --- Make the project root visible so imports like `src.secret_scanner.models.models` work ---
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-SRC_DIR = os.path.join(BASE_DIR, "src")
-if SRC_DIR not in sys.path:
-    sys.path.insert(0, SRC_DIR)
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
 
 # --- Import your SQLAlchemy metadata (adjust path if your models live elsewhere) ---
+# The same module path the application uses, so the models are only defined once
 try:
-    from secret_scanner.models.models import Base
+    from src.secret_scanner.db import database
+    from src.secret_scanner.models.models import Base
 except Exception as e:
-    raise ImportError(f"Could not import Base from secret_scanner.models.models: {e}")
+    raise ImportError(f"Could not import Base from src.secret_scanner.models.models: {e}")
 
 # Alembic Config object
 config = context.config
 
+# Migrate the database the application uses, unless `alembic -x url=...` names
+# another one. (% is configparser's interpolation character.)
+_url = context.get_x_argument(as_dictionary=True).get("url", database.DATABASE_URL)
+config.set_main_option("sqlalchemy.url", _url.replace("%", "%%"))
+
 # Configure logging from alembic.ini
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
@@ -0,0 +1,35 @@
+"""add performance indexes
+
+Revision ID: 3f9c2b7d41e8
+Revises: b894684ed6dc
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2b7d41e8'
+down_revision: Union[str, Sequence[str], None] = 'b894684ed6dc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases created by init_db() already have these, so only add missing ones
+    op.create_index('ix_scans_user_id', 'scans', ['user_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_findings_scan_id', 'findings', ['scan_id', 'id'], unique=False, if_not_exists=True)
+    op.create_index('ix_findings_file_path', 'findings', ['file_path', 'line_number'], unique=False, if_not_exists=True)
+    op.create_index('ix_findings_secret_type', 'findings', ['secret_type', 'scan_id'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_findings_secret_type', table_name='findings')
+    op.drop_index('ix_findings_file_path', table_name='findings')
+    op.drop_index('ix_findings_scan_id', table_name='findings')
+    op.drop_index('ix_scans_user_id', table_name='scans')
@@ -0,0 +1,144 @@
+"""deduplicate findings by fingerprint
+
+Revision ID: 5d2e8a1c9b73
+Revises: 3f9c2b7d41e8
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2e8a1c9b73'
+down_revision: Union[str, Sequence[str], None] = '3f9c2b7d41e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows fingerprinted per round trip while backfilling
+BATCH = 5000
+
+
+def _fingerprint(secret_type, file_path, secret_value, match_start=None, match_end=None):
+    # Frozen copy of findings.finding_fingerprint() as of this revision
+    if match_start is not None and match_end is not None:
+        secret_value = secret_value[match_start:match_end]
+    secret = " ".join(secret_value.split())
+    return hashlib.sha256("\0".join((secret_type, file_path, secret)).encode("utf-8")).hexdigest()
+
+
+def _span_finder():
+    """Return span(secret_type, line): where the rule matches a stored line, or None.
+
+    Stored rows have no match span, but a rescan fingerprints only the match.
+    So the rule is run again over the stored line, so that the backfilled
+    fingerprint is the one the next scan computes. A row whose rule isn't
+    built in (a rule pack) or no longer matches keeps the whole line as its
+    secret - what finding_fingerprint() falls back to without a span.
+    """
+    from src.secret_scanner.scanner.entropy import ENTROPY_RULE, EntropyDetector
+    from src.secret_scanner.scanner.matcher import Matcher
+    from src.secret_scanner.scanner.scanner import RULE_KEYWORDS, SECRET_PATTERNS
+
+    matcher = Matcher(SECRET_PATTERNS, RULE_KEYWORDS)
+    detector = EntropyDetector()
+
+    def span(secret_type, line):
+        if secret_type == ENTROPY_RULE:
+            spans = detector.find(line)
+            return spans[0] if spans else None
+        if secret_type not in SECRET_PATTERNS:
+            return None
+        for name, start, end in matcher.match_line(line):
+            if name == secret_type:
+                return start, end
+        return None
+    return span
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Batch mode: SQLite can't ALTER a table to add a foreign key
+    with op.batch_alter_table('findings') as batch_op:
+        batch_op.add_column(sa.Column('last_seen_scan_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('fingerprint', sa.String(), nullable=True))
+        batch_op.create_foreign_key('fk_findings_last_seen_scan_id', 'scans', ['last_seen_scan_id'], ['id'])
+    # init_db() may have created the new table already (but never new columns)
+    op.create_table('finding_occurrences',
+    sa.Column('finding_id', sa.Integer(), nullable=False),
+    sa.Column('scan_id', sa.Integer(), nullable=False),
+    sa.Column('line_number', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['finding_id'], ['findings.id'], ),
+    sa.ForeignKeyConstraint(['scan_id'], ['scans.id'], ),
+    sa.PrimaryKeyConstraint('finding_id', 'scan_id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_finding_occurrences_scan_id', 'finding_occurrences', ['scan_id', 'finding_id'], unique=False, if_not_exists=True)
+
+    # Backfill, without ever holding the table in memory: fingerprints are
+    # filled in a page of rows at a time, then SQL keeps the oldest row of every
+    # fingerprint as THE finding, records every row as an occurrence of it and
+    # drops the duplicates
+    bind = op.get_bind()
+    findings = sa.table('findings', sa.column('id'), sa.column('file_path'),
+                        sa.column('secret_type'), sa.column('secret_value'), sa.column('fingerprint'))
+    update = findings.update().where(findings.c.id == sa.bindparam('finding_id')).values(
+        fingerprint=sa.bindparam('new_fingerprint'),
+    )
+    span = _span_finder()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(findings.c.id, findings.c.file_path, findings.c.secret_type, findings.c.secret_value)
+            .where(findings.c.id > last_id).order_by(findings.c.id).limit(BATCH)
+        ).all()
+        if not rows:
+            break
+        bind.execute(update, [
+            {'finding_id': row.id,
+             'new_fingerprint': _fingerprint(row.secret_type, row.file_path, row.secret_value,
+                                             *(span(row.secret_type, row.secret_value) or ()))}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+    # Lookups by fingerprint below would scan the whole table without it
+    op.create_index('ix_findings_fingerprint_backfill', 'findings', ['fingerprint'])
+    # One occurrence per finding and scan, at the line of its latest row
+    bind.execute(sa.text(
+        "INSERT INTO finding_occurrences (finding_id, scan_id, line_number) "
+        "SELECT kept.id, f.scan_id, f.line_number FROM findings f "
+        "JOIN (SELECT fingerprint, MIN(id) AS id FROM findings GROUP BY fingerprint) kept "
+        "ON kept.fingerprint = f.fingerprint "
+        "WHERE f.scan_id IS NOT NULL "
+        "AND f.id IN (SELECT MAX(id) FROM findings GROUP BY fingerprint, scan_id)"
+    ))
+    # The kept row takes the scan and line of the latest sighting
+    latest = "(SELECT MAX(l.id) FROM findings l WHERE l.fingerprint = findings.fingerprint)"
+    bind.execute(sa.text(
+        "UPDATE findings SET "
+        f"last_seen_scan_id = (SELECT s.scan_id FROM findings s WHERE s.id = {latest}), "
+        f"line_number = (SELECT s.line_number FROM findings s WHERE s.id = {latest}) "
+        "WHERE id IN (SELECT MIN(id) FROM findings GROUP BY fingerprint)"
+    ))
+    bind.execute(sa.text(
+        "DELETE FROM findings WHERE id NOT IN (SELECT MIN(id) FROM findings GROUP BY fingerprint)"
+    ))
+    op.drop_index('ix_findings_fingerprint_backfill', table_name='findings')
+
+    op.create_index('ux_findings_fingerprint', 'findings', ['fingerprint'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The duplicate rows dropped by the upgrade are not brought back
+    op.drop_index('ux_findings_fingerprint', table_name='findings')
+    op.drop_index('ix_finding_occurrences_scan_id', table_name='finding_occurrences')
+    op.drop_table('finding_occurrences')
+    with op.batch_alter_table('findings') as batch_op:
+        batch_op.drop_constraint('fk_findings_last_seen_scan_id', type_='foreignkey')
+        batch_op.drop_column('fingerprint')
+        batch_op.drop_column('last_seen_scan_id')
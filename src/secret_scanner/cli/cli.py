@@ -1,7 +1,29 @@
+import cProfile
+import json
+import os
+import time
+
 import click
-from src.secret_scanner.db.database import SessionLocal, init_db
-from src.secret_scanner.scanner.scanner import scan_file
-from src.secret_scanner.models.models import User, Scan, Finding
+from src.secret_scanner.cli.formats import FORMATS, open_output
+from src.secret_scanner.daemon.client import DEFAULT_SOCKET_PATH
+from src.secret_scanner.scanner.archive import DEFAULT_MAX_DEPTH, DEFAULT_MAX_TOTAL_SIZE, ArchiveLimits
+from src.secret_scanner.scanner.cache import DEFAULT_CACHE_PATH, ScanCache
+from src.secret_scanner.scanner.entropy import DEFAULT_THRESHOLDS, MIN_TOKEN_LENGTH, EntropyDetector
+from src.secret_scanner.scanner.redos import DEFAULT_BUDGET, DEFAULT_MAX_LINE, RuleGuard
+from src.secret_scanner.scanner.rules import RulePackError
+from src.secret_scanner.scanner.scanner import (
+    BUILTIN_RISKS, RULE_ALLOWLISTS, RULE_ENTROPY, RULE_KEYWORDS, RULE_RISKS, active_rules,
+    iter_findings, rule_matcher, scan_settings, use_archives, use_entropy_detector, use_guard,
+    use_rule_packs, use_stats,
+)
+from src.secret_scanner.scanner.skipped import take_skipped
+from src.secret_scanner.scanner.stats import format_table
+from src.secret_scanner.scanner.walk import DEFAULT_EXCLUDES, PathFilter
+
+# The database layer (SQLAlchemy, the engine, the models) is imported by the
+# commands that use it, never here: `--help`, `scan --no-db` and the scanner
+# core start without loading SQLAlchemy at all. The same goes for the asyncio
+# pipeline and the git reader, which only some scans need
 
 # Creating a Click GROUP - this is the main entry point for our CLI
 # Groups allow us to organize commands into hierarchies
@@ -13,83 +35,424 @@ def cli():
 # -------------------
 # Existing scan command
 # -------------------
+def _scan_type(target, git_diff, staged, history=False):
+    """Describe what kind of scan is being run, for the Scan record."""
+    if history:
+        return "history"
+    if staged:
+        return "staged"
+    if git_diff:
+        return "git-diff"
+    return "directory" if os.path.isdir(target) else "file"
+
 @cli.command()  # This decorator makes it a direct subcommand of the main group
 @click.argument('target')  # Defines a required command-line argument
-def scan(target):
+@click.option('--jobs', '-j', default=1, show_default=True,
+              help='Worker processes for directory scans (0 = one per CPU)')
+@click.option('--cache', is_flag=True,
+              help='Reuse results for unchanged files from the scan cache')
+@click.option('--cache-file', default=DEFAULT_CACHE_PATH, show_default=True,
+              help='Location of the scan cache')
+@click.option('--git-diff', 'git_diff', metavar='BASE..HEAD',
+              help='Only scan lines added in this commit range of the TARGET repository')
+@click.option('--staged', is_flag=True,
+              help='Only scan lines added in the staged changes of the TARGET repository')
+@click.option('--history', is_flag=True,
+              help='Scan every file version in the git history of the TARGET repository')
+@click.option('--include', 'includes', multiple=True, metavar='GLOB',
+              help='Only scan files matching this .gitignore-style glob (repeatable)')
+@click.option('--exclude', 'excludes', multiple=True, metavar='GLOB',
+              help='Skip files and directories matching this .gitignore-style glob (repeatable)')
+@click.option('--no-default-excludes', is_flag=True,
+              help='Also scan .git/, node_modules/, minified bundles and the like')
+@click.option('--max-file-size', type=click.IntRange(min=0), metavar='BYTES',
+              help='Skip files larger than this')
+@click.option('--rules', 'rule_packs', multiple=True, type=click.Path(dir_okay=False),
+              help='Rule pack (.json, .yaml or .toml) to scan with, on top of the built-in rules (repeatable)')
+@click.option('--no-default-rules', is_flag=True,
+              help='Only use the rules from --rules packs')
+@click.option('--entropy', is_flag=True,
+              help='Also report random-looking base64/hex tokens (high Shannon entropy)')
+@click.option('--entropy-hex', default=DEFAULT_THRESHOLDS["hex"], show_default=True,
+              help='Minimum entropy (bits per character) of a reported hex token')
+@click.option('--entropy-base64', default=DEFAULT_THRESHOLDS["base64"], show_default=True,
+              help='Minimum entropy (bits per character) of a reported base64 token')
+@click.option('--entropy-min-length', default=MIN_TOKEN_LENGTH, show_default=True,
+              type=click.IntRange(min=1), help='Shortest token the entropy detector looks at')
+@click.option('--async-io', is_flag=True,
+              help='Read many files at once through the asyncio pipeline (for slow network mounts)')
+@click.option('--readers', type=click.IntRange(min=1),
+              help='Files read concurrently with --async-io [default: 16]')
+@click.option('--no-archives', is_flag=True,
+              help="Don't look inside .zip/.jar/.whl/.tar.gz/.gz... files")
+@click.option('--archive-depth', default=DEFAULT_MAX_DEPTH, show_default=True,
+              type=click.IntRange(min=1), help='Archives within archives opened, at most')
+@click.option('--archive-max-size', default=DEFAULT_MAX_TOTAL_SIZE, show_default=True,
+              type=click.IntRange(min=1), metavar='BYTES',
+              help='Uncompressed bytes read from one archive at most (guards against zip bombs)')
+@click.option('--guarded', is_flag=True,
+              help='Run rules prone to catastrophic backtracking under a per-line time budget')
+@click.option('--rule-budget', default=DEFAULT_BUDGET * 1000, show_default=True,
+              type=click.FloatRange(min=0, min_open=True), metavar='MS',
+              help='Time a guarded rule may spend on one line (needs the regex module)')
+@click.option('--max-guarded-line', default=DEFAULT_MAX_LINE, show_default=True,
+              type=click.IntRange(min=1), metavar='CHARS',
+              help='Window a guarded rule searches long lines in when neither google-re2 nor regex is installed')
+@click.option('--stats', 'show_stats', is_flag=True,
+              help='Print time per stage and per rule, and files/bytes processed')
+@click.option('--stats-json', type=click.Path(dir_okay=False, writable=True), metavar='FILE',
+              help='Also write the --stats numbers to this JSON file (implies --stats)')
+@click.option('--profile', 'profile_file', type=click.Path(dir_okay=False, writable=True),
+              metavar='FILE', help='Run the scan under cProfile and save the profile here')
+@click.option('--no-db', is_flag=True,
+              help="Don't record the scan in the database - it isn't even opened")
+@click.option('--format', 'output_format', type=click.Choice(FORMATS), default='text',
+              show_default=True,
+              help='Print findings as text, or stream them as a JSON array, JSON Lines, SARIF or CSV')
+@click.option('--output', '-o', 'output_file', type=click.Path(dir_okay=False, writable=True),
+              metavar='FILE', help='Write the --format output to this file instead of stdout')
+@click.option('--gzip', 'compress', is_flag=True,
+              help='Gzip the --format output (implied by an --output name ending in .gz)')
+def scan(target, jobs, cache, cache_file, git_diff, staged, history, includes, excludes,
+         no_default_excludes, max_file_size, rule_packs, no_default_rules, entropy, entropy_hex,
+         entropy_base64, entropy_min_length, async_io, readers, no_archives, archive_depth,
+         archive_max_size, guarded, rule_budget,
+         max_guarded_line, show_stats, stats_json, profile_file, no_db, output_format,
+         output_file, compress):
     """Scan a file or directory for secrets"""
-    click.echo(f"Scanning: {target}")
-    
-    # Initialize database - ensures tables exist before we try to use them
-    init_db()
-    
-    # Create a database SESSION - this is our connection to the database
-    db = SessionLocal()
-    
-    # Check if default user exists, create if not - using SQLAlchemy query
-    # This shows how we use the ORM to interact with the database
-    user = db.query(User).filter(User.username == "default_user").first()
-    if not user:
-        user = User(username="default_user")
-        db.add(user)        # Add to session
-        db.commit()         # Save to database
-        db.refresh(user)    # Refresh with database-generated ID
-    
-    # Create a new SCAN record using the ORM model
-    scan_record = Scan(
-        target_path=target,
-        scan_type="file",
-        user_id=user.id  # Using the Foreign Key relationship
-    )
-    db.add(scan_record)
-    db.commit()
-    db.refresh(scan_record)  # Now scan_record has its database ID
-    
-    # Actually scan the file using our scanner module
-    # This returns a LIST of finding dictionaries
-    findings = scan_file(target)
-    
-    # Process each finding and save to database
-    for finding_data in findings:  # Iterating through the list of findings
-        # Create a Finding object from the dictionary data
-        finding = Finding(
-            scan_id=scan_record.id,  # Foreign Key to the scan
-            file_path=finding_data['file_path'],
-            line_number=finding_data['line_number'],
-            secret_type=finding_data['secret_type'],
-            secret_value=finding_data['secret_value']
+    if output_format == "text" and (output_file or compress):
+        raise click.UsageError("--output and --gzip need a --format other than text")
+    if async_io and (cache or git_diff or staged):
+        raise click.UsageError("--async-io can't be combined with --cache, --git-diff or --staged")
+    if history and (async_io or cache or git_diff or staged):
+        raise click.UsageError("--history can't be combined with --async-io, --cache, --git-diff or --staged")
+    if (guarded or no_archives) and cache:
+        # The cache doesn't know how a file was scanned: a line skipped over
+        # its budget, or an archive not opened, would be cached as clean
+        raise click.UsageError("--guarded and --no-archives can't be combined with --cache")
+    if rule_packs or no_default_rules:
+        # Loaded (from the compiled rule cache when possible) before any record
+        # is created, so a broken pack doesn't leave a half-made scan behind
+        try:
+            use_rule_packs(rule_packs, builtin=not no_default_rules)
+        except RulePackError as exc:
+            raise click.BadParameter(str(exc), param_hint="--rules")
+        _warn_risky_rules(guarded)
+    use_archives(None if no_archives else ArchiveLimits(archive_depth, archive_max_size))
+    if guarded:
+        use_guard(RuleGuard(rule_budget / 1000, max_guarded_line))
+        for name in rule_matcher().disabled:
+            click.echo(f"warning: rule {name!r} is switched off - it can backtrack exponentially "
+                       "and only google-re2 or the regex module can bound it", err=True)
+    if entropy:
+        use_entropy_detector(EntropyDetector(
+            {"hex": entropy_hex, "base64": entropy_base64}, entropy_min_length,
+        ))
+    # Statistics cost nothing unless switched on; workers collect them too
+    stats = use_stats() if show_stats or stats_json else None
+    profiler = cProfile.Profile() if profile_file else None
+    if profiler is not None:
+        profiler.enable()
+    started = time.perf_counter()
+    # Findings in a machine-readable format go to stdout (or --output) as
+    # they are found; the messages for people then go to stderr, so a pipe
+    # only ever sees the document
+    output = output_stream = None
+    if output_format != "text":
+        output_stream = click.open_file(output_file or "-", "wb")
+        compress = compress or bool(output_file and output_file.endswith(".gz"))
+        output = open_output(output_format, output_stream, compress)
+    quiet = output is not None and not output_file
+    click.echo(f"Scanning: {target}", err=quiet)
+
+    db = scan_record = writer = None
+    if not no_db:
+        # Imported here, so `scan --no-db` never loads SQLAlchemy
+        from src.secret_scanner.db.database import SessionLocal, init_db
+        from src.secret_scanner.db.writer import FindingWriter
+        from src.secret_scanner.models.models import Scan, User
+
+        # Initialize database - ensures tables exist before we try to use them
+        # (after the first time, one PRAGMA tells it nothing needs doing)
+        init_db()
+        _require_current_schema()
+
+        # Create a database SESSION - this is our connection to the database
+        db = SessionLocal()
+
+        # Check if default user exists, create if not - using SQLAlchemy query
+        # This shows how we use the ORM to interact with the database
+        user = User.default(db)
+
+        # Create a new SCAN record using the ORM model
+        scan_record = Scan(
+            target_path=target,
+            scan_type=_scan_type(target, git_diff, staged, history),
+            user_id=user.id  # Using the Foreign Key relationship
         )
-        db.add(finding)  # Add each finding to the session
-    
-    db.commit()  # Save all findings at once
-    
-    # Display results to the user
-    if findings:
-        click.echo(f"Found {len(findings)} potential secrets:")
-        for finding in findings:  # Another list iteration for display
-            click.echo(f"  - {finding['secret_type']}: {finding['secret_value']}")
-        click.echo(f"Results saved to database (Scan ID: {scan_record.id})")
+        db.add(scan_record)
+        db.commit()
+        db.refresh(scan_record)  # Now scan_record has its database ID
+        # Save every finding with batched bulk INSERTs instead of one ORM object
+        # per row - the writer reuses the session's connection and transaction
+        writer = FindingWriter(db, scan_record.id)
+
+    # Actually scan the file or directory using our scanner module
+    # The scanner YIELDS finding records as it finds them, so each one is
+    # printed and queued for the database right away; files that couldn't be
+    # read are collected in `errors` instead of aborting the scan
+    errors = []
+    scan_cache = None
+    if cache:
+        # The entropy detector is part of the rule set, so toggling it or
+        # changing its thresholds only reruns the detector; the archive limits
+        # are part of every rule's fingerprint
+        scan_cache = ScanCache(active_rules(), RULE_KEYWORDS, cache_file, RULE_ENTROPY,
+                               RULE_ALLOWLISTS, scan_settings())
+    # Excluded directories are pruned from the walk, filtered files never opened
+    path_filter = PathFilter(
+        includes,
+        (() if no_default_excludes else DEFAULT_EXCLUDES) + excludes,
+        max_file_size,
+    )
+
+    found = 0
+
+    def show(file_path, line_number, secret_type, secret_value, match_start, match_end):
+        nonlocal found
+        if output is not None:
+            output.add(file_path, line_number, secret_type, secret_value, match_start, match_end)
+        else:
+            click.echo(f"  - {secret_type}: {secret_value.strip()}")
+        found += 1
+
+    def record(findings):
+        # Print each finding and queue it for the database as soon as it
+        # arrives (the async pipeline calls this from its sink thread)
+        for finding in findings:
+            show(*finding.astuple())
+            if writer is not None:
+                writer.add(finding)
+
+    def record_batch(batch):
+        # A FindingBatch from the worker processes is printed and saved
+        # straight from its columns - no finding object is ever built
+        for row in batch.rows():
+            show(*row)
+        if writer is not None:
+            writer.add_batch(batch)
+
+    try:
+        if async_io and os.path.isdir(target):
+            # Many reads in flight at once; findings still arrive in walk order
+            from src.secret_scanner.scanner.pipeline import READERS, scan_directory_pipelined
+            scan_directory_pipelined(target, record, jobs, readers or READERS, errors, path_filter)
+        elif git_diff or staged:
+            # Only the lines the change adds, read straight from git
+            from src.secret_scanner.scanner.gitscan import iter_git_diff
+            record(iter_git_diff(target, git_diff, staged, path_filter))
+        elif history:
+            # Every blob ever committed, each scanned once, reported as
+            # <commit>:<path> at the commit that introduced it
+            from src.secret_scanner.scanner.history import scan_history_batches
+            for batch in scan_history_batches(target, jobs or os.cpu_count(), errors, path_filter):
+                record_batch(batch)
+        elif jobs != 1 and os.path.isdir(target):
+            # Worker processes send their findings back in columnar batches
+            from src.secret_scanner.scanner.parallel import scan_directory_parallel_batches
+            for batch in scan_directory_parallel_batches(target, jobs or os.cpu_count(), errors,
+                                                         scan_cache, path_filter):
+                record_batch(batch)
+        else:
+            record(iter_findings(target, jobs=jobs, errors=errors, cache=scan_cache,
+                                 path_filter=path_filter))
+        if writer is not None:
+            writer.flush()
+    except BaseException as exc:
+        # Whatever stopped the scan (Ctrl-C included), its record must not
+        # stay "completed" with only part of the findings
+        if db is not None:
+            _mark_failed(db, scan_record)
+        if isinstance(exc, RuntimeError):
+            raise click.ClickException(str(exc))
+        raise
+    finally:
+        if scan_cache is not None:
+            scan_cache.close()
+        if output is not None:
+            # Even a failed scan leaves a complete document behind
+            output.close()
+            output_stream.close()
+    # Single files and git diffs leave their skipped lines with the scanner
+    errors.extend(take_skipped())
+    for path, reason in errors:
+        click.echo(f"Skipped {path}: {reason}", err=True)
+
+    if db is not None:
+        commit_started = time.perf_counter()
+        try:
+            db.commit()  # Save all findings at once
+        except BaseException:
+            _mark_failed(db, scan_record)
+            raise
+        if stats is not None:
+            stats.add_stage("db", time.perf_counter() - commit_started)
+
+    # Display a summary to the user
+    if found:
+        click.echo(f"Found {found} potential secrets.", err=quiet)
+        if scan_record is not None:
+            click.echo(f"Results saved to database (Scan ID: {scan_record.id})", err=quiet)
     else:
-        click.echo("No secrets found!")
-    
-    db.close()  # Always clean up our database connection
+        click.echo("No secrets found!", err=quiet)
+
+    if db is not None:
+        db.close()  # Always clean up our database connection
+    _report(stats, time.perf_counter() - started, stats_json, profiler, profile_file)
+
+
+def _mark_failed(db, scan_record):
+    """Drop a scan's uncommitted findings and mark its record as failed."""
+    db.rollback()
+    scan_record.status = "failed"
+    db.commit()
+    db.close()
+
+
+def _require_current_schema():
+    """Stop with a readable message if the database still needs a migration."""
+    from src.secret_scanner.db.database import SchemaOutdatedError, check_schema
+    try:
+        check_schema()
+    except SchemaOutdatedError as exc:
+        raise click.ClickException(str(exc))
+
+
+def _warn_risky_rules(guarded):
+    """Warn about rule pack rules that are prone to catastrophic backtracking."""
+    for name, risks in RULE_RISKS.items():
+        if BUILTIN_RISKS.get(name) == risks:
+            continue  # only pack rules - the built-in ones are known
+        level, reason = risks[0]
+        hint = "" if guarded else " (consider --guarded)"
+        click.echo(f"warning: rule {name!r} risks {level} backtracking: {reason}{hint}", err=True)
+
+
+def _report(stats, wall, stats_json, profiler, profile_file):
+    """Print/save the --stats numbers and save the --profile data."""
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(profile_file)
+        click.echo(f"Profile saved to {profile_file} (view it with: python -m pstats {profile_file})",
+                   err=True)
+    if stats is None:
+        return
+    data = stats.snapshot()
+    click.echo("", err=True)
+    for line in format_table(data, wall):
+        click.echo(line, err=True)
+    if stats_json:
+        with open(stats_json, "w", encoding="utf-8") as f:
+            json.dump(dict(data, wall_seconds=wall), f, indent=2)
+
+
+# -------------------
+# Scan daemon
+# -------------------
+@cli.command()
+@click.argument('roots', nargs=-1, type=click.Path(exists=True, file_okay=False))
+@click.option('--socket', 'socket_path', default=DEFAULT_SOCKET_PATH, show_default=True,
+              help='Unix socket to answer scan requests on')
+@click.option('--cache', is_flag=True,
+              help='Keep results in the scan cache too, so a restarted daemon warms up fast')
+@click.option('--cache-file', default=DEFAULT_CACHE_PATH, show_default=True,
+              help='Location of the scan cache database')
+@click.option('--include', 'includes', multiple=True, metavar='GLOB',
+              help='Only scan files matching this glob (repeatable)')
+@click.option('--exclude', 'excludes', multiple=True, metavar='GLOB',
+              help='Skip files and directories matching this glob (repeatable)')
+@click.option('--no-default-excludes', is_flag=True,
+              help='Also scan .git/, node_modules/, minified bundles and the like')
+@click.option('--max-file-size', type=click.IntRange(min=0), metavar='BYTES',
+              help='Skip files larger than this')
+@click.option('--rules', 'rule_packs', multiple=True, type=click.Path(dir_okay=False),
+              help='Load extra rules from a JSON, YAML or TOML rule pack (repeatable)')
+@click.option('--no-default-rules', is_flag=True,
+              help='Only use the rules from --rules packs')
+@click.option('--entropy', is_flag=True,
+              help='Also report random-looking base64/hex tokens')
+def serve(roots, socket_path, cache, cache_file, includes, excludes, no_default_excludes,
+          max_file_size, rule_packs, no_default_rules, entropy):
+    """Keep rules, database and results warm, answering scan requests on a Unix socket.
+
+    ROOTS (default: the current directory) are scanned once and then watched;
+    later requests only rescan the files that changed. Send requests with
+    `python -m src.secret_scanner.daemon.client TARGET`.
+    """
+    if rule_packs or no_default_rules:
+        try:
+            use_rule_packs(rule_packs, builtin=not no_default_rules)
+        except RulePackError as exc:
+            raise click.BadParameter(str(exc), param_hint="--rules")
+        _warn_risky_rules(False)
+    if entropy:
+        use_entropy_detector(EntropyDetector())
+    # The daemon keeps the database layer loaded; the schema is checked once
+    from src.secret_scanner.daemon.server import ScanDaemon, serve as serve_daemon
+    from src.secret_scanner.db.database import init_db
+    init_db()
+    _require_current_schema()
+
+    path_filter = PathFilter(
+        includes,
+        (() if no_default_excludes else DEFAULT_EXCLUDES) + excludes,
+        max_file_size,
+    )
+    scan_cache = None
+    if cache:
+        scan_cache = ScanCache(active_rules(), RULE_KEYWORDS, cache_file, RULE_ENTROPY,
+                               RULE_ALLOWLISTS, scan_settings())
+    roots = roots or (".",)
+    started = time.perf_counter()
+    click.echo(f"Scanning {', '.join(roots)}...")
+    daemon = ScanDaemon(roots, path_filter, scan_cache)
+    for tree in daemon.trees:
+        how = "inotify" if tree.watcher.fileno() is not None else "polling"
+        click.echo(f"Watching {tree.root} ({len(tree.results)} files, {how})")
+    try:
+        serve_daemon(daemon, socket_path, ready=lambda path: click.echo(
+            f"Ready in {time.perf_counter() - started:.2f}s, listening on {path}"
+        ))
+    except (RuntimeError, OSError) as exc:
+        raise click.ClickException(str(exc))
+    finally:
+        daemon.close()
+    click.echo("Scan daemon stopped.")
 
 
 # -------------------
 # Minimal CRUD commands
 # -------------------
 
+def _init_db():
+    """Load the database layer and make sure its tables exist (for the CRUD groups)."""
+    # Runs when a subcommand is invoked, not for `--help`
+    from src.secret_scanner.db.database import init_db
+    init_db()
+
+
 # --- User Commands ---
 # Creating a SUBGROUP for user-related commands
 @cli.group()
 def user():
     """Manage users"""
-    pass
+    _init_db()
 
 # 'user create' command - demonstrates CREATE operation
 @user.command("create")
 @click.argument("username")
 def create_user(username):
-    init_db()
+    from src.secret_scanner.models.models import User
     # Using our model's class method for clean abstraction
     user = User.create(username=username)
     click.echo(f"User created: {user.username} (ID: {user.id})")
@@ -97,7 +460,7 @@ def create_user(username):
 # 'user list' command - demonstrates READ operation
 @user.command("list")
 def list_users():
-    init_db()
+    from src.secret_scanner.models.models import User
     users = User.get_all()  # Returns a LIST of User objects
     if not users:
         click.echo("No users found.")
@@ -108,6 +471,7 @@ def list_users():
 @user.command("delete")
 @click.argument("user_id", type=int)  # Type conversion for safety
 def delete_user(user_id):
+    from src.secret_scanner.models.models import User
     User.delete(user_id)
     click.echo(f"User with ID {user_id} deleted (if existed).")
 
@@ -116,19 +480,25 @@ def delete_user(user_id):
 @cli.group()
 def scanmgr():
     """Manage scans"""
-    pass
+    _init_db()
 
 @scanmgr.command("list")
-def list_scans():
-    scans = Scan.get_all()  # LIST of Scan objects
-    if not scans:
-        click.echo("No scans found.")
-    for s in scans:  # List iteration with formatted output
+@click.option("--path-prefix", help="Only scans whose target path starts with this")
+@click.option("--since", type=click.DateTime(), help="Only scans created at or after this time")
+def list_scans(path_prefix, since):
+    from src.secret_scanner.models.models import Scan
+    # Rows are streamed page by page, so the first ones print right away
+    found = False
+    for s in Scan.stream(path_prefix=path_prefix, since=since):
+        found = True
         click.echo(f"{s.id}: Path={s.target_path}, UserID={s.user_id}, Status={s.status}")
+    if not found:
+        click.echo("No scans found.")
 
 @scanmgr.command("delete")
 @click.argument("scan_id", type=int)
 def delete_scan(scan_id):
+    from src.secret_scanner.models.models import Scan
     Scan.delete(scan_id)
     click.echo(f"Scan with ID {scan_id} deleted (if existed).")
 
@@ -137,21 +507,38 @@ def delete_scan(scan_id):
 @cli.group()
 def finding():
     """Manage findings"""
-    pass
+    _init_db()
 
 @finding.command("list")
-def list_findings():
-    findings = Finding.get_all()  # LIST of Finding objects
-    if not findings:
-        click.echo("No findings found.")
-    for f in findings:  # Complex string formatting for clear output
-        click.echo(
-            f"{f.id}: ScanID={f.scan_id}, File={f.file_path}, "
+@click.option("--scan-id", type=int, help="Only findings seen by this scan")
+@click.option("--new", is_flag=True,
+              help="Only findings first seen by the --scan-id scan (default: the latest scan)")
+@click.option("--type", "secret_type", help="Only findings of this secret type")
+@click.option("--path-prefix", help="Only findings in files whose path starts with this")
+@click.option("--since", type=click.DateTime(), help="Only findings created at or after this time")
+def list_findings(scan_id, new, secret_type, path_prefix, since):
+    from src.secret_scanner.models.models import Finding, Scan
+    _require_current_schema()
+    if new and scan_id is None:
+        latest = Scan.latest()
+        if latest is None:
+            click.echo("No scans found.")
+            return
+        scan_id = latest.id
+    # Rows are streamed page by page, so memory stays flat however big the history is
+    found = False
+    for f in Finding.stream(scan_id, secret_type, path_prefix, since, new):
+        found = True
+        click.echo(  # Complex string formatting for clear output
+            f"{f.id}: ScanID={f.scan_id}, LastSeenScanID={f.last_seen_scan_id}, File={f.file_path}, "
             f"Line={f.line_number}, Type={f.secret_type}"
         )
+    if not found:
+        click.echo("No findings found.")
 
 @finding.command("delete")
 @click.argument("finding_id", type=int)
 def delete_finding(finding_id):
+    from src.secret_scanner.models.models import Finding
     Finding.delete(finding_id)
     click.echo(f"Finding with ID {finding_id} deleted (if existed).")
\ No newline at end of file
@@ -0,0 +1,236 @@
+import csv
+import gzip
+import json
+import os
+import threading
+from urllib.parse import quote
+
+from src.secret_scanner.scanner.findings import TRUNCATED, finding_fingerprint
+
+# -------------------
+# Machine-readable scan output
+# -------------------
+# `scan --format json|jsonl|sarif|csv` writes each finding the moment the
+# scanner yields it, so a CI job can start on the first findings while the
+# scan goes on. Text goes through a small buffer that is written out (and
+# flushed to the file or pipe) every BUFFER_SIZE characters - one write per
+# buffer instead of one per finding. When findings trickle in, a timer writes
+# the buffer out at most FLUSH_INTERVAL after it was started, even while the
+# scan is busy between findings. With gzip every flush is a sync point, so
+# what has been written so far can already be decompressed.
+#
+# Every format is a complete document once the output is closed: json is an
+# array, jsonl one object per line, csv a header and one row per finding, and
+# sarif a SARIF 2.1.0 log for code scanning tools.
+
+FORMATS = ("text", "json", "jsonl", "sarif", "csv")
+
+# Keys of a finding written by json, jsonl and csv
+JSON_FIELDS = ("file_path", "line_number", "secret_type", "secret_value")
+
+# Characters collected before they are written out
+BUFFER_SIZE = 64 * 1024
+# Seconds a finding may wait in the buffer, so slow scans still stream
+FLUSH_INTERVAL = 0.5
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+TOOL_NAME = "secret-scanner"
+
+
+def _json_finding(file_path, line_number, secret_type, secret_value):
+    """A finding as the JSON object json and jsonl write."""
+    # The line without its indentation, as the database stores it
+    return json.dumps(dict(zip(JSON_FIELDS, (file_path, line_number, secret_type, secret_value.strip()))))
+
+
+class FindingOutput:
+    """Writes findings to a binary stream as they arrive, buffered and optionally gzipped."""
+
+    def __init__(self, stream, compress=False):
+        self._stream = stream
+        # mtime=0 keeps the output of identical scans byte for byte identical
+        self._gzip = gzip.GzipFile(fileobj=stream, mode="wb", mtime=0) if compress else None
+        self._pending = []
+        self._size = 0
+        # The timer flushes from its own thread, so the buffer is shared
+        self._lock = threading.Lock()
+        self._timer = None
+        self._timer_error = None  # what a timed flush raised, for the scan thread
+        self._closed = False
+        self.count = 0
+
+    def write(self, text):
+        """Queue text for the output (file-like, so csv.writer can write here too)."""
+        with self._lock:
+            self._raise_timer_error()
+            self._pending.append(text)
+            self._size += len(text)
+            if self._size >= BUFFER_SIZE:
+                self._flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(FLUSH_INTERVAL, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._raise_timer_error()
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            data = "".join(self._pending).encode("utf-8")
+            self._pending = []
+            self._size = 0
+            (self._gzip or self._stream).write(data)
+        if self._gzip is not None:
+            self._gzip.flush()
+        self._stream.flush()
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+            if self._closed or self._timer_error is not None:
+                return
+            try:
+                self._flush()
+            except Exception as exc:
+                # A closed pipe, a full disk... the scan thread raises it
+                self._timer_error = exc
+
+    def _raise_timer_error(self):
+        if self._timer_error is not None:
+            error, self._timer_error = self._timer_error, None
+            raise error
+
+    def add(self, file_path, line_number, secret_type, secret_value, match_start=None, match_end=None):
+        """Write one finding."""
+        self._add(file_path, line_number, secret_type, secret_value, match_start, match_end)
+        self.count += 1
+
+    def _add(self, file_path, line_number, secret_type, secret_value, match_start, match_end):
+        raise NotImplementedError
+
+    def _finish(self):
+        """Write what closes the document."""
+
+    def close(self):
+        """Finish the document and write out everything still buffered."""
+        self._finish()
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._raise_timer_error()
+            self._flush()
+        if self._gzip is not None:
+            self._gzip.close()  # writes the gzip trailer; the stream stays open
+            self._stream.flush()
+
+
+class JsonOutput(FindingOutput):
+    """A JSON array, streamed element by element."""
+
+    def __init__(self, stream, compress=False):
+        super().__init__(stream, compress)
+        self.write("[")
+
+    def _add(self, file_path, line_number, secret_type, secret_value, match_start, match_end):
+        self.write(("\n  " if not self.count else ",\n  ")
+                   + _json_finding(file_path, line_number, secret_type, secret_value))
+
+    def _finish(self):
+        self.write("\n]\n" if self.count else "]\n")
+
+
+class JsonLinesOutput(FindingOutput):
+    """One JSON object per line (JSON Lines)."""
+
+    def _add(self, file_path, line_number, secret_type, secret_value, match_start, match_end):
+        self.write(_json_finding(file_path, line_number, secret_type, secret_value) + "\n")
+
+
+class CsvOutput(FindingOutput):
+    """A header row, then one row per finding."""
+
+    def __init__(self, stream, compress=False):
+        super().__init__(stream, compress)
+        self._writer = csv.writer(self)
+        self._writer.writerow(JSON_FIELDS)
+
+    def _add(self, file_path, line_number, secret_type, secret_value, match_start, match_end):
+        self._writer.writerow((file_path, line_number, secret_type, secret_value.strip()))
+
+
+def _artifact_uri(path):
+    """A finding's file as a SARIF artifact URI."""
+    path = path.replace(os.sep, "/")
+    if path.startswith("./"):
+        path = path[2:]
+    if path.startswith("/"):
+        return "file://" + quote(path)
+    return quote(path)
+
+
+class SarifOutput(FindingOutput):
+    """A SARIF 2.1.0 log with one result per finding.
+
+    The secret itself is left out of the result message - SARIF logs tend to
+    be uploaded to code scanning dashboards - and is identified by its
+    fingerprint, the same one the database uses.
+
+    Columns are the character columns the scanner reports, declared as
+    unicodeCodePoints (SARIF otherwise assumes UTF-16 code units). A value
+    cut out of a longer line has columns that don't count from the start of
+    the line, so its region is the line alone.
+    """
+
+    def __init__(self, stream, compress=False):
+        super().__init__(stream, compress)
+        self._rules = {}  # rule name -> ruleIndex, in order of first finding
+        # The results come first and the tool (with the rules that were hit)
+        # last: JSON objects are unordered, and this way nothing is held back
+        self.write('{"$schema": %s, "version": "2.1.0", "runs": [{"results": ['
+                   % json.dumps(SARIF_SCHEMA))
+
+    def _add(self, file_path, line_number, secret_type, secret_value, match_start, match_end):
+        rule_index = self._rules.setdefault(secret_type, len(self._rules))
+        region = {"startLine": line_number}
+        if match_start is not None and match_end is not None and not secret_value.startswith(TRUNCATED):
+            region["startColumn"] = match_start + 1  # SARIF columns are 1-based
+            region["endColumn"] = match_end + 1
+        result = {
+            "ruleId": secret_type,
+            "ruleIndex": rule_index,
+            "level": "error",
+            "message": {"text": f"Potential {secret_type} found"},
+            "locations": [{"physicalLocation": {
+                "artifactLocation": {"uri": _artifact_uri(file_path)},
+                "region": region,
+            }}],
+            "partialFingerprints": {
+                "secretFingerprint/v1": finding_fingerprint(
+                    secret_type, file_path, secret_value, match_start, match_end),
+            },
+        }
+        self.write(("\n" if not self.count else ",\n") + json.dumps(result))
+
+    def _finish(self):
+        rules = [{"id": name, "shortDescription": {"text": name}} for name in self._rules]
+        self.write('\n], "columnKind": "unicodeCodePoints", '
+                   '"tool": {"driver": {"name": %s, "rules": %s}}}]}\n'
+                   % (json.dumps(TOOL_NAME), json.dumps(rules)))
+
+
+_OUTPUTS = {
+    "json": JsonOutput,
+    "jsonl": JsonLinesOutput,
+    "csv": CsvOutput,
+    "sarif": SarifOutput,
+}
+
+
+def open_output(output_format, stream, compress=False):
+    """Return the FindingOutput of a machine-readable format, writing to a binary stream."""
+    return _OUTPUTS[output_format](stream, compress)
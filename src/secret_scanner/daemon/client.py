@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import socket
+import sys
+
+# -------------------
+# Scan daemon client
+# -------------------
+# A deliberately THIN client for `secret-scanner serve`: it imports nothing but
+# the standard library (no SQLAlchemy, no rules), so an editor-on-save hook or
+# a pre-commit check costs Python startup plus one round trip to the daemon.
+#
+#     python -m src.secret_scanner.daemon.client path/to/file.py
+#
+# The protocol is one JSON object per line in each direction over a Unix
+# socket: {"op": "scan", "target": ..., "cwd": ..., "record": true} is
+# answered with {"target": ..., "findings": [...], "errors": [...], ...}.
+
+# Next to the scan history database and the scan cache
+DEFAULT_SOCKET_PATH = "./.secret_scanner.sock"
+
+
+class DaemonUnavailable(Exception):
+    """No scan daemon is listening on the socket."""
+
+
+def request(payload, socket_path=DEFAULT_SOCKET_PATH, timeout=None):
+    """Send one request to the daemon and return its (decoded) response."""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        try:
+            client.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError) as exc:
+            raise DaemonUnavailable(f"no scan daemon at {socket_path}: {exc.strerror}")
+        client.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+        with client.makefile("rb") as reader:
+            line = reader.readline()
+    finally:
+        client.close()
+    if not line:
+        raise DaemonUnavailable(f"the scan daemon at {socket_path} closed the connection")
+    return json.loads(line)
+
+
+def scan(target, socket_path=DEFAULT_SOCKET_PATH, record=True, timeout=None):
+    """Have the daemon scan a file or directory. Relative targets are resolved here."""
+    return request(
+        {"op": "scan", "target": target, "cwd": os.getcwd(), "record": record},
+        socket_path, timeout,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="secret-scanner-client",
+        description="Scan a file or directory through a running `secret-scanner serve` daemon",
+    )
+    parser.add_argument("target", nargs="?", help="file or directory to scan")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH,
+                        help="Unix socket of the daemon (default: %(default)s)")
+    parser.add_argument("--no-record", action="store_true",
+                        help="Don't save a scan record and its findings to the database")
+    parser.add_argument("--stop", action="store_true", help="Stop the daemon")
+    args = parser.parse_args(argv)
+    if not args.stop and args.target is None:
+        parser.error("a target is required")
+
+    try:
+        if args.stop:
+            request({"op": "stop"}, args.socket)
+            return 0
+        response = scan(args.target, args.socket, record=not args.no_record)
+    except DaemonUnavailable as exc:
+        print(f"Error: {exc} - start one with `python app.py serve`", file=sys.stderr)
+        return 2
+    if "error" in response:
+        print(f"Error: {response['error']}", file=sys.stderr)
+        return 1
+
+    # The same output as `python app.py scan`
+    print(f"Scanning: {args.target}")
+    for finding in response["findings"]:
+        print(f"  - {finding['secret_type']}: {finding['secret_value'].strip()}")
+    for path, reason in response["errors"]:
+        print(f"Skipped {path}: {reason}", file=sys.stderr)
+    if response["findings"]:
+        print(f"Found {len(response['findings'])} potential secrets.")
+        if response["scan_id"] is not None:
+            print(f"Results saved to database (Scan ID: {response['scan_id']})")
+    else:
+        print("No secrets found!")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+import json
+import os
+import selectors
+import signal
+import socket
+import time
+
+from src.secret_scanner.daemon.client import DEFAULT_SOCKET_PATH
+from src.secret_scanner.db.database import SessionLocal
+from src.secret_scanner.db.writer import FindingWriter
+from src.secret_scanner.models.models import Scan, User
+from src.secret_scanner.scanner.scanner import WALK_PREFETCH, iter_findings, scan_file
+from src.secret_scanner.scanner.skipped import take_skipped
+from src.secret_scanner.scanner.walk import FileStat, PathFilter, iter_files
+from src.secret_scanner.scanner.watch import watch
+
+# -------------------
+# Long-running scan daemon
+# -------------------
+# Every `python app.py scan` pays for Python startup, the SQLAlchemy import,
+# init_db() and rule compilation before it reads a byte, and then reads every
+# file again. `secret-scanner serve` pays all of that ONCE: it scans the
+# watched trees at start-up and keeps each file's findings in memory, with the
+# rules compiled and the database engine connected. A watcher (inotify, or
+# polling where that's not available) tells it which files changed, and only
+# those are scanned again, so answering a request usually means rescanning
+# the one file an editor just saved.
+#
+# Requests are served one at a time over a Unix socket (see client.py for the
+# protocol). Targets outside the watched trees still work - they get a plain
+# scan, with everything else warm.
+
+# Longest a client may take to send its request
+REQUEST_TIMEOUT = 30
+# Pending connections queued by the kernel while a request is being served
+BACKLOG = 16
+
+
+class _Tree:
+    """One watched directory: its watcher and the findings of every file in it."""
+
+    def __init__(self, root, path_filter):
+        self.root = root
+        self.watcher = watch(root, path_filter)
+        # Absolute file path -> (findings, skipped lines/members). Insertion
+        # order is the walk order, so directory results come out like a scan
+        self.results = {}
+
+    def contains(self, path):
+        return path == self.root or path.startswith(self.root + os.sep)
+
+
+class ScanDaemon:
+    """The daemon's warm state, kept current with the watchers."""
+
+    def __init__(self, roots, path_filter=None, cache=None):
+        self.path_filter = path_filter or PathFilter()
+        self.cache = cache
+        # The watchers start BEFORE the initial walk, so nothing written while
+        # it runs goes unnoticed - at worst such a file is scanned twice
+        self.trees = [_Tree(os.path.abspath(root), self.path_filter) for root in roots]
+        for tree in self.trees:
+            for path, st in iter_files(tree.root, self.path_filter, prefetch=WALK_PREFETCH):
+                self._scan(tree, path, st)
+        if self.cache is not None:
+            self.cache.commit()
+        self.stopped = False
+
+    def _scan(self, tree, path, st):
+        """(Re)scan one file and keep its results."""
+        try:
+            if self.cache is not None:
+                findings = self.cache.scan(path, scan_file, st)
+            else:
+                findings = scan_file(path, size=st.st_size if st is not None else None)
+        except (OSError, UnicodeError) as exc:
+            findings, skipped = [], [(path, str(exc))]
+        else:
+            skipped = take_skipped()
+        tree.results[path] = (findings, skipped)
+
+    def _wanted(self, tree, path):
+        """Return the stat of a changed path if it is a file to scan, else None."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        relpath = os.path.relpath(path, tree.root).replace(os.sep, "/")
+        st = FileStat(st.st_size, st.st_mtime_ns, st.st_ino)
+        if not self.path_filter.includes_file(relpath) or not self.path_filter.within_size(st):
+            return None
+        return st
+
+    def refresh(self, tree):
+        """Rescan what changed in a tree since the last refresh. Returns the number of files."""
+        changed = tree.watcher.changes()
+        if tree.watcher.overflowed:
+            # Events were lost: re-check every file, old and new. Unchanged
+            # ones come from the scan cache if there is one
+            tree.watcher.overflowed = False
+            changed.update(tree.results)
+            changed.update(path for path, _ in iter_files(tree.root, self.path_filter))
+
+        rescanned = 0
+        for path in changed:
+            if os.path.isdir(path):
+                continue  # its files are reported one by one
+            st = self._wanted(tree, path)
+            if st is not None:
+                self._scan(tree, path, st)
+                rescanned += 1
+            elif tree.results.pop(path, None) is None:
+                # Not a file we knew: maybe a directory that went away
+                prefix = path + os.sep
+                for gone in [p for p in tree.results if p.startswith(prefix)]:
+                    del tree.results[gone]
+        if rescanned and self.cache is not None:
+            self.cache.commit()
+        return rescanned
+
+    def _tree_of(self, path):
+        for tree in self.trees:
+            if tree.contains(path):
+                return tree
+        return None
+
+    def scan(self, target, cwd, record=True):
+        """Answer a scan request for a file or directory."""
+        started = time.perf_counter()
+        absolute = os.path.abspath(os.path.join(cwd, target))
+        if not os.path.exists(absolute):
+            # A mistyped path must not look like a clean one
+            return {"error": f"no such file or directory: {target}"}
+        tree = self._tree_of(absolute)
+        rescanned = None
+        if tree is None:
+            # Outside the watched trees: a plain scan, with rules and DB warm
+            errors = []
+            findings = [
+                finding.replace(file_path=self._as_given(finding.file_path, absolute, target))
+                for finding in iter_findings(absolute, errors=errors, path_filter=self.path_filter)
+            ]
+            errors.extend(take_skipped())
+        else:
+            rescanned = self.refresh(tree)
+            findings, errors = self._collect(tree, absolute, target)
+
+        scan_id = self._record(target, absolute, findings) if record else None
+        return {
+            "target": target,
+            "findings": [finding.as_dict() for finding in findings],
+            "errors": errors,
+            "scan_id": scan_id,
+            "rescanned": rescanned,
+            "seconds": time.perf_counter() - started,
+        }
+
+    def _collect(self, tree, absolute, target):
+        """Gather the kept findings for a target, with paths as the client gave it."""
+        if absolute in tree.results:
+            selected = [(absolute, tree.results[absolute])]
+        else:
+            prefix = absolute + os.sep
+            selected = [(p, r) for p, r in tree.results.items() if p.startswith(prefix)]
+        findings = []
+        errors = []
+        for path, (file_findings, skipped) in selected:
+            findings.extend(
+                finding.replace(file_path=self._as_given(finding.file_path, absolute, target))
+                for finding in file_findings
+            )
+            errors.extend((self._as_given(p, absolute, target), reason) for p, reason in skipped)
+        return findings, errors
+
+    @staticmethod
+    def _as_given(path, absolute, target):
+        """Rewrite an absolute path below the target the way `scan target` reports it."""
+        # `scan .` reports ./src/x.py and `scan /abs` /abs/src/x.py - findings
+        # keep the same paths (and so the same fingerprints) either way
+        suffix = path[len(absolute):]
+        if target.endswith(os.sep) and suffix.startswith(os.sep):
+            suffix = suffix[1:]
+        return target + suffix
+
+    def _record(self, target, absolute, findings):
+        """Save a scan record and its findings, like `python app.py scan` does."""
+        db = SessionLocal()
+        try:
+            user = User.default(db)
+            scan_record = Scan(
+                target_path=target,
+                scan_type="directory" if os.path.isdir(absolute) else "file",
+                user_id=user.id,
+            )
+            db.add(scan_record)
+            db.commit()
+            db.refresh(scan_record)
+            try:
+                writer = FindingWriter(db, scan_record.id)
+                writer.add_all(findings)
+                writer.flush()
+                db.commit()
+            except Exception:
+                # Keep the record, marked as failed, and answer with the error
+                db.rollback()
+                scan_record.status = "failed"
+                db.commit()
+                raise
+            return scan_record.id
+        finally:
+            db.close()
+
+    def handle(self, request):
+        """Dispatch one decoded request and return the response."""
+        if not isinstance(request, dict):
+            return {"error": "a request must be a JSON object"}
+        op = request.get("op", "scan")
+        if op == "stop":
+            self.stopped = True
+            return {"stopped": True}
+        if op == "scan":
+            if not isinstance(request.get("target"), str):
+                return {"error": "a scan request needs a target"}
+            return self.scan(request["target"], request.get("cwd") or os.getcwd(),
+                             request.get("record", True))
+        return {"error": f"unknown request {op!r}"}
+
+    def close(self):
+        for tree in self.trees:
+            tree.watcher.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+def _listen(socket_path):
+    """Bind the daemon's socket, replacing a stale one left by a daemon that died."""
+    if os.path.exists(socket_path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(socket_path)
+        else:
+            raise RuntimeError(f"a scan daemon is already listening on {socket_path}")
+        finally:
+            probe.close()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)  # findings are secrets - only this user may ask
+    server.listen(BACKLOG)
+    return server
+
+
+def _serve_connection(daemon, conn):
+    """Read one request line, answer it and close the connection."""
+    conn.settimeout(REQUEST_TIMEOUT)
+    with conn, conn.makefile("rwb") as stream:
+        try:
+            line = stream.readline()
+            if not line:
+                return
+            try:
+                request = json.loads(line)
+            except ValueError as exc:
+                response = {"error": f"malformed request: {exc}"}
+            else:
+                try:
+                    response = daemon.handle(request)
+                except Exception as exc:
+                    # A scan or database write that fails answers this request
+                    # with the error, it doesn't take the daemon down
+                    response = {"error": f"{type(exc).__name__}: {exc}"}
+            stream.write(json.dumps(response).encode("utf-8") + b"\n")
+            stream.flush()
+        except OSError:
+            pass  # the client went away or timed out - the daemon carries on
+
+
+def serve(daemon, socket_path=DEFAULT_SOCKET_PATH, ready=None):
+    """Answer requests until a stop request, SIGTERM or Ctrl-C.
+
+    `ready(socket_path)` is called once the socket accepts connections.
+    """
+    server = _listen(socket_path)
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    # inotify descriptors become readable as events arrive: changed files are
+    # rescanned while the daemon is idle, and the kernel queue can't overflow
+    for tree in daemon.trees:
+        if tree.watcher.fileno() is not None:
+            selector.register(tree.watcher.fileno(), selectors.EVENT_READ, tree)
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+    previous = signal.signal(signal.SIGTERM, terminate)
+    try:
+        if ready is not None:
+            ready(socket_path)
+        while not daemon.stopped:
+            for key, _ in selector.select():
+                if key.data is not None:
+                    daemon.refresh(key.data)
+                else:
+                    conn, _ = server.accept()
+                    _serve_connection(daemon, conn)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+        selector.close()
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
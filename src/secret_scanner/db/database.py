@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # -------------------
@@ -7,19 +8,73 @@ from sqlalchemy.orm import sessionmaker, declarative_base
 # Using a STRING constant for the database URL - SQLite in this case
 DATABASE_URL = "sqlite:///./secret_scanner.db"
 
-# Creating the database ENGINE - this is the main connection point to the database
-# The engine manages connection pooling and translates Python to SQL commands
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False}  # Required for SQLite to work in multi-threaded apps
-)
+# Version stamped into a SQLite file (PRAGMA user_version) once its schema has
+# been checked - bump it with every migration, so older files are checked again
+SCHEMA_VERSION = 2
+
+# The database ENGINE - this is the main connection point to the database
+# The engine manages connection pooling and translates Python to SQL commands.
+# It is created on first use (see get_engine), so importing this module
+# doesn't connect anything
+_engine = None
+
+# -------------------
+# SQLite performance profile
+# -------------------
+# PRAGMAs applied to every new connection. Using a DICTIONARY keeps the
+# settings in one place: pragma name -> value
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",     # readers and a writer no longer block each other
+    "synchronous": "NORMAL",   # safe with WAL and avoids an fsync per commit
+    "cache_size": -64000,      # 64 MB page cache (negative values are in KiB)
+    "temp_store": "MEMORY",    # sorts and temp indexes stay in memory
+    "busy_timeout": 30000,     # parallel scans wait up to 30 s for the write lock
+}
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the performance PRAGMAs as soon as SQLite opens a connection."""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def get_engine():
+    """Return the database engine, creating it the first time."""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(
+            DATABASE_URL,
+            connect_args={
+                "check_same_thread": False,  # Required for SQLite to work in multi-threaded apps
+                "timeout": 30,               # Wait for other writers instead of failing right away
+            }
+        )
+        event.listen(_engine, "connect", _apply_sqlite_pragmas)
+        SessionLocal.configure(bind=_engine)  # Bind the session maker to our engine
+    return _engine
+
+
+def __getattr__(name):
+    # `database.engine` keeps working, and only then creates the engine
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _LazySessionmaker(sessionmaker):
+    """A session maker that creates the engine when the first session is opened."""
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            get_engine()
+        return super().__call__(**local_kw)
+
 
 # Creating a SESSION FACTORY - this generates new database sessions
 # Sessions are like conversations with the database where we can execute queries
-SessionLocal = sessionmaker(
+SessionLocal = _LazySessionmaker(
     autocommit=False,    # Don't auto-commit after every operation
     autoflush=False,     # Don't auto-flush changes to database
-    bind=engine          # Bind this session maker to our engine
 )
 
 # BASE CLASS for all our SQLAlchemy models - this is the foundation
@@ -29,14 +84,66 @@ Base = declarative_base()
 # -------------------
 # Init + helpers
 # -------------------
+# create_all() and the schema check each cost several queries, and a pre-commit
+# hook may run the scanner thousands of times. Once a SQLite file has passed
+# the check it is stamped with SCHEMA_VERSION, and later runs only read that
+# stamp. Within one process each is done at most once either way
+
+# Set once the schema is known to be current in this process
+_schema_checked = False
+
+
+def _schema_stamped():
+    """Tell whether the database file was already checked at SCHEMA_VERSION."""
+    engine = get_engine()
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.connect() as connection:
+        return connection.exec_driver_sql("PRAGMA user_version").scalar() == SCHEMA_VERSION
+
+
 def init_db():
     """Create tables if they don't exist."""
+    global _schema_checked
     # Importing models here to ensure they're registered with Base before table creation
     import src.secret_scanner.models.models  # ensure models are imported
-    
+
+    if _schema_checked:
+        return
+    if _schema_stamped():
+        _schema_checked = True
+        return
+
     # This creates ALL tables defined by models that inherit from Base
     # metadata.create_all() is smart - it only creates tables that don't exist
-    Base.metadata.create_all(bind=engine)
+    try:
+        Base.metadata.create_all(bind=get_engine())
+    except OperationalError:
+        # Another scan created the tables at the same moment; a second pass
+        # only creates whatever is still missing
+        Base.metadata.create_all(bind=get_engine())
+
+class SchemaOutdatedError(RuntimeError):
+    """The database was created by an older version and needs its migrations."""
+
+
+def check_schema():
+    """Raise SchemaOutdatedError if the findings table predates finding deduplication."""
+    global _schema_checked
+    if _schema_checked:
+        return
+    engine = get_engine()
+    # create_all() adds missing tables but never missing columns
+    columns = {column["name"] for column in inspect(engine).get_columns("findings")}
+    if "fingerprint" not in columns:
+        raise SchemaOutdatedError(
+            f"the schema of {engine.url.render_as_string(hide_password=True)} is out of date"
+            " - upgrade it with `alembic upgrade head`"
+        )
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as connection:
+            connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    _schema_checked = True
 
 def get_db():
     """Provide a database session (for use in context managers)."""
@@ -53,6 +160,6 @@ def get_db():
 def reset_db():
     """Drop and recreate all tables (for development/testing)."""
     # First drop ALL tables - be careful, this destroys all data!
-    Base.metadata.drop_all(bind=engine)
+    Base.metadata.drop_all(bind=get_engine())
     # Then recreate them fresh - useful for testing or development resets
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=get_engine())
\ No newline at end of file
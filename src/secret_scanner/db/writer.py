@@ -0,0 +1,119 @@
+import time
+from datetime import datetime
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.secret_scanner.models.models import Finding, FindingOccurrence, finding_fingerprint
+from src.secret_scanner.scanner.stats import current_stats
+
+# -------------------
+# Bulk finding writer
+# -------------------
+# Building one ORM object per finding and adding it to the session costs far
+# more than the INSERT itself. This writer collects plain row DICTIONARIES and
+# sends them with one executemany() call per batch and statement (Core, so
+# whatever paramstyle the driver uses), all inside the caller's transaction.
+# Only one batch is ever held in memory.
+#
+# Findings are deduplicated by fingerprint (of the matched secret, see
+# finding_fingerprint()): each batch is UPSERTED into the
+# findings table (a finding seen before only gets its last sighting updated)
+# and then linked to the scan in finding_occurrences.
+
+# How many rows are sent to the database per executemany() call
+BATCH_SIZE = 5000
+
+# Dialects with an INSERT ... ON CONFLICT statement
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+class FindingWriter:
+    """Streams finding records and FindingBatches into the findings tables in bounded batches."""
+
+    def __init__(self, db, scan_id, batch_size=BATCH_SIZE):
+        # Reuse the session's connection so everything lands in ONE transaction
+        self.connection = db.connection()
+        dialect = self.connection.dialect
+        insert = _UPSERT_INSERTS.get(dialect.name)
+        if insert is None:
+            raise RuntimeError(f"finding deduplication needs SQLite or PostgreSQL, not {dialect.name}")
+
+        # Both statements are built once and executed with a list of dicts
+        # per batch. SQLAlchemy caches their compiled form
+        # 1. A finding seen before keeps its first scan and gets the latest sighting
+        findings = Finding.__table__
+        upsert = insert(findings)
+        self.upsert = upsert.on_conflict_do_update(
+            index_elements=[findings.c.fingerprint],
+            set_={
+                "last_seen_scan_id": upsert.excluded.last_seen_scan_id,
+                "line_number": upsert.excluded.line_number,
+            },
+        )
+
+        # 2. The scan's occurrence, found through the fingerprint's unique index
+        sighting = select(
+            findings.c.id, bindparam("scan_id"), bindparam("line_number"),
+        ).where(findings.c.fingerprint == bindparam("fingerprint"))
+        occurrence = insert(FindingOccurrence.__table__).from_select(
+            ["finding_id", "scan_id", "line_number"], sighting,
+        )
+        self.occurrence = occurrence.on_conflict_do_nothing(index_elements=["finding_id", "scan_id"])
+
+        # Every finding of a scan shares one timestamp
+        self.created_at = datetime.utcnow()
+
+        self.scan_id = scan_id
+        self.batch_size = batch_size
+        # Current batch of findings rows, one per fingerprint: the driver may
+        # send a batch as ONE multi-row INSERT, and PostgreSQL refuses to
+        # update a row twice in one INSERT ... ON CONFLICT
+        self.rows = {}
+        self.occurrences = []   # ...and of occurrence parameters, one per finding
+        self.count = 0   # total findings written so far
+
+    def add(self, finding):
+        """Queue one finding record, sending a batch once it is full."""
+        self._add(*finding.astuple())
+
+    def add_all(self, findings):
+        """Queue every finding from an iterable."""
+        for finding in findings:
+            self.add(finding)
+
+    def add_batch(self, batch):
+        """Queue every finding of a FindingBatch, read straight from its columns."""
+        for row in batch.rows():
+            self._add(*row)
+
+    def _add(self, file_path, line_number, secret_type, secret_value, match_start, match_end):
+        fingerprint = finding_fingerprint(secret_type, file_path, secret_value, match_start, match_end)
+        self.rows[fingerprint] = {
+            "scan_id": self.scan_id,
+            "last_seen_scan_id": self.scan_id,
+            "fingerprint": fingerprint,
+            "file_path": file_path,
+            "line_number": line_number,
+            "secret_type": secret_type,
+            "secret_value": secret_value.strip(),  # stored without the line's indentation
+            "created_at": self.created_at,
+        }
+        self.occurrences.append({
+            "fingerprint": fingerprint, "scan_id": self.scan_id, "line_number": line_number,
+        })
+        if len(self.occurrences) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send the queued rows to the database (the caller commits)."""
+        if self.rows:
+            started = time.perf_counter()
+            self.connection.execute(self.upsert, list(self.rows.values()))
+            self.connection.execute(self.occurrence, self.occurrences)
+            stats = current_stats()
+            if stats is not None:
+                stats.add_stage("db", time.perf_counter() - started)
+            self.count += len(self.occurrences)
+            self.rows = {}
+            self.occurrences = []
@@ -1,12 +1,46 @@
 # --- SQLAlchemy imports for defining models ---
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from src.secret_scanner.db.database import SessionLocal
+from src.secret_scanner.db.database import SessionLocal, Base
+# Computed without the database too (SARIF output), so it lives with the records
+from src.secret_scanner.scanner.findings import finding_fingerprint
 
-# Base class for all models
-Base = declarative_base()
+# Base class for all models comes from database.py, so init_db() creates
+# these tables (and their indexes) on a fresh database
+
+# How many rows each page of a streamed listing loads
+PAGE_SIZE = 1000
+
+
+def _stream_pages(cls, filters, page_size=PAGE_SIZE):
+    """Yield rows of a model in id order, one page at a time (keyset pagination)."""
+    # Instead of .all() (every row in memory) or OFFSET (slower each page), each
+    # page continues after the last id seen. Every page uses a short-lived
+    # session, so no read transaction stays open while the caller prints rows
+    last_id = 0
+    while True:
+        db = SessionLocal()
+        page = (
+            db.query(cls)
+            .filter(cls.id > last_id, *filters)
+            .order_by(cls.id)
+            .limit(page_size)
+            .all()
+        )
+        db.close()
+        if not page:
+            return
+        yield from page
+        last_id = page[-1].id
+
+
+def _path_prefix_filter(column, prefix):
+    """Return a 'starts with' filter that can still use the column's index."""
+    # LIKE 'prefix%' is case-insensitive in SQLite and skips the index,
+    # a plain range comparison doesn't
+    return [column >= prefix, column < prefix + "\uffff"]
 
 
 # --- USER MODEL ---
@@ -31,6 +65,24 @@ class User(Base):
         db.close()
         return user
 
+    @classmethod
+    def default(cls, db):
+        """Return the "default_user" that scans are recorded for, creating it if needed."""
+        # Takes the caller's session, so the scan it is about to create can
+        # use the user's id right away
+        user = db.query(cls).filter(cls.username == "default_user").first()
+        if not user:
+            user = cls(username="default_user")
+            db.add(user)
+            try:
+                db.commit()
+                db.refresh(user)  # refresh with database-generated ID
+            except IntegrityError:
+                # Another scan running at the same time created it first
+                db.rollback()
+                user = db.query(cls).filter(cls.username == "default_user").first()
+        return user
+
     @classmethod
     def get_all(cls):
         db = SessionLocal()
@@ -58,6 +110,9 @@ class User(Base):
 # --- SCAN MODEL ---
 class Scan(Base):
     __tablename__ = 'scans'   # maps to "scans" table
+    __table_args__ = (
+        Index('ix_scans_user_id', 'user_id'),   # scans of a user
+    )
 
     id = Column(Integer, primary_key=True)
     target_path = Column(String, nullable=False)    # Path scanned
@@ -66,7 +121,8 @@ class Scan(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     user_id = Column(Integer, ForeignKey('users.id'))   # Foreign Key → users.id
     user = relationship('User', back_populates='scans') # Many-to-one: Scan -> User
-    findings = relationship('Finding', back_populates='scan') # One-to-many: Scan -> Findings
+    # One-to-many: Scan -> Findings it was the first to find
+    findings = relationship('Finding', back_populates='scan', foreign_keys='Finding.scan_id')
 
     # CRUD helper methods
     @classmethod
@@ -86,6 +142,24 @@ class Scan(Base):
         db.close()
         return scans
 
+    @classmethod
+    def stream(cls, path_prefix=None, since=None):
+        """Yield scans page by page, with the filters applied in SQL."""
+        filters = []
+        if path_prefix:
+            filters.extend(_path_prefix_filter(cls.target_path, path_prefix))
+        if since:
+            filters.append(cls.created_at >= since)
+        return _stream_pages(cls, filters)
+
+    @classmethod
+    def latest(cls):
+        """Return the most recent scan, or None."""
+        db = SessionLocal()
+        scan = db.query(cls).order_by(cls.id.desc()).first()
+        db.close()
+        return scan
+
     @classmethod
     def find_by_id(cls, scan_id):
         db = SessionLocal()
@@ -98,36 +172,63 @@ class Scan(Base):
         db = SessionLocal()
         scan = db.query(cls).filter_by(id=scan_id).first()
         if scan:
+            db.query(FindingOccurrence).filter_by(scan_id=scan_id).delete()
             db.delete(scan)
             db.commit()
         db.close()
 
 
 # --- FINDING MODEL ---
+# A finding is stored ONCE, however many scans see it: it is identified by a
+# FINGERPRINT of the rule, the file and the secret, which has a unique index.
+# Every scan that sees it again only adds a row to finding_occurrences, so the
+# table grows with the number of distinct secrets, not with the number of scans.
+
 class Finding(Base):
     __tablename__ = 'findings'   # maps to "findings" table
+    # Indexes for the common lookups - without them every query scans the whole table
+    __table_args__ = (
+        Index('ix_findings_scan_id', 'scan_id', 'id'),                   # findings new in one scan, in order
+        Index('ix_findings_file_path', 'file_path', 'line_number'),      # findings in a file / under a path
+        Index('ix_findings_secret_type', 'secret_type', 'scan_id'),      # findings of one type
+        Index('ux_findings_fingerprint', 'fingerprint', unique=True),    # one row per distinct finding
+    )
 
     id = Column(Integer, primary_key=True)
-    scan_id = Column(Integer, ForeignKey('scans.id'))   # Foreign Key → scans.id
+    scan_id = Column(Integer, ForeignKey('scans.id'))   # Foreign Key → scans.id (first seen)
+    last_seen_scan_id = Column(Integer, ForeignKey('scans.id'))  # latest scan that saw it
+    fingerprint = Column(String)                        # see finding_fingerprint()
     file_path = Column(String, nullable=False)          # file where secret found
-    line_number = Column(Integer)                       # line number in file
+    line_number = Column(Integer)                       # line number in file (latest sighting)
     secret_type = Column(String, nullable=False)        # e.g. "API Key"
     secret_value = Column(String, nullable=False)       # the actual secret
     created_at = Column(DateTime, default=datetime.utcnow)
-    scan = relationship('Scan', back_populates='findings') # Many-to-one: Finding -> Scan
+    # Many-to-one: Finding -> Scan that found it first
+    scan = relationship('Scan', back_populates='findings', foreign_keys=[scan_id])
+    occurrences = relationship('FindingOccurrence', back_populates='finding')  # One-to-many: every sighting
 
     # CRUD helper methods
     @classmethod
-    def create(cls, scan_id, file_path, line_number, secret_type, secret_value):
+    def create(cls, scan_id, file_path, line_number, secret_type, secret_value,
+               match_start=None, match_end=None):
+        """Record a sighting of a finding, creating it only if it is new."""
         db = SessionLocal()
-        finding = cls(
-            scan_id=scan_id,
-            file_path=file_path,
-            line_number=line_number,
-            secret_type=secret_type,
-            secret_value=secret_value
-        )
-        db.add(finding)
+        fingerprint = finding_fingerprint(secret_type, file_path, secret_value, match_start, match_end)
+        finding = db.query(cls).filter_by(fingerprint=fingerprint).first()
+        if finding is None:
+            finding = cls(
+                scan_id=scan_id,
+                fingerprint=fingerprint,
+                file_path=file_path,
+                secret_type=secret_type,
+                secret_value=secret_value.strip()
+            )
+            db.add(finding)
+            db.flush()  # assigns finding.id
+        finding.line_number = line_number
+        finding.last_seen_scan_id = scan_id
+        occurrence = FindingOccurrence(finding_id=finding.id, scan_id=scan_id, line_number=line_number)
+        db.merge(occurrence)  # a second sighting in the same scan only moves the line
         db.commit()
         db.refresh(finding)
         db.close()
@@ -140,6 +241,28 @@ class Finding(Base):
         db.close()
         return findings
 
+    @classmethod
+    def stream(cls, scan_id=None, secret_type=None, path_prefix=None, since=None, new=False):
+        """Yield findings page by page, with the filters applied in SQL.
+
+        With a scan_id, yields the findings that scan saw - or, with `new`,
+        only those it was the first to see.
+        """
+        filters = []
+        if scan_id is not None and new:
+            filters.append(cls.scan_id == scan_id)
+        elif scan_id is not None:
+            # The occurrences' (scan_id, finding_id) index answers this
+            seen = select(FindingOccurrence.finding_id).where(FindingOccurrence.scan_id == scan_id)
+            filters.append(cls.id.in_(seen))
+        if secret_type:
+            filters.append(cls.secret_type == secret_type)
+        if path_prefix:
+            filters.extend(_path_prefix_filter(cls.file_path, path_prefix))
+        if since:
+            filters.append(cls.created_at >= since)
+        return _stream_pages(cls, filters)
+
     @classmethod
     def find_by_id(cls, finding_id):
         db = SessionLocal()
@@ -152,6 +275,21 @@ class Finding(Base):
         db = SessionLocal()
         finding = db.query(cls).filter_by(id=finding_id).first()
         if finding:
+            db.query(FindingOccurrence).filter_by(finding_id=finding_id).delete()
             db.delete(finding)
             db.commit()
         db.close()
+
+
+# --- FINDING OCCURRENCE MODEL ---
+class FindingOccurrence(Base):
+    __tablename__ = 'finding_occurrences'   # one row per (finding, scan that saw it)
+    __table_args__ = (
+        Index('ix_finding_occurrences_scan_id', 'scan_id', 'finding_id'),   # findings seen by one scan
+    )
+
+    # The composite primary key doubles as the "scans that saw a finding" index
+    finding_id = Column(Integer, ForeignKey('findings.id'), primary_key=True)
+    scan_id = Column(Integer, ForeignKey('scans.id'), primary_key=True)
+    line_number = Column(Integer)   # where this scan saw it
+    finding = relationship('Finding', back_populates='occurrences')
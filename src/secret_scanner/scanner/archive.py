@@ -0,0 +1,216 @@
+import importlib
+import io
+import os
+
+from src.secret_scanner.scanner.skipped import note_skipped
+from src.secret_scanner.scanner.walk import SNIFF_SIZE, looks_binary
+
+# -------------------
+# Archive and compressed-file scanning
+# -------------------
+# Artifact stores are full of .zip/.jar/.whl and .tar.gz files whose text
+# members (config files, .properties, scripts) can hold secrets. Their members
+# are STREAMED straight out of the archive into the line scanner - nothing is
+# ever extracted to disk. A finding in a member is reported under the path
+#
+#     path/to/build.zip!conf/app.properties     (nested: a.zip!lib/b.jar!x.yml)
+#
+# Archives within archives are opened up to a maximum depth; they have to be
+# held in memory (zipfile needs to seek), so only ones up to max_nested_size.
+# Every uncompressed byte read counts against max_total_size for the outermost
+# archive, so a zip bomb stops the moment it has produced that much.
+#
+# A damaged member is recorded as skipped and the archive goes on with the
+# next one; damage that breaks the archive itself (a corrupt tar stream)
+# skips the rest of it. Either way the scan carries on with the next file.
+
+# File name suffixes -> how the file is opened. Checked longest first, so
+# ".tar.gz" wins over ".gz"
+ARCHIVE_SUFFIXES = {
+    ".zip": "zip", ".jar": "zip", ".war": "zip", ".ear": "zip", ".whl": "zip",
+    ".apk": "zip", ".nupkg": "zip",
+    ".tar": "tar", ".tar.gz": "tar", ".tgz": "tar", ".tar.bz2": "tar", ".tbz2": "tar",
+    ".tar.xz": "tar", ".txz": "tar",
+    ".gz": "gzip", ".bz2": "bz2", ".xz": "xz",
+}
+_SUFFIXES = tuple(sorted(ARCHIVE_SUFFIXES, key=len, reverse=True))
+
+# Single-file compression formats -> the module that opens a stream. The
+# archive modules are only imported once an archive turns up (see _modules)
+_DECOMPRESSORS = {"gzip": "gzip", "bz2": "bz2", "xz": "lzma"}
+
+DEFAULT_MAX_DEPTH = 3
+DEFAULT_MAX_TOTAL_SIZE = 1024 * 1024 * 1024
+DEFAULT_MAX_NESTED_SIZE = 64 * 1024 * 1024
+
+
+def archive_kind(path):
+    """Return "zip", "tar", "gzip", "bz2" or "xz" for an archive name, None for other files."""
+    name = path.lower()
+    if not name.endswith(_SUFFIXES):
+        return None  # one C-level check for the common case
+    for suffix in _SUFFIXES:
+        if name.endswith(suffix):
+            return ARCHIVE_SUFFIXES[suffix]
+    return None
+
+
+class ArchiveLimitExceeded(Exception):
+    """An archive produced more uncompressed data than the limits allow."""
+
+
+class ArchiveLimits:
+    """How deep and how much of an archive is scanned."""
+
+    def __init__(self, max_depth=DEFAULT_MAX_DEPTH, max_total_size=DEFAULT_MAX_TOTAL_SIZE,
+                 max_nested_size=DEFAULT_MAX_NESTED_SIZE):
+        self.max_depth = max_depth              # archives within archives opened, at most
+        self.max_total_size = max_total_size    # uncompressed bytes read per outermost archive
+        self.max_nested_size = max_nested_size  # largest nested archive held in memory
+
+    def describe(self):
+        """A stable description of the limits, part of the scan cache's rule fingerprints."""
+        return "archives:%d:%d:%d" % (self.max_depth, self.max_total_size, self.max_nested_size)
+
+
+class _Budget:
+    """Uncompressed bytes still allowed for one outermost archive."""
+
+    def __init__(self, limit):
+        self.left = limit
+
+    def spend(self, amount):
+        self.left -= amount
+        if self.left < 0:
+            raise ArchiveLimitExceeded()
+
+
+class _MemberStream(io.RawIOBase):
+    """A member's stream with its sniffed head put back, charged to the budget."""
+
+    def __init__(self, head, stream, budget):
+        self._head = head
+        self._stream = stream
+        self._budget = budget
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._head:
+            size = min(len(buffer), len(self._head))
+            buffer[:size] = self._head[:size]
+            self._head = self._head[size:]
+            return size
+        data = self._stream.read(len(buffer))
+        self._budget.spend(len(data))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _modules():
+    """Import the archive and compression modules: (zipfile, tarfile, lzma)."""
+    import zipfile
+    import tarfile
+    import lzma
+    return zipfile, tarfile, lzma
+
+
+def _damage_errors():
+    """Exceptions a damaged, encrypted or unsupported archive raises while it is read."""
+    import zlib
+    zipfile, tarfile, lzma = _modules()
+    # zlib.error is what a corrupt deflate stream (.gz, .tgz, zip members)
+    # raises, and it is not an OSError
+    return (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError, lzma.LZMAError,
+            zlib.error, NotImplementedError, RuntimeError)
+
+
+def _members(kind, source, name):
+    """Yield (member name, stream) for the regular members of an opened archive."""
+    zipfile, tarfile, _ = _modules()
+    if kind == "zip":
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as stream:
+                        yield info.filename, stream
+    elif kind == "tar":
+        # "r|*" reads the archive front to back as a stream, whatever its
+        # compression, so even a huge .tar.gz is never seeked or buffered
+        with tarfile.open(fileobj=source, mode="r|*") as archive:
+            for info in archive:
+                if info.isfile():
+                    stream = archive.extractfile(info)
+                    yield info.name, stream
+    else:
+        # A compressed single file: its member is the name without the suffix
+        member = os.path.basename(name.rsplit("!", 1)[-1])
+        member = member[:member.lower().rfind(".")] or member
+        decompressor = importlib.import_module(_DECOMPRESSORS[kind])
+        with decompressor.open(source) as stream:
+            yield member, stream
+
+
+def _walk(kind, source, path, scan, limits, budget, depth):
+    """Yield the findings of every text member of an archive opened as `source`."""
+    damaged = _damage_errors()
+    for name, stream in _members(kind, source, path):
+        member_path = f"{path}!{name}"
+        try:
+            yield from _walk_member(name, stream, member_path, scan, limits, budget, depth)
+        except damaged as exc:
+            # Findings before the damage were reported already
+            note_skipped(member_path, f"unreadable archive member: {exc}")
+
+
+def _walk_member(name, stream, member_path, scan, limits, budget, depth):
+    """Yield the findings of one member: a text file, or a nested archive."""
+    nested = archive_kind(name)
+    if nested is not None:
+        if depth >= limits.max_depth:
+            note_skipped(member_path, f"archive nested deeper than {limits.max_depth} levels")
+            return
+        # Nested archives are read into memory, zipfile has to seek
+        data = stream.read(limits.max_nested_size + 1)
+        budget.spend(len(data))
+        if len(data) > limits.max_nested_size:
+            note_skipped(member_path, f"nested archive larger than {limits.max_nested_size} bytes")
+            return
+        yield from _open(nested, io.BytesIO(data), member_path, scan, limits, budget, depth + 1)
+        return
+
+    head = stream.read(SNIFF_SIZE)
+    budget.spend(len(head))
+    if looks_binary(head):
+        return  # .class files, images... nothing worth reporting
+    yield from scan(member_path, io.BufferedReader(_MemberStream(head, stream, budget)))
+
+
+def _open(kind, source, path, scan, limits, budget, depth):
+    """Walk one archive, turning a damaged archive into a skip note."""
+    try:
+        yield from _walk(kind, source, path, scan, limits, budget, depth)
+    except _damage_errors() as exc:
+        # Corrupt or encrypted archives and unsupported compression methods
+        # lose what is left of them, not the rest of the scan
+        note_skipped(path, f"unreadable archive: {exc}")
+
+
+def iter_archive(path, scan, limits, data=None):
+    """Yield the findings of every text member of an archive.
+
+    `scan(member_path, stream)` turns one member's binary stream into
+    findings. The archive is read from disk, or from `data` when it is
+    already in memory. Binary members are left out, and whatever is past the
+    limits is recorded with note_skipped().
+    """
+    kind = archive_kind(path)
+    budget = _Budget(limits.max_total_size)
+    source = io.BytesIO(data) if data is not None else open(path, "rb")
+    try:
+        yield from _open(kind, source, path, scan, limits, budget, 1)
+    except ArchiveLimitExceeded:
+        note_skipped(path, f"archive stopped after {limits.max_total_size} uncompressed bytes")
+    finally:
+        source.close()
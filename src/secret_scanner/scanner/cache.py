@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+from src.secret_scanner.scanner.findings import FindingRecord
+
+# -------------------
+# Persistent scan-result cache
+# -------------------
+# Findings are cached per file CONTENT (a hash of the bytes) together with the
+# set of rules the content was checked with. A cheap (inode, size, mtime) check
+# tells us a file is unchanged, so its findings are replayed without opening it.
+#
+# Every rule has its own fingerprint, so when the rule set changes only the new
+# or edited rules have to run again - findings of untouched rules are kept and
+# findings of removed rules are dropped.
+#
+# Settings that change what every rule finds - the archive limits - are part of
+# every fingerprint too, so changing them rescans everything.
+#
+# The cache is a small sidecar SQLite file next to the scan history database.
+
+DEFAULT_CACHE_PATH = "./.secret_scanner_cache.db"
+
+# Commit the cache every this many stored files
+COMMIT_EVERY = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contents (
+    content_hash TEXT PRIMARY KEY,
+    ruleset_hash TEXT NOT NULL,
+    findings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rulesets (
+    ruleset_hash TEXT PRIMARY KEY,
+    rules TEXT NOT NULL
+);
+"""
+
+
+def rule_fingerprint(name, pattern, keywords=None, entropy=None, allowlist=None, settings=None):
+    """Return a short stable fingerprint of one rule.
+
+    `settings` describes the scanner set-up the rule runs with (see
+    scanner.scan_settings()).
+    """
+    parts = [name, pattern, sorted(keywords or [])]
+    # Only rules with extra checks fingerprint them, so plain rules keep the
+    # fingerprints (and cached results) they always had
+    if entropy is not None or allowlist:
+        parts += [entropy, list(allowlist or [])]
+    if settings is not None:
+        parts.append(settings)
+    data = json.dumps(parts)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+
+
+def hash_file(path):
+    """Return a hash of the file's contents, read in 1 MiB blocks."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_bytes(data):
+    """Return the hash_file() hash of contents already in memory (bytes or a memory map)."""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def _stat_key(st):
+    """The (inode, size, mtime) triple used to spot unchanged files."""
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class ScanCache:
+    """Sidecar cache of findings keyed by content hash and rule fingerprints."""
+
+    def __init__(self, patterns, keywords=None, path=DEFAULT_CACHE_PATH, entropy=None,
+                 allowlists=None, settings=None):
+        keywords = keywords or {}
+        entropy = entropy or {}
+        allowlists = allowlists or {}
+        self.patterns = patterns
+        # Rule name -> fingerprint, and back again for replaying findings
+        self.rule_fps = {
+            name: rule_fingerprint(
+                name, pattern, keywords.get(name), entropy.get(name), allowlists.get(name),
+                settings,
+            )
+            for name, pattern in patterns.items()
+        }
+        self._names = {fp: name for name, fp in self.rule_fps.items()}
+        # Position of each rule, used to keep findings in scan order
+        self._order = {name: index for index, name in enumerate(patterns)}
+        self.ruleset_hash = hashlib.sha1(
+            "".join(sorted(self.rule_fps.values())).encode("utf-8")
+        ).hexdigest()[:16]
+        # Rule sets seen in the cache, loaded on demand
+        self._rulesets = {self.ruleset_hash: set(self.rule_fps.values())}
+        self._pending = 0
+
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_SCHEMA)
+        self.db.execute(
+            "INSERT OR IGNORE INTO rulesets (ruleset_hash, rules) VALUES (?, ?)",
+            (self.ruleset_hash, json.dumps(sorted(self.rule_fps.values()))),
+        )
+
+    def _ruleset(self, ruleset_hash):
+        """Return the set of rule fingerprints a cached entry was checked with."""
+        if ruleset_hash not in self._rulesets:
+            row = self.db.execute(
+                "SELECT rules FROM rulesets WHERE ruleset_hash = ?", (ruleset_hash,)
+            ).fetchone()
+            self._rulesets[ruleset_hash] = set(json.loads(row[0])) if row else set()
+        return self._rulesets[ruleset_hash]
+
+    def _resolve(self, path, ruleset_hash, findings_json):
+        """Split a cached entry into (still valid findings, rule names to run again)."""
+        if ruleset_hash is None:
+            return [], list(self.patterns)
+
+        findings = json.loads(findings_json)
+        if ruleset_hash == self.ruleset_hash:
+            missing = []
+        else:
+            checked = self._ruleset(ruleset_hash)
+            missing = [name for name, fp in self.rule_fps.items() if fp not in checked]
+            # Findings of rules that were removed or edited no longer count
+            findings = [f for f in findings if f[0] in self._names]
+
+        return [self._replay(path, f) for f in findings], missing
+
+    def _replay(self, path, stored):
+        """Turn a stored finding back into the scanner's finding record."""
+        fp, line_number, secret_value, match_start, match_end, *member = stored
+        return FindingRecord(
+            path + member[0] if member else path,
+            line_number,
+            self._names[fp],
+            secret_value,
+            match_start,
+            match_end,
+        )
+
+    def lookup(self, path, st):
+        """Return (content_hash, findings, missing_rules) if the file's stat is unchanged, else None."""
+        row = self.db.execute(
+            "SELECT f.inode, f.size, f.mtime_ns, f.content_hash, c.ruleset_hash, c.findings "
+            "FROM files f LEFT JOIN contents c ON c.content_hash = f.content_hash "
+            "WHERE f.path = ?",
+            (path,),
+        ).fetchone()
+        if row is None or tuple(row[:3]) != _stat_key(st):
+            return None
+        return (row[3],) + self._resolve(path, row[4], row[5])
+
+    def lookup_content(self, path, content_hash):
+        """Return (findings, missing_rules) for file contents seen under any path."""
+        row = self.db.execute(
+            "SELECT ruleset_hash, findings FROM contents WHERE content_hash = ?",
+            (content_hash,),
+        ).fetchone()
+        if row is None:
+            return [], list(self.patterns)
+        return self._resolve(path, row[0], row[1])
+
+    def merge(self, cached, fresh):
+        """Combine replayed findings with those of rules that just ran, in scan order."""
+        if not cached:
+            return fresh
+        if not fresh:
+            return cached
+        return sorted(
+            cached + fresh,
+            key=lambda f: (f.file_path, f.line_number, self._order[f.secret_type]),
+        )
+
+    def store(self, path, st, content_hash, findings):
+        """Remember a file's stat, content hash and complete findings for the current rules."""
+        stored = [
+            [
+                self.rule_fps[f.secret_type],
+                f.line_number,
+                f.secret_value,
+                f.match_start,
+                f.match_end,
+            ]
+            for f in findings
+        ]
+        # Findings inside an archive keep their "!member" part of the path
+        for entry, f in zip(stored, findings):
+            if f.file_path != path:
+                entry.append(f.file_path[len(path):])
+        inode, size, mtime_ns = _stat_key(st)
+        self.db.execute(
+            "INSERT OR REPLACE INTO files (path, inode, size, mtime_ns, content_hash) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (path, inode, size, mtime_ns, content_hash),
+        )
+        self.db.execute(
+            "INSERT OR REPLACE INTO contents (content_hash, ruleset_hash, findings) "
+            "VALUES (?, ?, ?)",
+            (content_hash, self.ruleset_hash, json.dumps(stored)),
+        )
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.db.commit()
+            self._pending = 0
+
+    def scan(self, path, scan_file, st=None):
+        """Scan one file through the cache, running only the rules that need it.
+
+        `st` is the file's stat when the caller already has it.
+        """
+        if st is None:
+            st = os.stat(path)
+        cached = self.lookup(path, st)
+        if cached is not None:
+            content_hash, findings, missing = cached
+            if not missing:
+                return findings  # unchanged file - not even opened
+        else:
+            # New or touched file: hash it, the same content may be known already
+            content_hash = hash_file(path)
+            findings, missing = self.lookup_content(path, content_hash)
+
+        if missing:
+            patterns = {name: self.patterns[name] for name in missing}
+            findings = self.merge(findings, scan_file(path, patterns, st.st_size))
+        self.store(path, st, content_hash, findings)
+        return findings
+
+    def commit(self):
+        """Commit outstanding entries, for callers that keep the cache open."""
+        self.db.commit()
+        self._pending = 0
+
+    def close(self):
+        """Commit outstanding entries and close the cache file."""
+        self.commit()
+        self.db.close()
@@ -0,0 +1,157 @@
+import bisect
+import mmap
+import os
+
+from src.secret_scanner.scanner.entropy import add_entropy_hit
+from src.secret_scanner.scanner.findings import TRUNCATED, FindingRecord
+from src.secret_scanner.scanner.redos import note_skips
+from src.secret_scanner.scanner.walk import SNIFF_SIZE, looks_binary
+
+# -------------------
+# Bytes-level scanning of large files
+# -------------------
+# Text mode decodes every line into a str, and a file with one enormous line
+# (minified JS, single-line logs) becomes one enormous str. Here the file is
+# memory-mapped instead and bytes patterns run over fixed-size CHUNKS of it, so
+# memory stays bounded however large the file or its lines are. Line numbers
+# are only counted up to the offsets that actually matched.
+#
+# Findings look like those of the text-mode scan: the line as text, and the
+# match as CHARACTER columns of it, not byte offsets. A line longer than
+# MAX_CONTEXT on either side of the match is kept as a window around it,
+# marked with TRUNCATED where it was cut, and the columns then count from the
+# start of that value.
+
+# Size of each chunk handed to the regex engine
+CHUNK_SIZE = 1024 * 1024
+# Consecutive chunks overlap by this much so matches on a boundary are found.
+# A match longer than this that straddles a boundary can be missed
+OVERLAP = 4096
+# At most this many bytes either side of a match are kept as the finding's line
+MAX_CONTEXT = 4096
+
+
+def _line_window(buffer, size, position):
+    """Return (window_start, window_end, cut_before, cut_after) of the line around a match position.
+
+    The flags tell whether the window is cut out of a longer line.
+    """
+    # rfind works on the mapping directly, so even a huge line isn't copied
+    line_start = buffer.rfind(b"\n", 0, position) + 1
+    window_start = max(line_start, position - MAX_CONTEXT)
+
+    limit = min(size, position + MAX_CONTEXT)
+    newline = buffer.find(b"\n", position, limit)
+    # Keep the newline, just like text-mode iteration does
+    window_end = newline + 1 if newline != -1 else limit
+    return window_start, window_end, window_start > line_start, newline == -1 and limit < size
+
+
+def _columns(line, start, end):
+    """Turn a match's byte offsets within a line into character columns of its decoded text."""
+    # Decoded the same way as the finding's value, so the columns index into it
+    start_column = len(line[:start].decode("utf-8", "ignore"))
+    return start_column, start_column + len(line[start:end].decode("utf-8", "ignore"))
+
+
+def _next_match(searchers, chunk, position, token_starts=()):
+    """Return the earliest offset >= position where any searcher matches, or -1.
+
+    `token_starts` are sorted offsets of high-entropy tokens, also candidates.
+    """
+    earliest = -1
+    for regex in searchers:
+        match = regex.search(chunk, position)
+        if match and (earliest == -1 or match.start() < earliest):
+            earliest = match.start()
+    index = bisect.bisect_left(token_starts, position)
+    if index < len(token_starts) and (earliest == -1 or token_starts[index] < earliest):
+        earliest = token_starts[index]
+    return earliest
+
+
+def iter_mapped_file(path, matcher, detector=None):
+    """Scan a file through a memory map with a binary Matcher, yielding findings.
+
+    With an EntropyDetector, high-entropy tokens are reported as well.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return  # empty files can't be mapped
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from iter_buffer(path, buffer, matcher, detector)
+
+
+def iter_buffer(path, buffer, matcher, detector=None):
+    """Scan a file already mapped into memory (or any bytes-like buffer), yielding findings."""
+    size = len(buffer)
+    if looks_binary(buffer[:SNIFF_SIZE]):
+        return  # images, archives, databases... nothing worth reporting
+    lineno = 1          # line number at offset `counted_to`
+    counted_to = 0      # newlines before this offset are already counted
+    checked_to = 0      # end of the last window checked with match_line()
+    line_rules = set()  # rules already reported on line `lineno`
+
+    for offset in range(0, size, CHUNK_SIZE):
+        chunk = buffer[offset:offset + CHUNK_SIZE + OVERLAP]
+        searchers = matcher.searchers(chunk)
+        # The whole chunk's tokens are scored in one batch up front
+        token_starts = []
+        if detector is not None:
+            token_starts = [start for start, _ in detector.find(chunk)]
+        # Skip whatever the previous chunk already covered in the overlap
+        start = max(counted_to, checked_to) - offset
+
+        while searchers or token_starts:
+            start = _next_match(searchers, chunk, start, token_starts)
+            if start == -1:
+                break
+            position = offset + start
+
+            # Lazily count lines, only up to matched offsets
+            newlines = chunk.count(b"\n", counted_to - offset, start)
+            counted_to = position
+            if newlines:
+                lineno += newlines
+                line_rules = set()
+
+            window_start, window_end, cut_before, cut_after = _line_window(buffer, size, position)
+            checked_to = window_end
+            line = buffer[window_start:window_end]
+            hits = matcher.match_line(line)
+            if matcher.skipped:
+                note_skips(path, lineno, matcher)
+            if detector is not None:
+                spans = detector.find(line)
+                if spans:
+                    hits = add_entropy_hit(hits, spans[0])
+            value = None
+            for secret_type, match_start, match_end in hits:
+                # One finding per rule per line, even on huge lines that
+                # are checked in several windows
+                if secret_type in line_rules:
+                    continue
+                line_rules.add(secret_type)
+                if value is None:
+                    value = line.decode("utf-8", "ignore").rstrip()
+                    value = (TRUNCATED if cut_before else "") + value + (TRUNCATED if cut_after else "")
+                start_column, end_column = _columns(line, match_start, match_end)
+                if cut_before:
+                    start_column, end_column = start_column + 1, end_column + 1
+                yield FindingRecord(path, lineno, secret_type, value, start_column, end_column)
+
+            # match_line() checked the whole window, so carry on after it.
+            # Searching again from there (rather than continuing one
+            # finditer) finds rules hidden behind a long greedy match
+            start = max(start + 1, window_end - offset)
+
+        # Count the rest of this chunk (without its overlap) before moving on
+        chunk_end = offset + CHUNK_SIZE
+        if counted_to < chunk_end:
+            newlines = chunk.count(b"\n", counted_to - offset, CHUNK_SIZE)
+            if newlines:
+                lineno += newlines
+                line_rules = set()
+            counted_to = chunk_end
@@ -0,0 +1,172 @@
+import math
+import re
+from collections import Counter
+
+# numpy is optional - without it entropies are computed token by token. It
+# takes longer to import than the rest of the scanner, so it is only imported
+# once an EntropyDetector is created (see _load_numpy)
+numpy = None
+_numpy_loaded = False
+
+# -------------------
+# Shannon entropy
+# -------------------
+# Random tokens (keys, passwords, session secrets) use their alphabet evenly,
+# so they score close to log2(alphabet size) bits per character, while words,
+# identifiers and placeholders score much lower.
+#
+# The detector finds every candidate token of a block of text with ONE regex
+# pass and then scores all of them together: with numpy the tokens are packed
+# into one byte array and a (tokens x alphabet) character histogram is built
+# with a single bincount, so no Python code runs per token. Without numpy most
+# tokens are ruled out by an upper bound (log2 of their number of distinct
+# characters) and the rest are scored with a lookup table of c*log2(c).
+
+# Secret type of the findings reported by the detector
+ENTROPY_RULE = "High Entropy String"
+
+# Tokens shorter than this are never reported
+MIN_TOKEN_LENGTH = 20
+
+# Minimum entropy (bits per character) per charset. Hex can reach at most 4
+# bits, base64 at most 6
+DEFAULT_THRESHOLDS = {
+    "hex": 3.0,
+    "base64": 4.5,
+}
+
+# A candidate token is a run of base64/base64url characters (hex is a subset).
+# "=" only counts as trailing padding, so "key=value" isn't glued into one token
+_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=_-"
+_TOKEN = r"[A-Za-z0-9+/_-]{%d,}={0,2}"
+_NOT_HEX = re.compile(r"[^0-9a-fA-F]")
+_NOT_HEX_BYTES = re.compile(rb"[^0-9a-fA-F]")
+
+# Tokens scored in one go - bounds the size of the histogram array
+BATCH_TOKENS = 8192
+
+# Lookup table of c * log2(c) for the pure-Python path, grown on demand
+_clogc = [0.0]
+
+
+def shannon_entropy(data):
+    """Return the Shannon entropy of a str or bytes, in bits per character."""
+    if not data:
+        return 0.0
+    length = len(data)
+    return -sum(count / length * math.log2(count / length) for count in Counter(data).values())
+
+
+def _passing_python(tokens, not_hex, hex_threshold, base64_threshold):
+    """Indices of the tokens over their charset's threshold, without numpy."""
+    passed = []
+    for index, token in enumerate(tokens):
+        # Entropy can't exceed log2(number of distinct characters), so most
+        # tokens (identifiers, words) are ruled out by a cheap set() alone
+        distinct = len(set(token))
+        threshold = base64_threshold if not_hex.search(token) else hex_threshold
+        if distinct < 2 ** threshold:
+            continue
+        length = len(token)
+        while len(_clogc) <= length:
+            _clogc.append(len(_clogc) * math.log2(len(_clogc)))
+        # H = log2(n) - sum(c * log2(c)) / n over the character counts c
+        entropy = math.log2(length) - sum(map(_clogc.__getitem__, Counter(token).values())) / length
+        if entropy >= threshold:
+            passed.append(index)
+    return passed
+
+
+def _load_numpy():
+    """Import numpy if it is installed and build the lookup tables it scores with."""
+    global numpy, _numpy_loaded, _COLUMN, _NOT_HEX_TABLE
+    if _numpy_loaded:
+        return
+    _numpy_loaded = True
+    try:
+        import numpy as numpy_module
+    except ImportError:
+        return
+    # Byte -> column of the histogram, so a row is only as wide as the alphabet
+    _COLUMN = numpy_module.zeros(256, dtype=numpy_module.int64)
+    _COLUMN[list(_ALPHABET)] = numpy_module.arange(len(_ALPHABET))
+    # Byte -> 1 for characters that can't appear in hex
+    _NOT_HEX_TABLE = numpy_module.ones(256, dtype=numpy_module.int64)
+    _NOT_HEX_TABLE[list(b"0123456789abcdefABCDEF")] = 0
+    numpy = numpy_module
+
+
+def _entropies_numpy(tokens, data):
+    """Entropy and hex-ness of every token, computed over one histogram array."""
+    count = len(tokens)
+    width = len(_ALPHABET)
+    lengths = numpy.fromiter(map(len, tokens), dtype=numpy.int64, count=count)
+    chars = numpy.frombuffer(data, dtype=numpy.uint8)
+    rows = numpy.repeat(numpy.arange(count, dtype=numpy.int64), lengths)
+
+    # Cell (token, character) of the histogram, flattened
+    histogram = numpy.bincount(rows * width + _COLUMN[chars], minlength=count * width)
+    cells = numpy.flatnonzero(histogram)
+    counts = histogram[cells]
+
+    # H = log2(n) - sum(c * log2(c)) / n, summed over the non-empty cells only
+    clogc = counts * numpy.log2(counts)
+    sums = numpy.bincount(cells // width, weights=clogc, minlength=count)
+    entropies = numpy.log2(lengths) - sums / lengths
+
+    # A token is hex when none of its characters is outside 0-9, a-f, A-F
+    is_hex = numpy.bincount(rows, weights=_NOT_HEX_TABLE[chars], minlength=count) == 0
+    return entropies, is_hex
+
+
+class EntropyDetector:
+    """Finds high-entropy base64 and hex tokens in text or bytes."""
+
+    def __init__(self, thresholds=None, min_length=MIN_TOKEN_LENGTH):
+        self.thresholds = dict(DEFAULT_THRESHOLDS)
+        self.thresholds.update(thresholds or {})
+        self.min_length = min_length
+        self._token = re.compile(_TOKEN % min_length)
+        self._token_bytes = re.compile((_TOKEN % min_length).encode("ascii"))
+        _load_numpy()
+
+    def describe(self):
+        """A stable description of the settings, used to fingerprint the detector."""
+        return "entropy:%d:%s" % (self.min_length, sorted(self.thresholds.items()))
+
+    def find(self, text):
+        """Return the (start, end) spans of every high-entropy token, in order."""
+        binary = isinstance(text, bytes)
+        token = self._token_bytes if binary else self._token
+        tokens = token.findall(text)
+        if not tokens:
+            return []
+
+        hex_threshold = self.thresholds["hex"]
+        base64_threshold = self.thresholds["base64"]
+        if numpy is None:
+            not_hex = _NOT_HEX_BYTES if binary else _NOT_HEX
+            passed = _passing_python(tokens, not_hex, hex_threshold, base64_threshold)
+        else:
+            passed = []
+            for offset in range(0, len(tokens), BATCH_TOKENS):
+                batch = tokens[offset:offset + BATCH_TOKENS]
+                data = b"".join(batch) if binary else "".join(batch).encode("ascii")
+                entropies, is_hex = _entropies_numpy(batch, data)
+                over = entropies >= numpy.where(is_hex, hex_threshold, base64_threshold)
+                passed.extend(offset + i for i in numpy.flatnonzero(over).tolist())
+
+        # Positions are only worked out on the rare texts with a hit
+        if not passed:
+            return []
+        matches = list(token.finditer(text))
+        return [matches[i].span() for i in passed]
+
+
+def add_entropy_hit(hits, span):
+    """Add an entropy hit to a line's (rule, start, end) hits unless a rule already covers it."""
+    start, end = span
+    for _, hit_start, hit_end in hits:
+        if hit_start < end and start < hit_end:
+            return hits  # the rule's finding says more than "random-looking"
+    return hits + [(ENTROPY_RULE, start, end)]
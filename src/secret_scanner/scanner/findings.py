@@ -0,0 +1,219 @@
+import hashlib
+from array import array
+
+# -------------------
+# Finding records and columnar batches
+# -------------------
+# A scan can produce millions of findings. As dictionaries every one of them
+# carried its own hash table of six keys; a FindingRecord stores the same six
+# fields in __slots__, at a fraction of the memory, and still answers
+# finding["secret_type"] for code written against the dictionaries.
+#
+# Where findings are HELD or SHIPPED in bulk (worker processes sending results
+# back, the CLI handing them to the printer and the database writer) they
+# travel as a FindingBatch instead: one array per numeric column, file paths
+# and rule names stored once in a table and referenced by small ints, and the
+# secret values (the lines) appended to ONE text buffer and referenced by
+# their offsets in it - once per line however many rules hit it, and without
+# a string object per line. A batch pickles to one string and a few arrays.
+# Consumers read rows() straight from the columns, so no record object is
+# built on the way.
+
+# secret_value is the line the secret is on, without its line ending, and
+# match_start/match_end the character span of the match within it. Only the
+# bytes-level scan of a line longer than chunked.MAX_CONTEXT keeps a window
+# of the line instead: the value then starts and/or ends with TRUNCATED where
+# the line was cut, and its spans count from the start of the value
+FIELDS = ("file_path", "line_number", "secret_type", "secret_value", "match_start", "match_end")
+
+# Marks where a window's value was cut out of its line
+TRUNCATED = "\u2026"
+
+# array typecode for ids, line numbers and offsets: the smallest unsigned type
+# of at least 4 bytes ("I" is only guaranteed 2, "L" is 8 on most 64-bit builds)
+_ID = "I" if array("I").itemsize >= 4 else "L"
+# match_start/match_end of findings that have no span (stored as this value)
+_NO_SPAN = 0xFFFFFFFF
+
+
+def finding_fingerprint(secret_type, file_path, secret_value, match_start=None, match_end=None):
+    """Return the stable fingerprint of a finding: a hash of rule, file and secret.
+
+    With a span only the matched part of the line counts, so editing the rest
+    of the line (or moving the secret to another one) keeps the fingerprint.
+    """
+    if match_start is not None and match_end is not None:
+        secret_value = secret_value[match_start:match_end]
+    # The secret is normalized so re-indenting or re-wrapping it doesn't make it new
+    secret = " ".join(secret_value.split())
+    return hashlib.sha256("\0".join((secret_type, file_path, secret)).encode("utf-8")).hexdigest()
+
+
+class FindingRecord:
+    """One finding: where it is, which rule found it, and the line it is on."""
+
+    __slots__ = FIELDS
+
+    def __init__(self, file_path, line_number, secret_type, secret_value,
+                 match_start=None, match_end=None):
+        self.file_path = file_path
+        self.line_number = line_number
+        self.secret_type = secret_type
+        self.secret_value = secret_value
+        self.match_start = match_start  # span of the match within the line
+        self.match_end = match_end
+
+    # Mapping-style access, so finding["file_path"] keeps working
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in FIELDS else default
+
+    def keys(self):
+        return FIELDS
+
+    def astuple(self):
+        return (self.file_path, self.line_number, self.secret_type, self.secret_value,
+                self.match_start, self.match_end)
+
+    def as_dict(self):
+        return dict(zip(FIELDS, self.astuple()))
+
+    def replace(self, **changes):
+        """Return a copy with some fields changed."""
+        record = FindingRecord(*self.astuple())
+        for key, value in changes.items():
+            setattr(record, key, value)
+        return record
+
+    def __eq__(self, other):
+        if isinstance(other, FindingRecord):
+            return self.astuple() == other.astuple()
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "FindingRecord(%s)" % ", ".join(
+            "%s=%r" % (key, value) for key, value in zip(FIELDS, self.astuple())
+        )
+
+    def __reduce__(self):
+        # Pickled as a plain tuple of fields - smaller and faster than slot state
+        return FindingRecord, self.astuple()
+
+
+class FindingBatch:
+    """Findings stored column by column, with paths, rules and values held once."""
+
+    def __init__(self):
+        self.paths = []      # distinct file paths, in order of appearance
+        self.rules = []      # distinct rule names
+        # Secret values, one per line with findings, as pieces of one text
+        # buffer (joined on first read) and their offsets in it
+        self._text = []
+        self._text_size = 0
+        self._last_value = None  # the value added last, to share with the next rule
+        self.path_ids = array(_ID)
+        self.rule_ids = array(_ID)
+        self.value_starts = array(_ID)
+        self.value_ends = array(_ID)
+        self.line_numbers = array(_ID)
+        self.match_starts = array(_ID)
+        self.match_ends = array(_ID)
+        self._path_index = {}
+        self._rule_index = {}
+
+    def __len__(self):
+        return len(self.line_numbers)
+
+    @property
+    def text(self):
+        """The text buffer every secret value of the batch is a slice of."""
+        if len(self._text) > 1:
+            self._text = ["".join(self._text)]
+        return self._text[0] if self._text else ""
+
+    def append(self, finding):
+        """Add one finding (a FindingRecord, or a dictionary with the same keys)."""
+        self.add(finding["file_path"], finding["line_number"], finding["secret_type"],
+                 finding["secret_value"], finding.get("match_start"), finding.get("match_end"))
+
+    def add(self, file_path, line_number, secret_type, secret_value,
+            match_start=None, match_end=None):
+        """Add one finding from its fields."""
+        path_id = self._path_index.get(file_path)
+        if path_id is None:
+            path_id = self._path_index[file_path] = len(self.paths)
+            self.paths.append(file_path)
+        rule_id = self._rule_index.get(secret_type)
+        if rule_id is None:
+            rule_id = self._rule_index[secret_type] = len(self.rules)
+            self.rules.append(secret_type)
+        # Several rules hitting one line share its value: findings arrive line
+        # by line, so comparing with the previous one is enough
+        if (self.path_ids and self.path_ids[-1] == path_id
+                and self.line_numbers[-1] == line_number and self._last_value == secret_value):
+            value_start, value_end = self.value_starts[-1], self.value_ends[-1]
+        else:
+            value_start = self._text_size
+            value_end = self._text_size = value_start + len(secret_value)
+            self._text.append(secret_value)
+            self._last_value = secret_value
+        self.path_ids.append(path_id)
+        self.rule_ids.append(rule_id)
+        self.value_starts.append(value_start)
+        self.value_ends.append(value_end)
+        self.line_numbers.append(line_number)
+        self.match_starts.append(_NO_SPAN if match_start is None else match_start)
+        self.match_ends.append(_NO_SPAN if match_end is None else match_end)
+
+    def extend(self, findings):
+        """Add every finding of an iterable (records, dictionaries or a batch)."""
+        if isinstance(findings, FindingBatch):
+            for row in findings.rows():
+                self.add(*row)
+            return
+        for finding in findings:
+            self.append(finding)
+
+    def rows(self, start=0, stop=None):
+        """Yield (file_path, line_number, secret_type, secret_value, match_start, match_end) tuples."""
+        paths, rules, text = self.paths, self.rules, self.text
+        for index in range(start, len(self) if stop is None else stop):
+            match_start = self.match_starts[index]
+            match_end = self.match_ends[index]
+            yield (
+                paths[self.path_ids[index]],
+                self.line_numbers[index],
+                rules[self.rule_ids[index]],
+                text[self.value_starts[index]:self.value_ends[index]],
+                None if match_start == _NO_SPAN else match_start,
+                None if match_end == _NO_SPAN else match_end,
+            )
+
+    def records(self, start=0, stop=None):
+        """Yield the findings as FindingRecords (built one at a time)."""
+        for row in self.rows(start, stop):
+            yield FindingRecord(*row)
+
+    __iter__ = records
+
+    def __getstate__(self):
+        # The lookup dictionaries are rebuilt from the tables when needed,
+        # and the text travels as one string
+        state = dict(self.__dict__)
+        del state["_path_index"], state["_rule_index"], state["_last_value"]
+        state["_text"] = [self.text] if self._text else []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._path_index = {path: index for index, path in enumerate(self.paths)}
+        self._rule_index = {rule: index for index, rule in enumerate(self.rules)}
+        self._last_value = self.text[self.value_starts[-1]:self.value_ends[-1]] if len(self) else None
+
@@ -0,0 +1,142 @@
+import os
+import re
+import subprocess
+import tempfile
+
+from src.secret_scanner.scanner.entropy import add_entropy_hit
+from src.secret_scanner.scanner.findings import FindingRecord
+from src.secret_scanner.scanner.redos import note_skips
+from src.secret_scanner.scanner.scanner import entropy_detector, rule_matcher
+from src.secret_scanner.scanner.walk import PathFilter
+
+# -------------------
+# Git-aware incremental scanning
+# -------------------
+# For pre-commit hooks and CI only the lines a change ADDS can leak a new
+# secret. `git diff -U0` hands us exactly those lines straight from the object
+# database (no checkout needed), together with hunk headers that tell us the
+# line numbers in the new revision, so the cost depends on the size of the
+# change rather than the size of the tree. Paths go through the same
+# PathFilter (and default excludes) as a directory scan.
+
+# "@@ -12,3 +14,5 @@" -> old start/count and new start/count (counts default to 1)
+_HUNK_HEADER = re.compile(rb"^@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# A path with a '"', a backslash or a control character (or non-ASCII, without
+# core.quotepath=false) is written C-quoted: "b/tab\there.py", "b/na\303\257ve.py"
+_QUOTED_ESCAPE = re.compile(rb"\\([0-7]{3}|.)", re.DOTALL)
+_ESCAPES = {b"a": b"\a", b"b": b"\b", b"t": b"\t", b"n": b"\n", b"v": b"\v", b"f": b"\f", b"r": b"\r"}
+
+
+def _git_diff_command(repo, diff_range=None, staged=False):
+    """Build the git command that prints the added lines of a change."""
+    command = [
+        "git", "-C", repo,
+        "-c", "core.quotepath=false",  # keep non-ASCII paths readable
+        "diff", "--no-color", "--no-ext-diff", "--no-renames",
+        "-U0",                         # no context lines, only the change itself
+        "--diff-filter=AM",            # deleted files can't add anything
+        "--relative",                  # paths relative to (and limited to) repo
+    ]
+    if staged:
+        command.append("--cached")
+    elif diff_range:
+        command.append(diff_range)
+    return command
+
+
+def _unquote(quoted):
+    """Undo git's C-quoting of a path (bytes, with its quotes)."""
+    def unescape(match):
+        code = match.group(1)
+        if len(code) == 3:
+            return bytes([int(code, 8) & 0xFF])
+        return _ESCAPES.get(code, code)  # \" and \\ stand for themselves
+    return _QUOTED_ESCAPE.sub(unescape, quoted[1:-1])
+
+
+def _header_path(target):
+    """Return the path of a "+++ " header's target (bytes), or None for /dev/null."""
+    if target.startswith(b'"'):
+        target = _unquote(target)
+    else:
+        # git ends an unquoted name that contains a space with a tab
+        target = target.rstrip(b"\t")
+    # Strip git's "b/" prefix; "/dev/null" is a deleted file
+    return os.fsdecode(target[2:]) if target.startswith(b"b/") else None
+
+
+def _added_lines(stream):
+    """Yield (path, line_number, line) for every added line in a -U0 diff stream."""
+    path = None
+    removed = added = 0  # lines still expected in the current hunk
+    lineno = 0
+
+    for raw in stream:
+        # Inside a hunk the counts from its header say exactly how many lines
+        # belong to it, so content starting with "+++" can't be mistaken for a header
+        if added or removed:
+            if raw.startswith(b"+"):
+                added -= 1
+                if path is not None:
+                    yield path, lineno, raw[1:].decode("utf-8", "ignore")
+                lineno += 1
+            elif raw.startswith(b"-"):
+                removed -= 1
+            continue
+
+        if raw.startswith(b"+++ "):
+            path = _header_path(raw[4:].rstrip(b"\n"))
+        elif raw.startswith(b"@@ "):
+            header = _HUNK_HEADER.match(raw)
+            if header:
+                removed = int(header.group(1)) if header.group(1) is not None else 1
+                lineno = int(header.group(2))
+                added = int(header.group(3)) if header.group(3) is not None else 1
+
+
+def iter_git_diff(repo, diff_range=None, staged=False, path_filter=None):
+    """Yield findings in the lines added by a commit range (or the staged changes)."""
+    path_filter = path_filter or PathFilter()
+    matcher = rule_matcher()
+    detector = entropy_detector()
+
+    # git's errors go to a file: a pipe only read after stdout is drained
+    # could fill up and leave git blocked on it
+    errors = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        _git_diff_command(repo, diff_range, staged),
+        stdout=subprocess.PIPE,
+        stderr=errors,
+    )
+    try:
+        for path, lineno, line in _added_lines(process.stdout):
+            if not path_filter.wants(path):
+                continue
+            hits = matcher.match_line(line)
+            if matcher.skipped:
+                note_skips(os.path.join(repo, path), lineno, matcher)
+            if detector is not None:
+                spans = detector.find(line)
+                if spans:
+                    hits = add_entropy_hit(hits, spans[0])
+            if hits:
+                file_path = os.path.join(repo, path)
+                value = line.rstrip()  # the spans are columns of the line
+                for secret_type, start, end in hits:
+                    yield FindingRecord(file_path, lineno, secret_type, value, start, end)
+        if process.wait() != 0:
+            errors.seek(0)
+            raise RuntimeError("git diff failed: %s" % errors.read().decode("utf-8", "ignore").strip())
+    finally:
+        # The consumer may stop early - don't leave git running behind us
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        errors.close()
+
+
+def scan_git_diff(repo, diff_range=None, staged=False, path_filter=None):
+    """Scan only the lines added by a commit range (or the staged changes). Returns list of findings."""
+    return list(iter_git_diff(repo, diff_range, staged, path_filter))
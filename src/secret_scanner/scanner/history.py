@@ -0,0 +1,378 @@
+import os
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from src.secret_scanner.scanner.findings import FindingBatch, finding_fingerprint
+from src.secret_scanner.scanner.parallel import scan_isolated
+from src.secret_scanner.scanner.scanner import iter_bytes, worker_setup
+from src.secret_scanner.scanner.skipped import take_skipped
+from src.secret_scanner.scanner.stats import current_stats, worker_snapshot
+from src.secret_scanner.scanner.walk import PathFilter
+
+# -------------------
+# Git history scanning
+# -------------------
+# A key that was committed and later deleted is gone from the working tree
+# but not from the repository. `scan --history` scans every file version
+# reachable from any ref, without checking anything out:
+#
+#   1. ONE `git log --raw` over all refs lists, commit by commit (parents
+#      first), the blob every added or modified file points to.
+#   2. A blob is a file's exact content, so each distinct blob is scanned ONCE
+#      however many commits carry it - a history of 100k commits usually holds
+#      only a few times as many blobs as the tree has files.
+#   3. Blobs are read in batches through `git cat-file --batch` (one process
+#      streams a whole batch) by a pool of worker processes.
+#
+# A secret is reported ONCE per path, at the first commit that put it there,
+# as "<commit>:<path>" (which `git show` understands). Later versions of the
+# file that still hold it are new blobs, but not new findings. A secret copied
+# to another path is reported under that path too.
+#
+# What was found in each blob is remembered for the most recent blobs only, so
+# memory stays flat on long histories: a blob that comes back after it was
+# forgotten is simply scanned again.
+
+# Blobs handed to a worker at a time
+BATCH_BLOBS = 512
+# Blobs whose findings are remembered
+REMEMBERED_BLOBS = 200_000
+# Bytes read at a time from git's output
+READ_SIZE = 64 * 1024
+
+# Only regular files - no symlinks (120000) or submodules (160000)
+_FILE_MODES = (b"100644", b"100755")
+
+
+def _git_log_command(repo):
+    """Build the git command that lists the blobs every commit introduces."""
+    return [
+        "git", "-C", repo, "log",
+        "--all",                   # every branch, tag and remote ref
+        "--reverse", "--topo-order",  # parents before their children
+        "--format=%x00%H",         # a NUL, then the commit id
+        "--raw", "--no-abbrev",    # ":modes blobs status" per changed file
+        "--no-renames",            # a renamed file is an add, nothing to detect
+        "--root",                  # the first commit adds everything
+        "-c",                      # merges: only what matches none of the parents
+        "-z",                      # NUL-separated, so paths come unquoted
+    ]
+
+
+def _split_nul(stream):
+    """Yield the NUL-separated fields of a byte stream."""
+    pending = b""
+    while True:
+        data = stream.read(READ_SIZE)
+        if not data:
+            break
+        fields = (pending + data).split(b"\0")
+        pending = fields.pop()
+        yield from fields
+    if pending:
+        yield pending
+
+
+def _parse_log(stream):
+    """Yield (commit, path, blob) for every file version in a `git log --raw -z` stream."""
+    commit = None
+    meta = None  # the ":modes blobs status" field whose path comes next
+    for field in _split_nul(stream):
+        if meta is not None:
+            # ":100644 100644 <old> <new> M" - merges (-c) have one colon, mode
+            # and blob per parent. The resulting file comes last
+            parents = len(meta) - len(meta.lstrip(b":"))
+            parts = meta[parents:].split(b" ")
+            mode, blob, status = parts[parents], parts[2 * parents + 1], parts[-1]
+            meta = None
+            if mode in _FILE_MODES and not status.startswith(b"D") and blob.strip(b"0"):
+                yield commit, os.fsdecode(field), blob.decode("ascii")
+            continue
+        field = field.lstrip(b"\n")
+        if field.startswith(b":"):
+            meta = field
+        elif field:
+            commit = field.decode("ascii")
+
+
+def iter_introductions(repo):
+    """Yield (commit, path, blob) for every file version in the history, parents first."""
+    # git's errors go to a file, like the diff scan's: a pipe only read once
+    # the log is drained could fill up and leave git blocked on it
+    errors = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        _git_log_command(repo),
+        stdout=subprocess.PIPE,
+        stderr=errors,
+    )
+    try:
+        yield from _parse_log(process.stdout)
+        if process.wait() != 0:
+            errors.seek(0)
+            raise RuntimeError("git log failed: %s" % errors.read().decode("utf-8", "ignore").strip())
+    finally:
+        # The consumer may stop early - don't leave git running behind us
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        errors.close()
+
+
+def iter_blobs(repo, blobs, max_size=None):
+    """Yield (blob, contents) for a list of blob ids, read by one `git cat-file --batch`.
+
+    Contents are None for a blob that is missing or larger than `max_size`.
+    """
+    process = subprocess.Popen(
+        ["git", "-C", repo, "cat-file", "--batch"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+
+    # The ids are written from a thread: git answers while it reads them, and
+    # with both pipes full neither side could go on
+    def feed():
+        try:
+            process.stdin.write("".join(blob + "\n" for blob in blobs).encode("ascii"))
+            process.stdin.close()
+        except OSError:
+            pass  # git went away - the reader notices
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    try:
+        for blob in blobs:
+            header = process.stdout.readline().split()
+            if not header:
+                raise RuntimeError(f"git cat-file stopped before blob {blob}")
+            if header[1] == b"missing":
+                yield blob, None
+                continue
+            size = int(header[2])
+            if max_size is not None and size > max_size:
+                left = size + 1  # the contents and their newline, unread
+                while left:
+                    skipped = len(process.stdout.read(min(left, READ_SIZE)))
+                    if not skipped:
+                        raise RuntimeError(f"git cat-file stopped inside blob {blob}")
+                    left -= skipped
+                yield blob, None
+                continue
+            data = process.stdout.read(size)
+            if len(data) < size:
+                raise RuntimeError(f"git cat-file stopped inside blob {blob}")
+            process.stdout.read(1)  # the newline after the contents
+            yield blob, data
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        writer.join()
+        process.stdout.close()
+
+
+def _read_and_scan(items, repo, max_size=None):
+    """Scan a batch of (name, blob) items. Returns (found, results, errors).
+
+    `found` holds the findings of every blob in item order, reported under its
+    name, and `results` one (number of findings, None) per item.
+    """
+    found = FindingBatch()
+    results = []
+    errors = []
+    blobs = [blob for _, blob in items]
+    # The blobs come first, so git is waited for once the last one is read
+    for (_, data), (name, _) in zip(iter_blobs(repo, blobs, max_size), items):
+        before = len(found)
+        if data:
+            found.extend(iter_bytes(name, data))
+        results.append((len(found) - before, None))
+        errors.extend(take_skipped())
+    return found, results, errors
+
+
+def _scan_blobs(items, repo, max_size=None):
+    """Worker entry point: like _read_and_scan, plus the worker's statistics snapshot.
+
+    The result has the shape of parallel._scan_batch's.
+    """
+    return _read_and_scan(items, repo, max_size) + (worker_snapshot(),)
+
+
+def _iter_work(repo, path_filter, attribution):
+    """Group the file versions the history introduces into batches of work.
+
+    Yields lists of (blob, commit, path, new) in log order; `new` is set for
+    blobs that have to be scanned, and clear for blobs `attribution` still
+    remembers. A batch holds at most BATCH_BLOBS new blobs.
+    """
+    batch = []
+    new_blobs = 0
+    for commit, path, blob in iter_introductions(repo):
+        if not path_filter.wants(path):
+            continue
+        new = attribution.expect(blob)
+        batch.append((blob, commit, path, new))
+        if new:
+            new_blobs += 1
+            if new_blobs >= BATCH_BLOBS:
+                yield batch
+                batch, new_blobs = [], 0
+    if batch:
+        yield batch
+
+
+def _name(commit, path):
+    return f"{commit}:{path}"
+
+
+class _Attribution:
+    """Reports each secret once per path, under the commit that introduced it there."""
+
+    def __init__(self, remember=REMEMBERED_BLOBS):
+        # blob id (20 bytes) -> the rows found in it, or None until it is
+        # scanned; the least recently introduced blobs are forgotten first
+        self.blobs = OrderedDict()
+        self.remember = remember
+        # Digests of the (path, rule, secret) already reported. This grows with
+        # the findings, not with the history
+        self.reported = set()
+
+    def expect(self, blob):
+        """Note that `blob` is introduced again. Returns True if it has to be scanned."""
+        key = bytes.fromhex(blob)
+        if key in self.blobs:
+            self.blobs.move_to_end(key)
+            return False
+        self.blobs[key] = None
+        if len(self.blobs) > self.remember:
+            self.blobs.popitem(last=False)
+        return True
+
+    def _first(self, path, row):
+        """Return True the first time the secret of `row` is seen at `path`."""
+        _, _, secret_type, value, start, end = row
+        digest = bytes.fromhex(finding_fingerprint(secret_type, path, value, start, end))[:16]
+        if digest in self.reported:
+            return False
+        self.reported.add(digest)
+        return True
+
+    def finish(self, entries, found, results):
+        """Return the findings of one scanned batch as a FindingBatch.
+
+        `found` and `results` are the scan of the batch's new blobs. Batches
+        are finished in order, so every other blob was scanned by now.
+        """
+        findings = FindingBatch()
+        fresh = iter(results)
+        position = 0
+        for blob, commit, path, new in entries:
+            key = bytes.fromhex(blob)
+            if new:
+                count, _ = next(fresh)
+                rows = tuple(found.rows(position, position + count))
+                position += count
+                if key in self.blobs:
+                    self.blobs[key] = rows
+            else:
+                rows = self.blobs.get(key) or ()
+            for row in rows:
+                if self._first(path, row):
+                    findings.add(_name(commit, path), *row[1:])
+        return findings
+
+
+def scan_history_batches(repo, jobs=1, errors=None, path_filter=None):
+    """Scan every blob in a repository's history once, yielding FindingBatches.
+
+    jobs=1 scans in this process; otherwise a pool of `jobs` workers does.
+    """
+    path_filter = path_filter or PathFilter()
+    max_size = path_filter.max_file_size
+    # Blobs must be remembered at least until the batches in flight are finished
+    in_flight_batches = 1 if jobs == 1 else jobs * 4
+    attribution = _Attribution(max(REMEMBERED_BLOBS, (in_flight_batches + 1) * BATCH_BLOBS))
+    stats = current_stats()
+
+    def take(entries, result):
+        found, results, batch_errors, batch_stats = result
+        if errors is not None:
+            errors.extend(batch_errors)
+        if stats is not None and batch_stats is not None:
+            stats.merge(batch_stats)
+        return attribution.finish(entries, found, results)
+
+    def items(entries):
+        return [(_name(commit, path), blob) for blob, commit, path, new in entries if new]
+
+    if jobs == 1:
+        for entries in _iter_work(repo, path_filter, attribution):
+            # Statistics are gathered in this process already
+            result = _read_and_scan(items(entries), repo, max_size) + (None,)
+            findings = take(entries, result)
+            if len(findings):
+                yield findings
+        return
+
+    # Batches are taken from the log while the workers run, and their results
+    # put back in order, like the parallel directory scan does
+    work = enumerate(_iter_work(repo, path_filter, attribution))
+    exhausted = False
+    done = {}
+    pending = {}   # batch number -> (entries, items)
+    next_index = 0
+    pool = ProcessPoolExecutor(max_workers=jobs, **worker_setup())
+    in_flight = {}
+    try:
+        while not exhausted or in_flight or done:
+            try:
+                while not exhausted and len(in_flight) + len(done) < jobs * 4:
+                    batch = next(work, None)
+                    if batch is None:
+                        exhausted = True
+                        break
+                    index, entries = batch
+                    pending[index] = (entries, items(entries))
+                    in_flight[pool.submit(_scan_blobs, pending[index][1], repo, max_size)] = index
+
+                if in_flight:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        done[in_flight[future]] = future.result()
+                        del in_flight[future]
+            except BrokenProcessPool:
+                # Rescan what was lost one batch at a time, so only a batch
+                # that really crashes a worker is given up on. That includes
+                # a batch whose submit() found the pool already broken
+                for index in sorted(pending):
+                    if index not in done:
+                        done[index] = scan_isolated(pending[index][1], _scan_blobs, repo, max_size)
+                in_flight.clear()
+                pool.shutdown(wait=False)
+                pool = ProcessPoolExecutor(max_workers=jobs, **worker_setup())
+
+            while next_index in done:
+                entries, _ = pending.pop(next_index)
+                findings = take(entries, done.pop(next_index))
+                next_index += 1
+                if len(findings):
+                    yield findings
+    finally:
+        pool.shutdown(wait=not in_flight, cancel_futures=True)
+
+
+def iter_history(repo, jobs=1, errors=None, path_filter=None):
+    """Scan every blob in a repository's history once, yielding findings."""
+    for batch in scan_history_batches(repo, jobs, errors, path_filter):
+        yield from batch
+
+
+def scan_history(repo, jobs=1, errors=None, path_filter=None):
+    """Scan every blob in a repository's history once. Returns list of findings."""
+    return list(iter_history(repo, jobs, errors, path_filter))
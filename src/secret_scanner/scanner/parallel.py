@@ -0,0 +1,225 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from src.secret_scanner.scanner.findings import FindingBatch
+from src.secret_scanner.scanner.skipped import take_skipped
+from src.secret_scanner.scanner.scanner import (
+    WALK_PREFETCH, active_rules, scan_file, scan_file_hashed, worker_setup,
+)
+from src.secret_scanner.scanner.stats import current_stats, worker_snapshot
+from src.secret_scanner.scanner.walk import iter_files
+
+# -------------------
+# Multiprocess directory scanning
+# -------------------
+# Files are grouped into size-balanced BATCHES during the walk and handed to a
+# process pool.
+# Idle workers pull the next batch from the pool's queue, so a worker stuck on a
+# huge file doesn't hold up the others. Results are re-ordered by batch number
+# before they are yielded, so the output is identical to a serial scan.
+#
+# With a scan cache the parent process answers unchanged files itself and only
+# sends the rest to the workers, which also hash what they read so the parent
+# can store the results.
+#
+# Workers send their findings back as one columnar FindingBatch per batch of
+# files, which pickles to a fraction of the size of one object per finding.
+
+# A batch is closed once it holds this many bytes or this many files
+BATCH_BYTES = 4 * 1024 * 1024
+MAX_BATCH_FILES = 256
+
+
+def _iter_batches(directory, path_filter=None):
+    """Yield consecutive batches of (path, stat) tuples of roughly equal total size."""
+    # Batches are produced while the tree is still being walked, so workers
+    # start (and the first findings arrive) long before the walk is finished
+    current = []
+    current_size = 0
+    # The walk runs ahead in a background thread, so it keeps going while the
+    # parent waits on the workers
+    for path, st in iter_files(directory, path_filter, prefetch=WALK_PREFETCH):
+        current.append((path, st))
+        current_size += st.st_size if st is not None else 0
+        if current_size >= BATCH_BYTES or len(current) >= MAX_BATCH_FILES:
+            yield current
+            current = []
+            current_size = 0
+    if current:
+        yield current
+
+
+def _scan_batch(items):
+    """Worker entry point: scan a batch of (path, size, rule_names, want_hash) items.
+
+    Returns (found, results, errors, stats): a FindingBatch of every finding
+    in item order, one (number of findings, content_hash) per item, and the
+    worker's statistics snapshot, or None while they are off.
+    """
+    found = FindingBatch()
+    results = []
+    errors = []
+    rules = active_rules()
+    for path, size, rule_names, want_hash in items:
+        try:
+            patterns = None
+            if rule_names is not None:
+                patterns = {name: rules[name] for name in rule_names}
+            if want_hash:
+                # Hashed from the bytes the scan reads, not read a second time
+                findings, content_hash = scan_file_hashed(path, patterns, size)
+            else:
+                findings, content_hash = scan_file(path, patterns, size), None
+        except (OSError, UnicodeError) as exc:
+            # An unreadable file is reported, not allowed to kill the batch
+            results.append((0, None))
+            errors.append((path, str(exc)))
+        else:
+            found.extend(findings)
+            results.append((len(findings), content_hash))
+        # Lines a guarded rule gave up on are reported like unreadable files
+        errors.extend(take_skipped())
+    return found, results, errors, worker_snapshot()
+
+
+def scan_isolated(items, scan=_scan_batch, *args):
+    """Rescan a batch in its own single-worker pool after a worker crash.
+
+    `scan(items, *args)` is the worker entry point that crashed; it must
+    return the shape of _scan_batch's result. The history scan uses this too.
+    """
+    with ProcessPoolExecutor(max_workers=1, **worker_setup()) as pool:
+        try:
+            return pool.submit(scan, items, *args).result()
+        except BrokenProcessPool:
+            # The batch crashes a worker on its own - give up on it
+            return (FindingBatch(), [(0, None)] * len(items),
+                    [(item[0], "worker process crashed") for item in items], None)
+
+
+def _plan_batch(batch, cache):
+    """Work out what each file of a batch needs. Returns (plan, worker items)."""
+    # Every plan entry is [path, stat, cached findings, rules to run, content hash];
+    # "rules to run" is None for all rules and [] when the cache answered fully
+    plan = []
+    items = []
+    for path, st in batch:
+        entry = [path, st, [], None, None]
+        # The walk only hands out regular files, so a stat is all the cache needs
+        cacheable = cache is not None and st is not None
+        size = st.st_size if st is not None else None
+        cached = cache.lookup(path, st) if cacheable else None
+        if cached is not None:
+            entry[4], entry[2], entry[3] = cached
+            if entry[3]:
+                items.append((path, size, entry[3], False))
+        else:
+            items.append((path, size, None, cacheable))
+        plan.append(entry)
+    return plan, items
+
+
+def _finish_batch(plan, found, results, cache):
+    """Combine cached and fresh findings of a batch in file order, storing new results.
+
+    Returns a FindingBatch.
+    """
+    if cache is None:
+        return found  # the worker scanned every file, already in order
+    findings = FindingBatch()
+    fresh = iter(results)
+    position = 0
+    for path, st, cached, missing, content_hash in plan:
+        if missing == []:
+            findings.extend(cached)  # answered by the cache alone
+            continue
+        count, new_hash = next(fresh)
+        new_findings = list(found.records(position, position + count))
+        position += count
+        merged = cache.merge(cached, new_findings)
+        content_hash = content_hash or new_hash
+        if content_hash is not None:
+            cache.store(path, st, content_hash, merged)
+        findings.extend(merged)
+    return findings
+
+
+def _take_ready(done, next_index, plans, errors, cache):
+    """Pop the finished batches that are next in line. Returns (FindingBatches, next_index)."""
+    ready = []
+    stats = current_stats()
+    while next_index in done:
+        found, results, batch_errors, batch_stats = done.pop(next_index)
+        if errors is not None:
+            errors.extend(batch_errors)
+        if stats is not None:
+            stats.merge(batch_stats)
+        findings = _finish_batch(plans.pop(next_index), found, results, cache)
+        if len(findings):
+            ready.append(findings)
+        next_index += 1
+    return ready, next_index
+
+
+def scan_directory_parallel(directory, jobs, errors=None, cache=None, path_filter=None):
+    """Scan a directory with a pool of worker processes, yielding findings in order."""
+    for batch in scan_directory_parallel_batches(directory, jobs, errors, cache, path_filter):
+        yield from batch
+
+
+def scan_directory_parallel_batches(directory, jobs, errors=None, cache=None, path_filter=None):
+    """Like scan_directory_parallel, but yields the findings as FindingBatches."""
+    batches = enumerate(_iter_batches(directory, path_filter))
+    exhausted = False   # the walk has produced its last batch
+    submitted = 0       # number of batches taken from the walk so far
+    plans = {}          # what each submitted batch still needs
+    items = {}          # the work sent to the pool, for each batch not back yet
+    done = {}           # finished batches waiting for their turn
+    next_index = 0      # next batch number to yield
+
+    while not exhausted or next_index < submitted:
+        pool = ProcessPoolExecutor(max_workers=jobs, **worker_setup())
+        in_flight = {}
+        try:
+            while not exhausted or in_flight:
+                # Keep a bounded window of batches that are queued or waiting
+                # for their turn, so memory stays flat behind a slow batch
+                while not exhausted and len(in_flight) + len(done) < jobs * 4:
+                    batch = next(batches, None)
+                    if batch is None:
+                        exhausted = True
+                        break
+                    index, files = batch
+                    submitted += 1
+                    plans[index], batch_items = _plan_batch(files, cache)
+                    if batch_items:
+                        items[index] = batch_items
+                        in_flight[pool.submit(_scan_batch, batch_items)] = index
+                    else:
+                        done[index] = (FindingBatch(), [], [], None)  # nothing left for the workers
+
+                if in_flight:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        result = future.result()  # raises if a worker died
+                        index = in_flight.pop(future)
+                        done[index] = result
+                        del items[index]
+
+                # Stream every batch that is next in line
+                ready, next_index = _take_ready(done, next_index, plans, errors, cache)
+                yield from ready
+        except BrokenProcessPool:
+            # A worker died and took every batch sent to the pool with it -
+            # including one whose submit() found the pool already broken.
+            # Rescan those one at a time so only the batch that really
+            # crashes is lost
+            for index in sorted(items):
+                done[index] = scan_isolated(items.pop(index), _scan_batch)
+            ready, next_index = _take_ready(done, next_index, plans, errors, cache)
+            yield from ready
+        finally:
+            # Once everything is done the workers are joined: left to exit on
+            # their own they can miss the shutdown signal when this scan runs
+            # inside another worker process (the benchmarks do that)
+            pool.shutdown(wait=not in_flight, cancel_futures=True)
@@ -0,0 +1,207 @@
+import asyncio
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from src.secret_scanner.scanner.scanner import LARGE_FILE_SIZE, iter_bytes, scan_file, worker_setup
+from src.secret_scanner.scanner.skipped import take_skipped
+from src.secret_scanner.scanner.stats import current_stats, worker_snapshot
+from src.secret_scanner.scanner.walk import iter_files
+
+# -------------------
+# Asyncio scan pipeline
+# -------------------
+# On slow network and FUSE mounts a scan mostly WAITS for reads, and the plain
+# scan pays that latency file after file. Here the scan is split into stages
+# joined by BOUNDED queues, so many reads are in flight at once while the
+# matchers and the sink work on what has already arrived:
+#
+#     walk -> readers (threads) -> matchers (processes) -> in-order sink
+#
+# A full queue makes the stage in front of it wait, so a slow sink (the
+# database) slows the readers down instead of letting memory grow. Findings
+# reach the sink in the same order as a serial scan.
+
+# Files read concurrently
+READERS = 16
+# Files read into memory and waiting for a matcher
+CONTENT_QUEUE_SIZE = 64
+# Files the walk may run ahead of the sink, whatever stage they are in
+WINDOW = 1024
+# Paths taken from the walk per trip to its thread
+WALK_CHUNK = 256
+
+
+def _read(path):
+    """Read a whole file (runs in a reader thread)."""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _match(path, data, size, snapshot=False):
+    """Match one file (runs in a matcher process). Large files are left on disk.
+
+    Returns (findings, lines guarded rules skipped, statistics snapshot of the
+    worker or None).
+    """
+    if data is None:
+        findings = scan_file(path, size=size)
+    else:
+        findings = list(iter_bytes(path, data))
+    return findings, take_skipped(), worker_snapshot() if snapshot else None
+
+
+class _Pipeline:
+    """State shared by the stages of one pipeline run."""
+
+    def __init__(self, jobs, readers, errors):
+        self.loop = asyncio.get_running_loop()
+        self.io_pool = ThreadPoolExecutor(max_workers=readers)
+        # A single matcher runs in a thread; more get processes, since the
+        # regex engine holds the GIL
+        if jobs == 1:
+            self.cpu_pool = ThreadPoolExecutor(max_workers=1)
+        else:
+            self.cpu_pool = ProcessPoolExecutor(max_workers=jobs, **worker_setup())
+        self.readers = readers
+        self.errors = errors
+        # Matcher processes send their statistics back with every file; a
+        # matcher thread already counts into this process's statistics
+        self.stats = current_stats()
+        self.snapshot = self.stats is not None and jobs != 1
+
+        self.paths = asyncio.Queue(readers * 2)             # (index, path, stat)
+        self.contents = asyncio.Queue(CONTENT_QUEUE_SIZE)   # (index, path, data, size)
+        self.window = asyncio.Semaphore(WINDOW)
+        self.done = {}                 # index -> findings, waiting for their turn
+        self.ready = asyncio.Event()   # set whenever `done` gets a new entry
+        self.total = None              # number of files, once the walk is over
+
+    def finish(self, index, findings, path=None, error=None):
+        """Hand one file's findings (or its error) to the sink stage."""
+        if error is not None and self.errors is not None:
+            self.errors.append((path, error))
+        self.done[index] = findings
+        self.ready.set()
+
+    async def walk(self, directory, path_filter):
+        """Feed the readers from the directory walk."""
+        files = iter_files(directory, path_filter)
+        count = 0
+        while True:
+            # The walk itself blocks, so it runs in a thread a chunk at a time
+            chunk = await self.loop.run_in_executor(
+                self.io_pool, list, itertools.islice(files, WALK_CHUNK)
+            )
+            if not chunk:
+                break
+            for path, st in chunk:
+                await self.window.acquire()  # released once the sink took the file
+                await self.paths.put((count, path, st))
+                count += 1
+        self.total = count
+        self.ready.set()
+        for _ in range(self.readers):
+            await self.paths.put(None)
+
+    async def read(self):
+        """Reader stage: pull files into memory, leaving large ones on disk."""
+        while True:
+            item = await self.paths.get()
+            if item is None:
+                return
+            index, path, st = item
+            size = st.st_size if st is not None else None
+            data = None
+            if size is None or size < LARGE_FILE_SIZE:
+                read = _read if self.stats is None else self.stats.timed("read", _read)
+                try:
+                    data = await self.loop.run_in_executor(self.io_pool, read, path)
+                except OSError as exc:
+                    self.finish(index, [], path, str(exc))
+                    continue
+            await self.contents.put((index, path, data, size))
+
+    async def match(self):
+        """Matcher stage: run the rules over the files that have been read."""
+        while True:
+            item = await self.contents.get()
+            if item is None:
+                return
+            index, path, data, size = item
+            try:
+                findings, skipped, stats = await self.loop.run_in_executor(
+                    self.cpu_pool, _match, path, data, size, self.snapshot
+                )
+            except (OSError, UnicodeError) as exc:
+                self.finish(index, [], path, str(exc))
+                continue
+            if stats is not None:
+                self.stats.merge(stats)
+            if skipped and self.errors is not None:
+                self.errors.extend(skipped)
+            self.finish(index, findings)
+
+    async def sink(self, handle):
+        """Sink stage: hand findings over in walk order, in a thread of their own."""
+        index = 0
+        while self.total is None or index < self.total:
+            if index not in self.done:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+
+            # Everything that is next in line goes to the sink in one call
+            batch = []
+            while index in self.done:
+                batch.extend(self.done.pop(index))
+                index += 1
+                self.window.release()
+            if batch:
+                # `handle` may block on the database, so keep it off the loop
+                await asyncio.to_thread(handle, batch)
+
+    def close(self, wait=False):
+        """Stop the reader threads and matcher processes (joining them if `wait`)."""
+        self.io_pool.shutdown(wait=wait, cancel_futures=True)
+        self.cpu_pool.shutdown(wait=wait, cancel_futures=True)
+
+
+async def scan_directory_async(directory, handle, jobs=1, readers=READERS, errors=None,
+                               path_filter=None):
+    """Scan a directory through the asyncio pipeline.
+
+    `handle` is called with each list of findings, in walk order, from a
+    worker thread. Returns when every file has been handed over.
+    """
+    jobs = jobs or os.cpu_count()  # jobs=0 means "one matcher per CPU"
+    pipeline = _Pipeline(jobs, readers, errors)
+    walk = asyncio.ensure_future(pipeline.walk(directory, path_filter))
+    readers_done = asyncio.gather(*(pipeline.read() for _ in range(readers)))
+    matchers = [asyncio.ensure_future(pipeline.match()) for _ in range(jobs)]
+    sink = asyncio.ensure_future(pipeline.sink(handle))
+
+    async def stop_matchers():
+        await readers_done
+        for _ in matchers:
+            await pipeline.contents.put(None)
+        await asyncio.gather(*matchers)
+
+    stages = [walk, readers_done, asyncio.ensure_future(stop_matchers()), sink]
+    finished = False
+    try:
+        # The first stage to fail stops the whole pipeline
+        for stage in asyncio.as_completed(stages):
+            await stage
+        finished = True
+    finally:
+        for stage in stages + matchers:
+            stage.cancel()
+        # Idle workers are joined after a complete run, like the parallel scan does
+        pipeline.close(wait=finished)
+
+
+def scan_directory_pipelined(directory, handle, jobs=1, readers=READERS, errors=None,
+                             path_filter=None):
+    """Run scan_directory_async from synchronous code."""
+    asyncio.run(scan_directory_async(directory, handle, jobs, readers, errors, path_filter))
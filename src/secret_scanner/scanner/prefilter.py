@@ -0,0 +1,135 @@
+import re
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover - older Pythons
+    import sre_parse
+
+# pyahocorasick is optional - without it we fall back to one regex of literals
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# -------------------
+# Literal-keyword prefilter
+# -------------------
+# Almost every rule needs some literal text to be present before it can match
+# ("AKIA", "-----BEGIN", "password", ...). Looking for all those literals at once
+# is much cheaper than running every full regex, so lines without any keyword
+# are skipped before the matcher ever sees them.
+
+# Keywords shorter than this match almost everything and don't filter anything
+MIN_KEYWORD_LENGTH = 3
+
+
+def _literal_runs(parsed):
+    """Return the runs of consecutive literal characters in a parsed sequence."""
+    runs = []
+    current = []
+    for op, arg in parsed:
+        if op is sre_parse.LITERAL:
+            current.append(chr(arg))
+            continue
+        # Anything else (classes, repeats, groups...) ends the current run
+        if current:
+            runs.append("".join(current))
+            current = []
+        if op is sre_parse.SUBPATTERN:
+            # A plain group is still required, so look for literals inside it
+            runs.extend(_literal_runs(arg[-1]))
+    if current:
+        runs.append("".join(current))
+    return runs
+
+
+def _required_keywords(parsed):
+    """Return a list of literals of which at least one must appear, or None."""
+    # A whole pattern that is one alternation needs a keyword from every branch
+    if len(parsed) == 1:
+        op, arg = parsed[0]
+        if op is sre_parse.BRANCH:
+            keywords = []
+            for branch in arg[1]:
+                branch_keywords = _required_keywords(branch)
+                if not branch_keywords:
+                    return None
+                keywords.extend(branch_keywords)
+            return keywords
+        if op is sre_parse.SUBPATTERN:
+            return _required_keywords(arg[-1])
+
+    runs = [run for run in _literal_runs(parsed) if len(run) >= MIN_KEYWORD_LENGTH]
+    if not runs:
+        return None
+    # The longest literal is the most selective one
+    return [max(runs, key=len)]
+
+
+def extract_keywords(pattern):
+    """Pull the required literal keywords out of a regex pattern (lowercased)."""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return []
+    keywords = _required_keywords(parsed) or []
+    return [keyword.lower() for keyword in keywords]
+
+
+class KeywordPrefilter:
+    """Finds which rules are worth running on a piece of text using their keywords."""
+
+    def __init__(self, rule_keywords, binary=False):
+        # rule_keywords is a LIST with one entry per rule index: a list of keywords
+        # (lowercased) or an empty list for rules that must always run.
+        # In binary mode the text to check is bytes, so keywords are encoded too
+        self.binary = binary
+        self.always = set()
+        self._keyword_rules = {}
+        for index, keywords in enumerate(rule_keywords):
+            if not keywords:
+                self.always.add(index)
+                continue
+            for keyword in keywords:
+                keyword = keyword.lower()
+                if binary:
+                    keyword = keyword.encode("utf-8")
+                self._keyword_rules.setdefault(keyword, set()).add(index)
+
+        self._automaton = None
+        self._regex = None
+        if not self._keyword_rules:
+            return
+
+        if ahocorasick is not None:
+            # One Aho-Corasick automaton over every keyword of every rule
+            self._automaton = ahocorasick.Automaton()
+            for keyword, indices in self._keyword_rules.items():
+                if binary:
+                    # The automaton works on str - latin-1 maps bytes 1:1
+                    keyword = keyword.decode("latin-1")
+                self._automaton.add_word(keyword, frozenset(indices))
+            self._automaton.make_automaton()
+        else:
+            # A single alternation of literals answers "is any keyword here?"
+            separator = b"|" if binary else "|"
+            self._regex = re.compile(separator.join(re.escape(k) for k in self._keyword_rules))
+
+    def candidates(self, text):
+        """Return the set of rule indices that could match the given text."""
+        found = set(self.always)
+        if self._automaton is not None:
+            lowered = text.lower()
+            if self.binary:
+                lowered = lowered.decode("latin-1")
+            for _, indices in self._automaton.iter(lowered):
+                found.update(indices)
+        elif self._regex is not None:
+            lowered = text.lower()
+            if self._regex.search(lowered):
+                # findall() can't report keywords that overlap an earlier hit, so
+                # on the (rare) lines with a hit check every keyword directly
+                for keyword, indices in self._keyword_rules.items():
+                    if keyword in lowered:
+                        found.update(indices)
+        return found
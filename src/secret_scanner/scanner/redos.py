@@ -0,0 +1,479 @@
+import re
+
+from src.secret_scanner.scanner.skipped import note_skipped
+
+# The regex parser moved into the re package in Python 3.11
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # pragma: no cover - Python < 3.11
+    import sre_constants
+    import sre_parse
+
+# google-re2 is optional - a linear-time engine, so a rule it can compile
+# never needs a budget at all. The regex module is optional too - unlike re it
+# can stop a search after a timeout. Both are only imported by the first
+# RuleGuard (see _load_engines), so scans without --guarded don't pay for them
+re2 = None
+regex = None
+_engines_loaded = False
+
+# -------------------
+# Catastrophic backtracking (ReDoS)
+# -------------------
+# Python's re backtracks, so some patterns take exponential or polynomial time
+# on unlucky input, and a single long line (minified JS, a log dump) can stall
+# a scan for minutes. Two defences:
+#
+#   * backtracking_risks() spots the usual culprits when rules are loaded, by
+#     walking the parsed pattern: nested quantifiers like (a+)+, quantified
+#     alternations whose branches overlap like (a|ab)*, and quantifiers that
+#     give back characters to whatever follows them like .+" or \w*\w*.
+#
+#   * A RuleGuard runs the flagged rules under a budget. It uses the
+#     fastest safe engine installed: google-re2 (linear time, nothing to
+#     budget), then the regex module (searches time out), and otherwise plain
+#     re. A line a rule can't finish within its budget is skipped FOR THAT
+#     RULE and reported, instead of hanging. Plain re has no timeout, so a
+#     line longer than max_line is searched in overlapping windows of
+#     max_line characters (bounding the backtracking); a rule that finds
+#     nothing there is reported as not fully searched. Rules that aren't
+#     flagged never run under the guard and always see the whole line.
+
+# Repeats with a bigger upper bound than this count as unbounded
+LARGE_REPEAT = 256
+
+# Per-rule, per-line time budget (seconds) when the regex module is used
+DEFAULT_BUDGET = 0.05
+
+# Longest line a flagged rule may run on when only plain re is available
+DEFAULT_MAX_LINE = 10000
+
+# Risk levels, worst first
+EXPONENTIAL = "exponential"
+POLYNOMIAL = "polynomial"
+
+_REPEATS = {"MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"}
+_NO_WIDTH = {"AT", "ASSERT", "ASSERT_NOT"}
+
+# Character classes, over ASCII plus one stand-in (128) for everything else
+_EVERYTHING = frozenset(range(129))
+_DIGITS = frozenset(range(48, 58))
+_WORD = _DIGITS | frozenset(range(65, 91)) | frozenset(range(97, 123)) | {95, 128}
+_SPACE = frozenset(b" \t\n\r\f\v")
+_CATEGORIES = {
+    "CATEGORY_DIGIT": _DIGITS,
+    "CATEGORY_NOT_DIGIT": _EVERYTHING - _DIGITS,
+    "CATEGORY_SPACE": _SPACE,
+    "CATEGORY_NOT_SPACE": _EVERYTHING - _SPACE,
+    "CATEGORY_WORD": _WORD,
+    "CATEGORY_NOT_WORD": _EVERYTHING - _WORD,
+    "CATEGORY_LINEBREAK": frozenset(b"\n"),
+    "CATEGORY_NOT_LINEBREAK": _EVERYTHING - frozenset(b"\n"),
+}
+
+
+def _literal(code, ignorecase):
+    if code > 127:
+        return frozenset({128})
+    char = chr(code)
+    if ignorecase:
+        return frozenset({ord(char.lower()), ord(char.upper())})
+    return frozenset({code})
+
+
+def _class_chars(items, ignorecase):
+    """Characters matched by the contents of a [...] class."""
+    chars = set()
+    negate = False
+    for op, av in items:
+        name = op.name
+        if name == "NEGATE":
+            negate = True
+        elif name == "LITERAL":
+            chars |= _literal(av, ignorecase)
+        elif name == "RANGE":
+            low, high = av
+            for code in range(low, min(high, 127) + 1):
+                chars |= _literal(code, ignorecase)
+            if high > 127:
+                chars.add(128)
+        elif name == "CATEGORY":
+            chars |= _CATEGORIES.get(av.name, _EVERYTHING)
+        else:
+            chars |= _EVERYTHING  # anything unusual: assume the worst
+    return _EVERYTHING - chars if negate else frozenset(chars)
+
+
+def _ignorecase(av, ignorecase):
+    """Case-insensitivity inside a (?flags:...) group."""
+    flags = sre_constants.SRE_FLAG_IGNORECASE
+    _, add_flags, del_flags, _ = av
+    return (ignorecase or bool(add_flags & flags)) and not del_flags & flags
+
+
+def _is_unbounded(av):
+    return av[1] == sre_constants.MAXREPEAT or av[1] > LARGE_REPEAT
+
+
+def _chars(sequence, ignorecase):
+    """Every character a sequence can consume, anywhere in its match."""
+    chars = set()
+    for op, av in sequence:
+        name = op.name
+        if name == "LITERAL":
+            chars |= _literal(av, ignorecase)
+        elif name == "NOT_LITERAL":
+            chars |= _EVERYTHING - _literal(av, ignorecase)
+        elif name == "ANY":
+            chars |= _EVERYTHING
+        elif name == "IN":
+            chars |= _class_chars(av, ignorecase)
+        elif name in _REPEATS:
+            chars |= _chars(av[2], ignorecase)
+        elif name == "SUBPATTERN":
+            chars |= _chars(av[3], _ignorecase(av, ignorecase))
+        elif name == "BRANCH":
+            for branch in av[1]:
+                chars |= _chars(branch, ignorecase)
+        elif name == "ATOMIC_GROUP":
+            chars |= _chars(av, ignorecase)
+        elif name in ("GROUPREF", "GROUPREF_EXISTS"):
+            chars |= _EVERYTHING
+    return frozenset(chars)
+
+
+def _first(sequence, ignorecase):
+    """Return (characters a sequence's match can start with, whether it can be empty)."""
+    chars = set()
+    for op, av in sequence:
+        name = op.name
+        if name in _NO_WIDTH:
+            continue
+        if name in _REPEATS:
+            first, nullable = _first(av[2], ignorecase)
+            chars |= first
+            if av[0] > 0 and not nullable:
+                return frozenset(chars), False
+            continue
+        if name == "SUBPATTERN":
+            first, nullable = _first(av[3], _ignorecase(av, ignorecase))
+        elif name == "ATOMIC_GROUP":
+            first, nullable = _first(av, ignorecase)
+        elif name == "BRANCH":
+            first, nullable = set(), False
+            for branch in av[1]:
+                branch_first, branch_nullable = _first(branch, ignorecase)
+                first |= branch_first
+                nullable = nullable or branch_nullable
+        else:
+            first, nullable = _chars([(op, av)], ignorecase), False
+        chars |= first
+        if not nullable:
+            return frozenset(chars), False
+    return frozenset(chars), True
+
+
+def _tail_variable(sequence, ignorecase):
+    """Characters of the variable-length parts a sequence can END with.
+
+    These are repeats like x+ or x? and alternations with an empty branch
+    (the parser turns a|aa into a(?:|a)).
+    """
+    chars = set()
+    for op, av in reversed(list(sequence)):
+        name = op.name
+        if name in _NO_WIDTH:
+            continue
+        if name in _REPEATS:
+            if av[0] != av[1]:
+                chars |= _chars(av[2], ignorecase)
+            chars |= _tail_variable(av[2], ignorecase)
+            if av[0] > 0:
+                break
+            continue
+        if name == "SUBPATTERN":
+            inner = _ignorecase(av, ignorecase)
+            chars |= _tail_variable(av[3], inner)
+            if not _first(av[3], inner)[1]:
+                break
+            continue
+        if name == "BRANCH":
+            nullable = False
+            for branch in av[1]:
+                chars |= _tail_variable(branch, ignorecase)
+                branch_first, branch_nullable = _first(branch, ignorecase)
+                nullable = nullable or branch_nullable
+            if nullable:
+                for branch in av[1]:
+                    chars |= _first(branch, ignorecase)[0]
+                continue
+        break
+    return frozenset(chars)
+
+
+def _branches(sequence):
+    """The alternatives of a repeat body that is one alternation (maybe in a group)."""
+    sequence = list(sequence)
+    while len(sequence) == 1:
+        op, av = sequence[0]
+        if op.name == "BRANCH":
+            return av[1]
+        if op.name != "SUBPATTERN":
+            break
+        sequence = list(av[3])
+    return []
+
+
+def _gives_back(items, index, chars, ignorecase):
+    """Whether what follows items[index] can start with one of `chars`."""
+    for follower in items[index + 1:]:
+        follow_first, nullable = _first([follower], ignorecase)
+        if follow_first & chars:
+            return True
+        if not nullable:
+            return False
+    return False
+
+
+def _ambiguous(sequence, ignorecase):
+    """Whether a sequence holds a variable-length repeat that gives characters back."""
+    items = list(sequence)
+    for index, (op, av) in enumerate(items):
+        name = op.name
+        if name in _REPEATS:
+            if av[0] != av[1] and _gives_back(items, index, _chars(av[2], ignorecase), ignorecase):
+                return True
+            if _ambiguous(av[2], ignorecase):
+                return True
+        elif name == "SUBPATTERN":
+            if _ambiguous(av[3], _ignorecase(av, ignorecase)):
+                return True
+        elif name == "BRANCH":
+            if any(_ambiguous(branch, ignorecase) for branch in av[1]):
+                return True
+    return False
+
+
+def _check(sequence, ignorecase, risks):
+    """Walk a parsed (sub)pattern, adding (level, reason) pairs to `risks`."""
+    items = list(sequence)
+    for index, (op, av) in enumerate(items):
+        name = op.name
+        if name in _REPEATS:
+            body = av[2]
+            _check(body, ignorecase, risks)
+            if not _is_unbounded(av) or name == "POSSESSIVE_REPEAT":
+                continue
+            text = _describe(op, av)
+
+            # The body can split a run of characters in several ways - at the
+            # end of one iteration, or inside it - and the repeat tries every
+            # combination of those splits: exponential
+            first, _ = _first(body, ignorecase)
+            if _tail_variable(body, ignorecase) & first or _ambiguous(body, ignorecase):
+                risks.append((EXPONENTIAL, f"nested quantifier {text}"))
+            else:
+                seen = set()
+                for branch in _branches(body):
+                    branch_first, _ = _first(branch, ignorecase)
+                    if branch_first & seen:
+                        risks.append((EXPONENTIAL, f"repeated alternation with overlapping branches {text}"))
+                        break
+                    seen |= branch_first
+
+            # Whatever follows may start with characters the repeat also
+            # takes, so it gives them back one at a time - on every start
+            if _gives_back(items, index, _chars(body, ignorecase), ignorecase):
+                risks.append((POLYNOMIAL, f"{text} gives back characters to what follows it"))
+        elif name == "SUBPATTERN":
+            _check(av[3], _ignorecase(av, ignorecase), risks)
+        elif name == "BRANCH":
+            for branch in av[1]:
+                _check(branch, ignorecase, risks)
+        elif name in ("ASSERT", "ASSERT_NOT"):
+            _check(av[1], ignorecase, risks)
+        elif name == "ATOMIC_GROUP":
+            _check(av, ignorecase, risks)
+
+
+_CATEGORY_TEXT = {
+    "CATEGORY_DIGIT": r"\d", "CATEGORY_NOT_DIGIT": r"\D", "CATEGORY_SPACE": r"\s",
+    "CATEGORY_NOT_SPACE": r"\S", "CATEGORY_WORD": r"\w", "CATEGORY_NOT_WORD": r"\W",
+}
+
+
+def _describe(op, av):
+    """Rebuild the text of a repeat like '.+' or '\\s*' for messages (the parser drops it)."""
+    low, high, body = av
+    if high == sre_constants.MAXREPEAT:
+        bound = "*" if low == 0 else "+" if low == 1 else "{%d,}" % low
+    else:
+        bound = "{%d,%d}" % (low, high)
+    atom = "(...)"
+    if len(body) == 1:
+        name, value = body[0][0].name, body[0][1]
+        if name == "ANY":
+            atom = "."
+        elif name == "LITERAL":
+            atom = re.escape(chr(value))
+        elif name == "NOT_LITERAL":
+            atom = "[^%s]" % re.escape(chr(value))
+        elif name == "IN" and len(value) == 1 and value[0][0].name == "CATEGORY":
+            atom = _CATEGORY_TEXT.get(value[0][1].name, "[...]")
+        elif name == "IN":
+            atom = "[...]"
+    return f"'{atom}{bound}'"
+
+
+def backtracking_risks(pattern):
+    """Return a list of (level, reason) for the backtracking hazards of a pattern."""
+    if isinstance(pattern, bytes):
+        pattern = pattern.decode("latin-1")
+    parsed = sre_parse.parse(pattern)
+    ignorecase = bool(parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE)
+    risks = []
+    _check(parsed, ignorecase, risks)
+    # Worst first, each reason once
+    unique = list(dict.fromkeys(risks))
+    return sorted(unique, key=lambda risk: risk[0] != EXPONENTIAL)
+
+
+class RuleBudgetExceeded(Exception):
+    """A guarded rule couldn't finish a search within its budget."""
+
+    reason = "skipped (over its time budget)"
+
+
+class RuleLineTooLong(RuleBudgetExceeded):
+    """A guarded rule on plain re found nothing in a line it could only search in windows."""
+
+    def __init__(self, max_line):
+        super().__init__()
+        self.reason = ("not fully searched (line longer than %d characters; "
+                       "google-re2 or the regex module can search it whole)" % max_line)
+
+
+class _GuardedRegex:
+    """One rule's regex behind a budget; search()/finditer() raise RuleBudgetExceeded."""
+
+    def __init__(self, compiled, engine, guard):
+        self.compiled = compiled
+        self.engine = engine
+        self.groups = compiled.groups
+        self._guard = guard
+
+    def _windowed(self, pos, end):
+        """Tell whether plain re has to search text[pos:end] in windows."""
+        return self.engine == "re" and end - pos > self._guard.max_line
+
+    def _windows(self, pos, end):
+        """Yield (start, stop) of windows of max_line characters, each overlapping the next by half.
+
+        Every match up to half a window long lies wholly inside one of them.
+        """
+        size = self._guard.max_line
+        for start in range(pos, end, max(1, size // 2)):
+            stop = min(end, start + size)
+            yield start, stop
+            if stop == end:
+                return
+
+    def limit(self):
+        """Longest stretch of text worth one search, or None for no limit (re2)."""
+        return None if self.engine == "re2" else self._guard.max_line
+
+    def search(self, text, pos=0, endpos=None):
+        endpos = len(text) if endpos is None else endpos
+        if self._windowed(pos, endpos):
+            for start, stop in self._windows(pos, endpos):
+                match = self.compiled.search(text, start, stop)
+                if match:
+                    return match
+            raise RuleLineTooLong(self._guard.max_line)
+        if self.engine != "regex":
+            return self.compiled.search(text, pos, endpos)
+        try:
+            return self.compiled.search(text, pos, endpos, timeout=self._guard.budget)
+        except TimeoutError as exc:
+            raise RuleBudgetExceeded() from exc
+
+    def finditer(self, text):
+        if self._windowed(0, len(text)):
+            found = []
+            for start, stop in self._windows(0, len(text)):
+                for match in self.compiled.finditer(text, start, stop):
+                    # Matches in the overlap were seen in the previous window
+                    if not found or match.start() >= found[-1].end():
+                        found.append(match)
+            if not found:
+                raise RuleLineTooLong(self._guard.max_line)
+            return found
+        if self.engine != "regex":
+            return list(self.compiled.finditer(text))
+        try:
+            # The timeout covers the whole iteration, like one search()
+            return list(self.compiled.finditer(text, timeout=self._guard.budget))
+        except TimeoutError as exc:
+            raise RuleBudgetExceeded() from exc
+
+
+def _load_engines():
+    """Import google-re2 and the regex module, whichever are installed."""
+    global re2, regex, _engines_loaded
+    if _engines_loaded:
+        return
+    _engines_loaded = True
+    try:
+        import re2 as re2_module
+        re2 = re2_module
+    except ImportError:
+        pass
+    try:
+        import regex as regex_module
+        regex = regex_module
+    except ImportError:
+        pass
+
+
+class RuleGuard:
+    """Settings of guarded matching: the per-line budget of every flagged rule."""
+
+    def __init__(self, budget=DEFAULT_BUDGET, max_line=DEFAULT_MAX_LINE):
+        self.budget = budget
+        self.max_line = max_line
+        _load_engines()
+
+    def engine(self):
+        """Name of the engine flagged rules run on: "re2", "regex" or "re"."""
+        if re2 is not None:
+            return "re2"
+        return "regex" if regex is not None else "re"
+
+    def describe(self):
+        """A stable description of the settings, part of the matcher cache key."""
+        return "guard:%s:%r:%d" % (self.engine(), self.budget, self.max_line)
+
+    def compile(self, pattern, level):
+        """Compile a flagged rule with the safest engine that accepts it.
+
+        Returns None when the rule can't be bounded at all: a line length
+        limit doesn't tame exponential backtracking, so with plain re such a
+        rule is switched off rather than allowed to hang the scan.
+        """
+        if re2 is not None:
+            try:
+                return _GuardedRegex(re2.compile(pattern), "re2", self)
+            except Exception:  # re2 rejects backreferences, lookarounds...
+                pass
+        if regex is not None:
+            return _GuardedRegex(regex.compile(pattern), "regex", self)
+        if level == EXPONENTIAL:
+            return None
+        return _GuardedRegex(re.compile(pattern), "re", self)
+
+
+def note_skips(path, lineno, matcher):
+    """Record (and clear) the rules a matcher skipped on the line it just matched."""
+    for name, reason in matcher.skipped:
+        note_skipped(path, f"line {lineno}: rule {name!r} {reason}")
+    matcher.skipped.clear()
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import re
+import sys
+
+from src.secret_scanner.scanner.matcher import check_pattern
+from src.secret_scanner.scanner.prefilter import extract_keywords
+from src.secret_scanner.scanner.redos import backtracking_risks
+
+
+def _yaml():
+    """Return PyYAML, or None - it is optional, and only imported for YAML packs."""
+    try:
+        import yaml
+    except ImportError:
+        return None
+    return yaml
+
+
+def _tomllib():
+    """Return a TOML parser, or None: tomllib from Python 3.11, tomli before that."""
+    try:
+        import tomllib
+    except ImportError:  # pragma: no cover - older Pythons
+        try:
+            import tomli as tomllib
+        except ImportError:
+            return None
+    return tomllib
+
+# -------------------
+# Rule packs
+# -------------------
+# Rules can be shipped as PACK files (JSON, YAML or TOML) instead of being
+# hard-coded. A pack holds a list of rules:
+#
+#     [[rules]]
+#     id = "Slack Token"
+#     regex = "xox[baprs]-[0-9A-Za-z-]{10,48}"
+#     keywords = ["xoxb", "xoxa", "xoxp", "xoxr", "xoxs"]   # optional
+#     entropy = 3.5                                         # optional
+#     allowlist = ["xoxb-EXAMPLE"]                          # optional
+#
+# Loading a pack means parsing it, compiling every regex once to validate it
+# and pulling keywords out of the regexes - the slow part with thousands of
+# rules. The result is cached on disk under the hash of the pack's bytes, so
+# the next run just reads back one JSON file, and a pack that changes in any
+# way gets a new hash and is loaded from scratch. The backtracking check of
+# every regex (see redos.py) is cached along with it.
+
+# Bumped whenever the cached format (or the way rules are validated or keywords
+# extracted) changes
+RULE_CACHE_VERSION = 3
+
+DEFAULT_RULE_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "secret_scanner",
+    "rules",
+)
+
+# Every key a rule may have - anything else is most likely a typo
+RULE_KEYS = {"id", "regex", "keywords", "entropy", "allowlist"}
+
+
+class RulePackError(ValueError):
+    """A rule pack can't be read or contains an invalid rule."""
+
+
+def _parse(path, data):
+    """Decode a pack file according to its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        if extension == ".json":
+            return json.loads(data)
+        if extension in (".yaml", ".yml"):
+            yaml = _yaml()
+            if yaml is None:
+                raise RulePackError(f"{path}: PyYAML is needed to read YAML rule packs")
+            return yaml.safe_load(data)
+        if extension == ".toml":
+            tomllib = _tomllib()
+            if tomllib is None:
+                raise RulePackError(f"{path}: tomli is needed to read TOML rule packs")
+            return tomllib.loads(data.decode("utf-8"))
+    except RulePackError:
+        raise
+    except Exception as exc:  # every parser has its own error types
+        raise RulePackError(f"{path}: can't parse rule pack: {exc}") from exc
+    raise RulePackError(f"{path}: unknown rule pack format (use .json, .yaml, .yml or .toml)")
+
+
+def _validate_rule(rule, where):
+    """Check one rule and return it in normalized form."""
+    if not isinstance(rule, dict):
+        raise RulePackError(f"{where}: a rule must be a table/mapping")
+    unknown = set(rule) - RULE_KEYS
+    if unknown:
+        raise RulePackError(f"{where}: unknown keys {', '.join(sorted(unknown))}")
+
+    rule_id = rule.get("id")
+    if not isinstance(rule_id, str) or not rule_id.strip():
+        raise RulePackError(f"{where}: 'id' must be a non-empty string")
+    where = f"{where} ({rule_id})"
+
+    regex = rule.get("regex")
+    if not isinstance(regex, str) or not regex:
+        raise RulePackError(f"{where}: 'regex' must be a non-empty string")
+    try:
+        # The way the matcher will: as text, as bytes and inside the combined regex
+        check_pattern(regex)
+    except re.error as exc:
+        raise RulePackError(f"{where}: invalid regex: {exc}") from exc
+
+    keywords = rule.get("keywords")
+    if keywords is None:
+        keywords = extract_keywords(regex)  # done once here, not on every start
+    elif not isinstance(keywords, list) or not all(isinstance(k, str) and k for k in keywords):
+        raise RulePackError(f"{where}: 'keywords' must be a list of non-empty strings")
+
+    entropy = rule.get("entropy")
+    if entropy is not None:
+        if isinstance(entropy, bool) or not isinstance(entropy, (int, float)) or entropy < 0:
+            raise RulePackError(f"{where}: 'entropy' must be a non-negative number")
+        entropy = float(entropy)
+
+    allowlist = rule.get("allowlist") or []
+    if not isinstance(allowlist, list) or not all(isinstance(a, str) and a for a in allowlist):
+        raise RulePackError(f"{where}: 'allowlist' must be a list of regex strings")
+    for pattern in allowlist:
+        try:
+            check_pattern(pattern)
+        except re.error as exc:
+            raise RulePackError(f"{where}: invalid allowlist regex {pattern!r}: {exc}") from exc
+
+    return {
+        "id": rule_id,
+        "regex": regex,
+        "keywords": [k.lower() for k in keywords],
+        "entropy": entropy,
+        "allowlist": allowlist,
+        "risks": backtracking_risks(regex),
+    }
+
+
+def _validate(pack, path):
+    """Check a decoded pack and return its list of normalized rules."""
+    if not isinstance(pack, dict) or not isinstance(pack.get("rules"), list):
+        raise RulePackError(f"{path}: a rule pack needs a 'rules' list")
+    rules = []
+    seen = set()
+    for number, rule in enumerate(pack["rules"], start=1):
+        rule = _validate_rule(rule, f"{path}: rule #{number}")
+        if rule["id"] in seen:
+            raise RulePackError(f"{path}: rule id {rule['id']!r} is used twice")
+        seen.add(rule["id"])
+        rules.append(rule)
+    return rules
+
+
+def pack_hash(data):
+    """Hash a pack's raw bytes together with everything the cached form depends on."""
+    digest = hashlib.sha256()
+    digest.update(f"{RULE_CACHE_VERSION}:{sys.version_info[0]}.{sys.version_info[1]}:".encode())
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def load_rule_pack(path, cache_dir=DEFAULT_RULE_CACHE_DIR):
+    """Load, validate and normalize one rule pack, using the on-disk cache when possible."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as exc:
+        raise RulePackError(f"{path}: {exc.strerror or exc}") from exc
+
+    cache_path = os.path.join(cache_dir, pack_hash(data) + ".json") if cache_dir else None
+    if cache_path is not None:
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass  # not cached yet (or unreadable) - load it from scratch
+
+    rules = _validate(_parse(path, data), path)
+
+    if cache_path is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Written to a temporary file first, so a concurrent run never
+            # reads a half-written cache entry
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(rules, f)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            pass  # a read-only cache directory only costs speed
+    return rules
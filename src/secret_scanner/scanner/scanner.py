@@ -1,6 +1,23 @@
-import re
+import bisect
+import io
+import itertools
+import mmap
 import os
 
+from src.secret_scanner.scanner.archive import ArchiveLimits, archive_kind, iter_archive
+from src.secret_scanner.scanner.cache import hash_bytes, hash_file
+from src.secret_scanner.scanner.chunked import iter_buffer, iter_mapped_file
+from src.secret_scanner.scanner.entropy import ENTROPY_RULE, add_entropy_hit
+from src.secret_scanner.scanner.findings import FindingRecord
+from src.secret_scanner.scanner.matcher import get_matcher
+from src.secret_scanner.scanner.redos import backtracking_risks, note_skips
+from src.secret_scanner.scanner.skipped import take_skipped
+from src.secret_scanner.scanner.rules import DEFAULT_RULE_CACHE_DIR, load_rule_pack
+from src.secret_scanner.scanner.stats import (
+    TimedDetector, TimedMatcher, current_stats, disable_stats, enable_stats,
+)
+from src.secret_scanner.scanner.walk import SNIFF_SIZE, iter_files, looks_binary
+
 # -------------------
 # Simple secret regex patterns
 # -------------------
@@ -13,45 +30,389 @@ SECRET_PATTERNS = {
     "API Key": r"(?i)api[_-]?key\s*=\s*['\"].+['\"]",
 }
 
-def scan_file(path):
+# Literal keywords a rule needs before its regex is worth running. Rules listed
+# here override the keywords pulled out of the regex automatically; rules that
+# aren't listed (and have no usable literal) are always run
+RULE_KEYWORDS = {
+    "API Key": ["api_key", "api-key", "apikey"],
+}
+
+# Optional per-rule checks, only set by rule packs: the minimum Shannon entropy
+# of the matched secret, and regexes of known-harmless values
+RULE_ENTROPY = {}
+RULE_ALLOWLISTS = {}
+
+# Backtracking hazards of every rule that has some: name -> [(level, reason), ...]
+RULE_RISKS = {
+    name: risks for name, pattern in SECRET_PATTERNS.items()
+    if (risks := backtracking_risks(pattern))
+}
+
+# The built-in rules, kept so rule packs can always be layered on top of them
+BUILTIN_PATTERNS = dict(SECRET_PATTERNS)
+BUILTIN_KEYWORDS = dict(RULE_KEYWORDS)
+BUILTIN_RISKS = dict(RULE_RISKS)
+
+# Files at least this big are scanned as raw bytes through a memory map instead
+# of being decoded line by line
+LARGE_FILE_SIZE = 1024 * 1024
+
+# How many files the directory walk may run ahead of the scan
+WALK_PREFETCH = 1024
+
+# -------------------
+# Active rules
+# -------------------
+# The dictionaries above ARE the active rule set: every module imports them, so
+# use_rule_packs() updates them in place and the whole scanner (and the scan
+# cache fingerprints) follows. The optional entropy detector counts as one more
+# rule (ENTROPY_RULE). Worker processes repeat the same set-up on start-up.
+
+# The active entropy detector, None while it is switched off
+_entropy_detector = None
+# The active RuleGuard, None while guarded matching is off
+_rule_guard = None
+# Limits of archive scanning, None while archives are scanned as plain files
+_archive_limits = ArchiveLimits()
+# Set-up calls made in this process, by function name: (function, args)
+_setup_calls = {}
+# Matchers for the active rules, keyed by (binary, rule subset)
+_rule_matchers = {}
+
+# Lines matched together, so the entropy detector scores a whole block at once
+BLOCK_LINES = 1024
+
+
+def use_rule_packs(paths, builtin=True, cache_dir=DEFAULT_RULE_CACHE_DIR):
+    """Make the rules of the given packs (plus the built-in rules) the active rules.
+
+    Packs are applied in order; a rule whose id is already taken replaces the
+    earlier rule. Raises RulePackError for a missing or invalid pack.
+    """
+    patterns = dict(BUILTIN_PATTERNS) if builtin else {}
+    keywords = dict(BUILTIN_KEYWORDS) if builtin else {}
+    risks = dict(BUILTIN_RISKS) if builtin else {}
+    entropy = {}
+    allowlists = {}
+    for path in paths:
+        for rule in load_rule_pack(path, cache_dir):
+            name = rule["id"]
+            patterns[name] = rule["regex"]
+            keywords[name] = rule["keywords"]
+            risks.pop(name, None)
+            entropy.pop(name, None)
+            allowlists.pop(name, None)
+            if rule["risks"]:
+                risks[name] = [tuple(risk) for risk in rule["risks"]]
+            if rule["entropy"] is not None:
+                entropy[name] = rule["entropy"]
+            if rule["allowlist"]:
+                allowlists[name] = rule["allowlist"]
+
+    for active, new in ((SECRET_PATTERNS, patterns), (RULE_KEYWORDS, keywords),
+                        (RULE_RISKS, risks), (RULE_ENTROPY, entropy),
+                        (RULE_ALLOWLISTS, allowlists)):
+        active.clear()
+        active.update(new)
+    _rule_matchers.clear()
+    _setup_calls["use_rule_packs"] = (use_rule_packs, (list(paths), builtin, cache_dir))
+
+
+def use_entropy_detector(detector):
+    """Report high-entropy tokens found by an EntropyDetector (None switches it off)."""
+    global _entropy_detector
+    _entropy_detector = detector
+    _setup_calls["use_entropy_detector"] = (use_entropy_detector, (detector,))
+
+
+def use_guard(guard):
+    """Run the rules flagged in RULE_RISKS under a RuleGuard's budget (None switches it off)."""
+    global _rule_guard
+    _rule_guard = guard
+    _rule_matchers.clear()
+    _setup_calls["use_guard"] = (use_guard, (guard,))
+
+
+def use_archives(limits):
+    """Scan the members of archives within ArchiveLimits (None treats archives as plain files)."""
+    global _archive_limits
+    _archive_limits = limits
+    _setup_calls["use_archives"] = (use_archives, (limits,))
+
+
+def entropy_detector():
+    """Return the active EntropyDetector, or None while it is switched off."""
+    stats = current_stats()
+    if stats is None or _entropy_detector is None:
+        return _entropy_detector
+    return TimedDetector(_entropy_detector, stats, ENTROPY_RULE)
+
+
+def use_stats(enabled=True):
+    """Switch scan statistics on (returning the collector) or off, here and in workers."""
+    _setup_calls["use_stats"] = (use_stats, (enabled,))
+    if not enabled:
+        disable_stats()
+        return None
+    return enable_stats()
+
+
+def active_rules():
+    """Return rule name -> definition for every active rule, the entropy detector included."""
+    rules = dict(SECRET_PATTERNS)
+    if _entropy_detector is not None:
+        rules[ENTROPY_RULE] = _entropy_detector.describe()
+    return rules
+
+
+def _replay_setup(calls):
+    """Worker initializer: repeat the parent's set-up calls."""
+    for function, args in calls:
+        function(*args)
+
+
+def worker_setup():
+    """Return the ProcessPoolExecutor arguments that give workers the active rules."""
+    if not _setup_calls:
+        return {}
+    return {"initializer": _replay_setup, "initargs": (list(_setup_calls.values()),)}
+
+
+def _split_rules(patterns):
+    """Split a rule selection into (regex rules or None for all, entropy detector or None)."""
+    if patterns is None:
+        return None, entropy_detector()
+    if ENTROPY_RULE not in patterns or _entropy_detector is None:
+        return patterns, None
+    return {name: p for name, p in patterns.items() if name != ENTROPY_RULE}, entropy_detector()
+
+
+def scan_settings():
+    """Describe the set-up that changes what every rule finds, for the scan cache."""
+    return _archive_limits.describe() if _archive_limits is not None else "archives:off"
+
+
+def rule_matcher(patterns=None, binary=False):
+    """Return the Matcher for the active rules, or for a subset of them."""
+    # Only a subset of the rules is run when the scan cache knows the results
+    # of the others; the common case (all rules) is looked up without hashing every rule
+    key = (binary, None if patterns is None else tuple(patterns.items()))
+    matcher = _rule_matchers.get(key)
+    if matcher is None:
+        matcher = _rule_matchers[key] = get_matcher(
+            SECRET_PATTERNS if patterns is None else patterns,
+            RULE_KEYWORDS, binary, RULE_ENTROPY, RULE_ALLOWLISTS, _rule_guard, RULE_RISKS,
+        )
+    stats = current_stats()
+    return matcher if stats is None else TimedMatcher(matcher, stats)
+
+
+def scan_file_bytes(path, patterns=None):
+    """Scan a single file as raw bytes in bounded chunks. Returns list of findings."""
+    if not os.path.isfile(path):
+        return []
+    patterns, detector = _split_rules(patterns)
+    return list(iter_mapped_file(path, rule_matcher(patterns, binary=True), detector))
+
+# -------------------
+# Streaming (generator) API
+# -------------------
+# The iter_* functions YIELD findings as soon as they are found instead of
+# building a list, so callers (the DB writer, the terminal printer) can handle
+# them one at a time and memory doesn't grow with the size of the tree.
+# scan_file/scan_directory/scan_target are the list-returning versions.
+
+def iter_file(path, patterns=None, size=None):
+    """Yield the findings of a single file as they are found.
+
+    `size` comes from the directory walk; without it the file is stat'ed here.
+    """
+    if size is None:
+        if not os.path.isfile(path):
+            return
+        size = os.path.getsize(path)
+    stats = current_stats()
+    if stats is not None:
+        stats.count("files")
+        stats.count("bytes", size)
+
+    if _archive_limits is not None and archive_kind(path) is not None:
+        yield from _iter_archive(path, patterns)
+        return
+
+    # Big files (and files with huge lines) would cost a lot to decode, so they
+    # take the bytes-level path with bounded memory
+    if size >= LARGE_FILE_SIZE:
+        regex_patterns, detector = _split_rules(patterns)
+        yield from iter_mapped_file(path, rule_matcher(regex_patterns, binary=True), detector)
+        return
+
+    with open(path, "rb") as f:
+        yield from _iter_lines(path, f, patterns)
+
+def iter_bytes(path, data, patterns=None):
+    """Yield the findings of a file whose contents were already read into memory."""
+    stats = current_stats()
+    if stats is not None:
+        stats.count("files")
+        stats.count("bytes", len(data))
+    if _archive_limits is not None and archive_kind(path) is not None:
+        yield from _iter_archive(path, patterns, data)
+        return
+    yield from _iter_lines(path, io.BytesIO(data), patterns)
+
+def _iter_archive(path, patterns, data=None):
+    """Yield the findings of the members of an archive, streamed out of it."""
+    def scan_member(member_path, stream):
+        # Members come already sniffed, as forward-only streams
+        return _iter_lines(member_path, stream, patterns, sniffed=True)
+    return iter_archive(path, scan_member, _archive_limits, data)
+
+def _iter_lines(path, f, patterns, sniffed=False):
+    """Yield the findings of a binary file object, decoded and matched line by line.
+
+    `sniffed` means the caller already ruled out binary content.
+    """
+    # All rules are compiled once into a single combined regex, so every line is
+    # scanned in one pass no matter how many rules there are. A keyword
+    # prefilter skips the regexes entirely on lines without any rule keyword
+    patterns, detector = _split_rules(patterns)
+    matcher = rule_matcher(patterns)
+    guarded = _rule_guard is not None
+
+    # Binary files can't hold a useful finding - one sniff of the first
+    # block saves decoding and matching all of them
+    if not sniffed:
+        if looks_binary(f.read(SNIFF_SIZE)):
+            return
+        f.seek(0)
+    # Lines end at "\n" only, like the bytes-level scan of large files sees
+    # them: universal newlines would also break at a lone "\r" (old Mac
+    # endings) and number the same file differently on either side of
+    # LARGE_FILE_SIZE. A "\r\n" line keeps its "\r" until the value is stripped
+    lines = io.TextIOWrapper(f, errors="ignore", newline="\n")
+    read_block = _read_block
+    stats = current_stats()
+    if stats is not None:
+        # The file is read as it is decoded, so this includes the reads
+        read_block = stats.timed("decode", _read_block)
+    lineno = 1
+    while True:
+        block = read_block(lines)
+        if not block:
+            return
+        entropy_hits = _block_entropy_hits(detector, block) if detector is not None else {}
+        for offset, line in enumerate(block):
+            hits = matcher.match_line(line)
+            if guarded and matcher.skipped:
+                note_skips(path, lineno + offset, matcher)
+            if offset in entropy_hits:
+                hits = add_entropy_hit(hits, entropy_hits[offset])
+            if not hits:
+                continue
+            # A compact slotted RECORD per finding; the rules that hit the
+            # same line share one copy of its text. Only the line ending goes:
+            # the spans are columns of the line
+            value = line.rstrip()
+            for secret_type, start, end in hits:
+                yield FindingRecord(path, lineno + offset, secret_type, value, start, end)
+        lineno += len(block)
+
+def _read_block(lines):
+    """Read and decode the next block of lines."""
+    return list(itertools.islice(lines, BLOCK_LINES))
+
+def _block_entropy_hits(detector, block):
+    """Return line offset -> span of the first high-entropy token, for a block of lines."""
+    # One detector call for the whole block, so tokens are scored in batches
+    starts = list(itertools.accumulate(map(len, block), initial=0))
+    hits = {}
+    for start, end in detector.find("".join(block)):
+        offset = bisect.bisect_right(starts, start) - 1
+        if offset not in hits:
+            hits[offset] = (start - starts[offset], end - starts[offset])
+    return hits
+
+def _iter_one(path, cache, st=None):
+    """Yield the findings of one file, through the scan cache when one is given.
+
+    `st` is the file's stat from the directory walk, if there was one.
+    """
+    if st is None:
+        if not os.path.isfile(path):
+            return iter(())
+        if cache is None:
+            return iter_file(path)
+    if cache is None:
+        return iter_file(path, size=st.st_size)
+    return iter(cache.scan(path, scan_file, st))
+
+def iter_directory(directory, jobs=1, errors=None, cache=None, path_filter=None):
+    """Recursively scan all files in a directory, yielding findings as they are found."""
+    if jobs != 1:
+        # Imported here because the parallel module builds on scan_file below
+        from src.secret_scanner.scanner.parallel import scan_directory_parallel
+        # jobs=0 means "one worker per CPU"
+        yield from scan_directory_parallel(directory, jobs or os.cpu_count(), errors, cache, path_filter)
+        return
+
+    # The walk prunes excluded directories and drops filtered files before
+    # they are opened (path_filter=None applies the default excludes). It runs
+    # in a background thread, so listing directories overlaps with matching
+    for path, st in iter_files(directory, path_filter, prefetch=WALK_PREFETCH):
+        try:
+            yield from _iter_one(path, cache, st)
+        except (OSError, UnicodeError) as exc:
+            # The file vanished or can't be read since the walk listed it -
+            # report it like the parallel scan does instead of aborting
+            if errors is None:
+                raise
+            errors.append((path, str(exc)))
+        if errors is not None:
+            # Guarded lines and archive members that were left out
+            errors.extend(take_skipped())
+
+def iter_findings(target, jobs=1, errors=None, cache=None, path_filter=None):
+    """Scan a file or directory for secrets, yielding findings as they are found."""
+    if os.path.isdir(target):
+        return iter_directory(target, jobs, errors, cache, path_filter)
+    return _iter_one(target, cache)
+
+def scan_file(path, patterns=None, size=None):
     """Scan a single file for secrets. Returns list of findings."""
     # Using a LIST to store multiple findings - lists are great for collections of similar items
-    findings = []
-    if not os.path.isfile(path):
-        return findings
-
-    with open(path, "r", errors="ignore") as f:
-        for lineno, line in enumerate(f, start=1):
-            # Using dictionary.items() to get both key and value in the loop
-            for secret_type, pattern in SECRET_PATTERNS.items():
-                if re.search(pattern, line):
-                    # Using a DICTIONARY to store structured data about each finding
-                    # Dictionaries are ideal for representing objects with named fields
-                    findings.append({
-                        "file_path": path,
-                        "line_number": lineno,
-                        "secret_type": secret_type,
-                        "secret_value": line.strip()
-                    })
-    return findings
-
-def scan_directory(directory):
+    return list(iter_file(path, patterns, size))
+
+def scan_file_hashed(path, patterns=None, size=None):
+    """Scan a single file and hash its contents from the same read.
+
+    Returns (findings, content_hash); the hash is the one cache.hash_file() gives.
+    """
+    if size is None:
+        size = os.path.getsize(path)
+    if _archive_limits is not None and archive_kind(path) is not None:
+        # Archives are streamed member by member - hashing them costs a read of its own
+        return scan_file(path, patterns, size), hash_file(path)
+
+    if size < LARGE_FILE_SIZE:
+        with open(path, "rb") as f:
+            data = f.read()
+        return list(iter_bytes(path, data, patterns)), hash_bytes(data)
+
+    stats = current_stats()
+    if stats is not None:
+        stats.count("files")
+        stats.count("bytes", size)
+    regex_patterns, detector = _split_rules(patterns)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        findings = list(iter_buffer(path, buffer, rule_matcher(regex_patterns, binary=True), detector))
+        return findings, hash_bytes(buffer)
+
+def scan_directory(directory, jobs=1, errors=None, cache=None, path_filter=None):
     """Recursively scan all files in a directory."""
-    # Using a LIST to accumulate results from multiple file scans
-    results = []
-    # os.walk returns a TUPLE for each directory it traverses: (root, dirs, files)
-    # We use _ to ignore the dirs part we don't need
-    for root, _, files in os.walk(directory):
-        for file in files:
-            # os.path.join handles path construction across different operating systems
-            file_path = os.path.join(root, file)
-            # Using list.extend() to add multiple items from scan_file to our results
-            results.extend(scan_file(file_path))
-    return results
-
-def scan_target(target):
+    return list(iter_directory(directory, jobs, errors, cache, path_filter))
+
+def scan_target(target, jobs=1, errors=None, cache=None, path_filter=None):
     """Scan a file or directory for secrets."""
     # Simple conditional that returns different data structures based on input type
-    if os.path.isdir(target):
-        return scan_directory(target)
-    return scan_file(target)
\ No newline at end of file
+    return list(iter_findings(target, jobs, errors, cache, path_filter))
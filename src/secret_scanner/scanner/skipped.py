@@ -0,0 +1,25 @@
+# -------------------
+# Skipped content
+# -------------------
+# Parts of a file the scan had to leave out - a line a guarded rule gave up
+# on, an archive member over the size limits - are recorded here as (path,
+# reason) instead of being dropped silently. Whoever reports errors collects
+# them: the directory scan after every file, workers with every batch, and the
+# CLI at the end of a scan.
+
+# Recorded in this process and not collected yet
+_skipped = []
+
+
+def note_skipped(path, reason):
+    """Record that part of `path` wasn't scanned, and why."""
+    _skipped.append((path, reason))
+
+
+def take_skipped():
+    """Return the skipped content recorded so far and forget it."""
+    if not _skipped:
+        return []
+    taken = _skipped[:]
+    del _skipped[:len(taken)]
+    return taken
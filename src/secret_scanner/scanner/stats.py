@@ -0,0 +1,218 @@
+import threading
+import time
+
+from src.secret_scanner.scanner.redos import RuleBudgetExceeded
+
+# -------------------
+# Scan statistics
+# -------------------
+# `scan --stats` answers "where does the time go?": wall time per stage (walk,
+# read, decode, match, entropy, db), files/bytes/lines processed and, per
+# rule, how often its regex was tried, how often it hit and how long it took.
+#
+# Collection is switched on for the whole process with enable_stats(). While
+# it is off, current_stats() returns None and every hook in the scanner is a
+# single `is None` check per file or per batch - the hot loops are never
+# touched. While it is on, the matcher and entropy detector are wrapped in
+# timing proxies. Worker processes collect into their own ScanStats and send
+# snapshot() dictionaries back to the parent, which merge()s them.
+
+# The active collector, None while statistics are off
+_current = None
+
+
+def enable_stats():
+    """Start collecting statistics afresh in this process and return the collector."""
+    # Always a new collector: a forked worker must not report the numbers it
+    # inherited from its parent a second time
+    global _current
+    _current = ScanStats()
+    return _current
+
+
+def disable_stats():
+    """Stop collecting statistics."""
+    global _current
+    _current = None
+
+
+def current_stats():
+    """Return the active ScanStats, or None while statistics are off."""
+    return _current
+
+
+class ScanStats:
+    """Counters and timers of one scan (thread safe - the walk runs in a thread)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}    # stage -> [seconds, calls]
+        self.counters = {}  # "files", "bytes", "lines", ... -> count
+        self.rules = {}     # rule name -> [attempts, hits, seconds]
+
+    def add_stage(self, stage, seconds, calls=1):
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += calls
+
+    def count(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def add_rule(self, name, attempts=0, hits=0, seconds=0.0):
+        with self._lock:
+            entry = self.rules.setdefault(name, [0, 0, 0.0])
+            entry[0] += attempts
+            entry[1] += hits
+            entry[2] += seconds
+
+    def timed(self, stage, function):
+        """Wrap a function so every call is timed as `stage`."""
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add_stage(stage, time.perf_counter() - started)
+        return call
+
+    def timed_iter(self, stage, iterator):
+        """Yield from an iterator, timing the work done to produce each item as `stage`."""
+        iterator = iter(iterator)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_stage(stage, time.perf_counter() - started, 0)
+                return
+            self.add_stage(stage, time.perf_counter() - started)
+            yield item
+
+    def snapshot(self, reset=False):
+        """Return the statistics as a JSON-ready dictionary (and start over if `reset`)."""
+        with self._lock:
+            data = {
+                "stages": {name: {"seconds": s, "calls": c} for name, (s, c) in self.stages.items()},
+                "counters": dict(self.counters),
+                "rules": {
+                    name: {"attempts": a, "hits": h, "seconds": s}
+                    for name, (a, h, s) in self.rules.items()
+                },
+            }
+            if reset:
+                self.stages, self.counters, self.rules = {}, {}, {}
+        return data
+
+    def merge(self, data):
+        """Add a snapshot (from a worker process) to these statistics."""
+        if not data:
+            return
+        for name, stage in data["stages"].items():
+            self.add_stage(name, stage["seconds"], stage["calls"])
+        for name, amount in data["counters"].items():
+            self.count(name, amount)
+        for name, rule in data["rules"].items():
+            self.add_rule(name, rule["attempts"], rule["hits"], rule["seconds"])
+
+
+def worker_snapshot():
+    """In a worker process: the statistics gathered since the last call, or None."""
+    return _current.snapshot(reset=True) if _current is not None else None
+
+
+class TimedMatcher:
+    """Matcher proxy that times match_line() and every rule's own regex."""
+
+    def __init__(self, matcher, stats):
+        self._matcher = matcher
+        self._stats = stats
+        self.names = matcher.names
+        self.binary = matcher.binary
+        self.prefilter = matcher.prefilter
+        self.skipped = matcher.skipped
+        self.disabled = matcher.disabled
+
+    def match_line(self, line):
+        stats = self._stats
+        started = time.perf_counter()
+        hits = self._matcher.match_line(line)
+        stats.add_stage("match", time.perf_counter() - started)
+        stats.count("lines")
+
+        # The combined regex runs all candidate rules at once, so a rule's own
+        # cost is measured by running its regex on its own (outside the stage
+        # time). Lines the prefilter rules out cost no rule anything
+        candidates = self._matcher.prefilter.candidates(line)
+        if not candidates:
+            stats.count("lines skipped by prefilter")
+        for index in candidates:
+            started = time.perf_counter()
+            try:
+                self._matcher.compiled[index].search(line)
+            except RuleBudgetExceeded:
+                pass  # a guarded rule over its budget - match_line() reported it
+            stats.add_rule(self.names[index], attempts=1, seconds=time.perf_counter() - started)
+        for name, _, _ in hits:
+            stats.add_rule(name, hits=1)
+        return hits
+
+    def searchers(self, buffer):
+        started = time.perf_counter()
+        try:
+            return self._matcher.searchers(buffer)
+        finally:
+            self._stats.add_stage("match", time.perf_counter() - started)
+
+
+class TimedDetector:
+    """EntropyDetector proxy that reports its time as one more rule."""
+
+    def __init__(self, detector, stats, rule):
+        self._detector = detector
+        self._stats = stats
+        self._rule = rule
+
+    def describe(self):
+        return self._detector.describe()
+
+    def find(self, text):
+        started = time.perf_counter()
+        spans = self._detector.find(text)
+        seconds = time.perf_counter() - started
+        self._stats.add_stage("entropy", seconds)
+        self._stats.add_rule(self._rule, attempts=1, hits=len(spans), seconds=seconds)
+        return spans
+
+
+def format_table(data, wall=None):
+    """Return the summary table of a snapshot, as a list of lines."""
+    lines = []
+    counters = data["counters"]
+    if wall is not None:
+        lines.append(f"Wall time: {wall:.3f} s")
+    size = counters.get("bytes", 0)
+    summary = f"Files: {counters.get('files', 0):,}   Bytes: {size:,}"
+    if wall:
+        summary += f"   ({counters.get('files', 0) / wall:,.0f} files/s, {size / 1e6 / wall:,.2f} MB/s)"
+    lines.append(summary)
+    if "lines" in counters:
+        lines.append(f"Lines matched: {counters['lines']:,} "
+                     f"({counters.get('lines skipped by prefilter', 0):,} skipped by the prefilter)")
+
+    lines.append("")
+    lines.append(f"{'Stage':<12}{'seconds':>10}{'calls':>12}")
+    # Stages run concurrently (walk and reads in threads, matching in workers),
+    # so they can add up to more than the wall time
+    for name, stage in sorted(data["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        lines.append(f"{name:<12}{stage['seconds']:>10.3f}{stage['calls']:>12,}")
+
+    if data["rules"]:
+        lines.append("")
+        lines.append(f"{'Rule':<32}{'attempts':>10}{'hits':>8}{'seconds':>10}{'us/attempt':>12}")
+        for name, rule in sorted(data["rules"].items(), key=lambda item: -item[1]["seconds"]):
+            per_attempt = rule["seconds"] / rule["attempts"] * 1e6 if rule["attempts"] else 0.0
+            lines.append(f"{name[:31]:<32}{rule['attempts']:>10,}{rule['hits']:>8,}"
+                         f"{rule['seconds']:>10.3f}{per_attempt:>12.1f}")
+    return lines
@@ -0,0 +1,284 @@
+import os
+import queue
+import re
+import threading
+from collections import namedtuple
+
+from src.secret_scanner.scanner.stats import current_stats
+
+# -------------------
+# Directory walk with path filters
+# -------------------
+# Most of the bytes in a real checkout can never hold a useful finding: git
+# objects, node_modules, vendored minified bundles, images, databases. The walk
+# drops them BEFORE anything is opened: excluded directories are pruned as a
+# whole instead of being descended into, and files are filtered by glob before
+# they are even stat'ed, then by size. The walk is built on os.scandir and
+# passes on what it learned about each file, so nothing is stat'ed twice.
+# Binary files are caught by a cheap sniff of their first block (see
+# looks_binary) when the scanner opens them.
+
+# Excluded unless the caller passes its own list. Globs follow .gitignore rules:
+# a trailing "/" only matches directories, a "/" anywhere else anchors the glob
+# to the scan root, "*" stays inside one path component and "**" crosses them.
+# An exclude starting with "!" lets back in what an earlier one excluded (the
+# last matching glob wins), except below an excluded directory, which is never
+# entered. "\" makes the next character literal ("\!keep", "\*")
+DEFAULT_EXCLUDES = (
+    ".git/",
+    ".hg/",
+    ".svn/",
+    "node_modules/",
+    "__pycache__/",
+    ".venv/",
+    "*.min.js",
+    "*.min.css",
+)
+
+# How much of a file is sniffed to tell text from binary
+SNIFF_SIZE = 8192
+
+# The part of a file's stat the pipeline needs: size for batching and the size
+# limit, and (inode, size, mtime) for the scan cache. The field names match
+# os.stat_result, so either can be passed where a stat is expected
+FileStat = namedtuple("FileStat", "st_size st_mtime_ns st_ino")
+
+
+def looks_binary(head):
+    """Tell whether the first block of a file (bytes) looks like binary data."""
+    # Same heuristic as git and grep: text files practically never contain NUL
+    return b"\0" in head
+
+
+def _glob_to_regex(pattern):
+    """Translate one .gitignore-style glob. Returns (regex, directory_only)."""
+    directory_only = pattern.endswith("/")
+    body = pattern.rstrip("/")
+    # Without a slash (other than a trailing one) the glob matches at any depth
+    anchored = "/" in body
+    body = body.lstrip("/")
+
+    parts = []
+    i = 0
+    while i < len(body):
+        if body.startswith("**/", i):
+            parts.append("(?:.*/)?")  # zero or more whole directories
+            i += 3
+        elif body.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif body[i] == "\\" and i + 1 < len(body):
+            parts.append(re.escape(body[i + 1]))
+            i += 2
+        elif body[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif body[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif body[i] == "[" and "]" in body[i + 2:]:
+            end = body.index("]", i + 2)
+            inner = body[i + 1:end]
+            if inner.startswith("!"):
+                inner = "^" + inner[1:]
+            parts.append("[%s]" % inner.replace("\\", "\\\\"))
+            i = end + 1
+        else:
+            parts.append(re.escape(body[i]))
+            i += 1
+
+    regex = "".join(parts)
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+    return regex, directory_only
+
+
+def _compile_globs(regexes):
+    """Combine translated globs into one regex, or None when there are none."""
+    if not regexes:
+        return None
+    return re.compile("|".join("(?:%s)" % regex for regex in regexes))
+
+
+class PathFilter:
+    """Decides which directories to prune and which files to scan during a walk.
+
+    Paths are relative to the scan root and use "/" as the separator.
+    """
+
+    def __init__(self, includes=(), excludes=DEFAULT_EXCLUDES, max_file_size=None):
+        self.includes = tuple(includes)
+        self.excludes = tuple(excludes)
+        self.max_file_size = max_file_size
+
+        # All globs of a kind are combined into ONE regex, so every path costs a
+        # single match no matter how many globs there are
+        dir_excludes = []
+        file_excludes = []
+        # With "!" globs the order matters: (regex, negated, directory_only)
+        # for every exclude, checked one by one from the last
+        self._ordered_excludes = None
+        ordered = []
+        for pattern in self.excludes:
+            negated = pattern.startswith("!")
+            regex, directory_only = _glob_to_regex(pattern[1:] if negated else pattern)
+            ordered.append((re.compile(regex), negated, directory_only))
+            dir_excludes.append(regex)
+            if not directory_only:
+                file_excludes.append(regex)
+        if any(negated for _, negated, _ in ordered):
+            self._ordered_excludes = ordered[::-1]
+        self._dir_excludes = _compile_globs(dir_excludes)
+        self._file_excludes = _compile_globs(file_excludes)
+
+        # An include also matches everything below a matching directory, so
+        # "src/" or "config" let every file under them through
+        file_includes = []
+        for pattern in self.includes:
+            regex, directory_only = _glob_to_regex(pattern)
+            file_includes.append(regex + ("/.*" if directory_only else "(?:/.*)?"))
+        self._file_includes = _compile_globs(file_includes)
+        # Directory -> pruned (itself or a parent), for paths that don't come
+        # from a walk (git history, diffs) and are checked one by one
+        self._pruned = {"": False}
+
+    def _excluded(self, relpath, is_dir):
+        """Apply the excludes in order: the last one that matches decides."""
+        for regex, negated, directory_only in self._ordered_excludes:
+            if (is_dir or not directory_only) and regex.fullmatch(relpath):
+                return not negated
+        return False
+
+    def excludes_dir(self, relpath):
+        """Tell whether a directory (and everything below it) is skipped."""
+        if self._ordered_excludes is not None:
+            return self._excluded(relpath, True)
+        return self._dir_excludes is not None and self._dir_excludes.fullmatch(relpath) is not None
+
+    def includes_file(self, relpath):
+        """Tell whether a file's path lets it through the globs."""
+        if self._ordered_excludes is not None:
+            if self._excluded(relpath, False):
+                return False
+        elif self._file_excludes is not None and self._file_excludes.fullmatch(relpath):
+            return False
+        if self._file_includes is not None and not self._file_includes.fullmatch(relpath):
+            return False
+        return True
+
+    def wants(self, relpath):
+        """Tell whether a file the walk didn't hand out would be scanned by its path."""
+        return not self._prunes(relpath.rpartition("/")[0]) and self.includes_file(relpath)
+
+    def _prunes(self, directory):
+        pruned = self._pruned.get(directory)
+        if pruned is None:
+            parent = directory.rpartition("/")[0]
+            pruned = self._prunes(parent) or self.excludes_dir(directory)
+            self._pruned[directory] = pruned
+        return pruned
+
+    def within_size(self, st):
+        """Tell whether a file is small enough to scan (unknown sizes are)."""
+        return self.max_file_size is None or st is None or st.st_size <= self.max_file_size
+
+
+def _walk(directory, path_filter):
+    """Yield (path, FileStat or None) for the files below a directory, depth first."""
+    # os.scandir reads the file type along with each name, so telling files
+    # from directories costs no syscall at all, and the one stat per file done
+    # here is handed down the pipeline instead of being repeated by the scanner
+    stack = [(directory, "")]
+    while stack:
+        root, relroot = stack.pop()
+        try:
+            with os.scandir(root) as it:
+                entries = list(it)
+        except OSError:
+            continue  # unreadable directories are skipped, just like os.walk does
+
+        subdirs = []
+        for entry in entries:
+            relpath = relroot + entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # Symlinked directories aren't followed (os.walk's default)
+                if not entry.is_symlink() and not path_filter.excludes_dir(relpath):
+                    subdirs.append((entry.path, relpath + "/"))
+                continue
+
+            # Globs first - they are free, a stat is a syscall
+            if not path_filter.includes_file(relpath):
+                continue
+            try:
+                if not entry.is_file():
+                    continue  # broken links, sockets, FIFOs...
+                st = entry.stat()
+            except OSError:
+                yield entry.path, None  # still scanned, so the error gets reported
+                continue
+            st = FileStat(st.st_size, st.st_mtime_ns, st.st_ino)
+            if path_filter.within_size(st):
+                yield entry.path, st
+
+        # Reversed, so subdirectories are visited in listing order like os.walk
+        stack.extend(reversed(subdirs))
+
+
+def _prefetch(iterator, size):
+    """Run an iterator in a background thread, keeping up to `size` items ahead."""
+    items = queue.Queue(size)
+    stop = threading.Event()
+
+    def put(item):
+        # Give up (returning False) once the consumer has gone away
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put((True, item)):
+                    return
+            put((False, None))
+        except BaseException as exc:  # handed over to the consumer
+            put((False, exc))
+
+    thread = threading.Thread(target=produce, name="secret-scanner-walk", daemon=True)
+    thread.start()
+    try:
+        while True:
+            ok, item = items.get()
+            if not ok:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def iter_files(directory, path_filter=None, prefetch=0):
+    """Walk a directory, yielding (path, FileStat) for every file that passes the filter.
+
+    With prefetch > 0 the walk runs in a background thread up to that many
+    files ahead, so enumeration overlaps with scanning.
+    """
+    if path_filter is None:
+        path_filter = PathFilter()
+    files = _walk(directory, path_filter)
+    stats = current_stats()
+    if stats is not None:
+        # Timed before the prefetch thread, so this is the enumeration itself
+        files = stats.timed_iter("walk", files)
+    if prefetch > 0:
+        files = _prefetch(files, prefetch)
+    return files
@@ -0,0 +1,222 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+
+from src.secret_scanner.scanner.walk import PathFilter, iter_files
+
+# -------------------
+# Filesystem change watching
+# -------------------
+# The scan daemon keeps every file's findings in memory and only rescans what
+# changed since the last request. A watcher answers "which paths changed?":
+#
+#   - InotifyWatcher (Linux) has the kernel queue an event for every write,
+#     create, delete and rename below the root, so asking costs one
+#     non-blocking read(). Events are queued as soon as a write returns, so an
+#     editor's save is always seen by the request that follows it.
+#   - PollingWatcher is the fallback everywhere else (and when the inotify
+#     watch limit is reached): it re-walks the tree and compares each file's
+#     (inode, size, mtime) with the previous walk. No file is opened.
+#
+# Both return a set of paths. A path that is no longer a file was deleted (or
+# is a directory that was removed or moved away, along with everything below).
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+# What a directory watch listens for: content changes and entries coming and going
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+# struct inotify_event: wd, mask, cookie, len - followed by `len` bytes of name
+_EVENT = struct.Struct("iIII")
+
+# Bytes read from the inotify descriptor at a time
+READ_SIZE = 64 * 1024
+
+
+class WatchUnavailable(Exception):
+    """inotify can't watch this tree (not Linux, or out of watches)."""
+
+
+def _load_inotify():
+    """Return libc with the inotify functions, or None where there are none."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    except (OSError, AttributeError, TypeError):
+        return None
+    return libc
+
+
+_libc = _load_inotify()
+
+
+class InotifyWatcher:
+    """Reports the files changed below a root, from inotify events."""
+
+    def __init__(self, root, path_filter=None):
+        if _libc is None:
+            raise WatchUnavailable("inotify is not available on this system")
+        self.root = root
+        self.path_filter = path_filter or PathFilter()
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise WatchUnavailable(os.strerror(ctypes.get_errno()))
+        # Watch descriptor <-> directory path; every directory has its own watch
+        self._dirs = {}
+        self._wds = {}
+        # Set after an event queue overflow: everything has to be re-checked
+        self.overflowed = False
+        try:
+            self._watch_tree(root, "")
+        except WatchUnavailable:
+            self.close()
+            raise
+
+    def _watch_tree(self, directory, relpath, found=None):
+        """Watch a directory and every directory below it that isn't excluded."""
+        stack = [(directory, relpath)]
+        while stack:
+            path, rel = stack.pop()
+            wd = _libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise WatchUnavailable("out of inotify watches (fs.inotify.max_user_watches)")
+                continue  # removed or unreadable in the meantime
+            self._dirs[wd] = path
+            self._wds[path] = wd
+            try:
+                with os.scandir(path) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                entry_rel = rel + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not self.path_filter.excludes_dir(entry_rel):
+                            stack.append((entry.path, entry_rel + "/"))
+                    elif found is not None:
+                        # Files that were already in a directory moved in
+                        found.add(entry.path)
+                except OSError:
+                    pass
+
+    def _unwatch_tree(self, path):
+        """Stop watching a directory that went away, and everything below it."""
+        prefix = path + os.sep
+        for watched in [p for p in self._wds if p == path or p.startswith(prefix)]:
+            wd = self._wds.pop(watched)
+            self._dirs.pop(wd, None)
+            _libc.inotify_rm_watch(self.fd, wd)
+
+    def fileno(self):
+        return self.fd
+
+    def changes(self):
+        """Return the set of paths changed since the last call."""
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            self._parse(data, changed)
+        return changed
+
+    def _parse(self, data, changed):
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                path = self._dirs.pop(wd, None)
+                if path is not None:
+                    self._wds.pop(path, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue  # events about a watched directory itself come via its parent
+            path = os.path.join(directory, name)
+            changed.add(path)
+            if mask & IN_ISDIR:
+                if mask & (IN_MOVED_FROM | IN_DELETE):
+                    self._unwatch_tree(path)
+                elif mask & (IN_CREATE | IN_MOVED_TO):
+                    relpath = os.path.relpath(path, self.root).replace(os.sep, "/")
+                    if not self.path_filter.excludes_dir(relpath):
+                        try:
+                            self._watch_tree(path, relpath + "/", changed)
+                        except WatchUnavailable:
+                            self.overflowed = True  # can't follow it - re-check everything
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """Reports the files changed below a root by comparing two walks."""
+
+    def __init__(self, root, path_filter=None):
+        self.root = root
+        self.path_filter = path_filter or PathFilter()
+        self.overflowed = False
+        self._seen = self._snapshot()
+
+    def _snapshot(self):
+        return {
+            path: (st.st_ino, st.st_size, st.st_mtime_ns) if st is not None else None
+            for path, st in iter_files(self.root, self.path_filter)
+        }
+
+    def fileno(self):
+        return None  # nothing to wait on, changes() does the work
+
+    def changes(self):
+        """Return the set of paths changed since the last call."""
+        seen = self._snapshot()
+        changed = {path for path, key in seen.items() if self._seen.get(path, False) != key}
+        changed.update(path for path in self._seen if path not in seen)
+        self._seen = seen
+        return changed
+
+    def close(self):
+        pass
+
+
+def watch(root, path_filter=None):
+    """Return an InotifyWatcher for the tree, or a PollingWatcher if inotify can't."""
+    try:
+        return InotifyWatcher(root, path_filter)
+    except WatchUnavailable:
+        return PollingWatcher(root, path_filter)
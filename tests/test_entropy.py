@@ -0,0 +1,98 @@
+import random
+import string
+
+import pytest
+
+from src.secret_scanner.scanner import entropy
+from src.secret_scanner.scanner.entropy import DEFAULT_THRESHOLDS, EntropyDetector, shannon_entropy
+
+BASE64 = string.ascii_letters + string.digits + "+/"
+
+
+def tokens(seed=7, count=300):
+    """Random-looking keys of every charset mixed with identifiers and padding."""
+    rng = random.Random(seed)
+    made = []
+    for n in range(count):
+        length = rng.randint(20, 70)
+        kind = n % 5
+        if kind == 0:
+            made.append("".join(rng.choice("0123456789abcdef") for _ in range(length)))
+        elif kind == 1:
+            made.append("".join(rng.choice(BASE64) for _ in range(length)) + "=" * rng.randint(0, 2))
+        elif kind == 2:
+            made.append("".join(rng.choice(string.ascii_letters + "-_") for _ in range(length)))
+        elif kind == 3:
+            # Few distinct characters: ruled out by the bound alone
+            made.append("".join(rng.choice("abcAB12") for _ in range(length)))
+        else:
+            made.append("_".join(rng.choice(["get", "user", "name", "cache", "from"]) for _ in range(8)))
+    return made
+
+
+@pytest.fixture
+def without_numpy(monkeypatch):
+    # Loaded first, or a later _load_numpy() would see it as already done
+    entropy._load_numpy()
+    monkeypatch.setattr(entropy, "numpy", None)
+
+
+def expected_spans(text, found_tokens):
+    """Spans of the tokens over their threshold, scored one by one with shannon_entropy."""
+    spans, position = [], 0
+    for token in found_tokens:
+        start = text.index(token, position)
+        position = start + len(token)
+        charset = "hex" if all(c in string.hexdigits for c in token) else "base64"
+        if shannon_entropy(token) >= DEFAULT_THRESHOLDS[charset]:
+            spans.append((start, position))
+    return spans
+
+
+def test_shannon_entropy():
+    assert shannon_entropy("") == 0.0
+    assert shannon_entropy("aaaaaaaa") == 0.0
+    assert shannon_entropy("ab" * 10) == pytest.approx(1.0)
+    assert shannon_entropy("0123456789abcdef") == pytest.approx(4.0)
+    assert shannon_entropy(b"0123456789abcdef") == shannon_entropy("0123456789abcdef")
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_pure_python_detection_matches_the_entropy_of_each_token(without_numpy, binary):
+    found_tokens = tokens()
+    text = "\n".join(f'value{n} = "{token}"' for n, token in enumerate(found_tokens))
+    spans = EntropyDetector().find(text.encode("ascii") if binary else text)
+    assert spans == expected_spans(text, found_tokens)
+    # The sample has tokens on both sides of the thresholds
+    assert 0 < len(spans) < len(found_tokens)
+
+
+def test_short_tokens_and_custom_thresholds(without_numpy):
+    key = "7Fq2Lm9Xv4Rt8Kp1Zs6Wy3Hb"
+    assert EntropyDetector().find(f"x = {key}") == [(4, 4 + len(key))]
+    assert EntropyDetector(min_length=len(key) + 1).find(f"x = {key}") == []
+    assert EntropyDetector({"base64": 6.0}).find(f"x = {key}") == []
+
+
+def test_numpy_scores_match_pure_python():
+    numpy = pytest.importorskip("numpy")
+    entropy._load_numpy()
+    found_tokens = [token.encode("ascii") for token in tokens()]
+    entropies, is_hex = entropy._entropies_numpy(found_tokens, b"".join(found_tokens))
+    assert entropies.tolist() == pytest.approx([shannon_entropy(token) for token in found_tokens])
+    assert is_hex.tolist() == [all(c in string.hexdigits.encode() for c in token) for token in found_tokens]
+    assert isinstance(entropies, numpy.ndarray)
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_numpy_and_pure_python_find_the_same_spans(monkeypatch, binary):
+    pytest.importorskip("numpy")
+    entropy._load_numpy()
+    # Scored across several batches
+    monkeypatch.setattr(entropy, "BATCH_TOKENS", 64)
+    text = "\n".join(f"k{n}: {token}" for n, token in enumerate(tokens(seed=11)))
+    text = text.encode("ascii") if binary else text
+    with_numpy = EntropyDetector().find(text)
+    monkeypatch.setattr(entropy, "numpy", None)
+    assert with_numpy == EntropyDetector().find(text)
+    assert with_numpy
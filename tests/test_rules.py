@@ -0,0 +1,105 @@
+import json
+import os
+
+import pytest
+
+from src.secret_scanner.scanner import rules
+from src.secret_scanner.scanner.rules import RulePackError, load_rule_pack, pack_hash
+from src.secret_scanner.scanner.scanner import SECRET_PATTERNS, scan_file, use_rule_packs
+
+PACK = {"rules": [{"id": "Acme Token", "regex": "acme_[0-9a-f]{16}", "allowlist": ["acme_0{16}"]}]}
+
+
+@pytest.fixture
+def pack(tmp_path):
+    path = tmp_path / "acme.json"
+    path.write_text(json.dumps(PACK))
+    return path
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return tmp_path / "cache"
+
+
+def cached_files(cache_dir):
+    return sorted(os.listdir(cache_dir)) if cache_dir.exists() else []
+
+
+def test_a_pack_is_validated_once_and_then_read_from_the_cache(pack, cache_dir, monkeypatch):
+    first = load_rule_pack(str(pack), str(cache_dir))
+    assert [rule["id"] for rule in first] == ["Acme Token"]
+    assert first[0]["keywords"] == ["acme_"]
+    assert cached_files(cache_dir) == [pack_hash(pack.read_bytes()) + ".json"]
+
+    def not_again(*args):
+        raise AssertionError("the pack was parsed again")
+    monkeypatch.setattr(rules, "_parse", not_again)
+    assert load_rule_pack(str(pack), str(cache_dir)) == first
+
+
+def test_a_changed_pack_is_loaded_afresh(pack, cache_dir, monkeypatch):
+    load_rule_pack(str(pack), str(cache_dir))
+    changed = {"rules": [{"id": "Acme Token", "regex": "acme_[0-9A-F]{32}"}]}
+    pack.write_text(json.dumps(changed))
+    loaded = load_rule_pack(str(pack), str(cache_dir))
+    assert loaded[0]["regex"] == "acme_[0-9A-F]{32}"
+    assert loaded[0]["allowlist"] == []
+    assert len(cached_files(cache_dir)) == 2
+
+    # A new cache format invalidates every entry as well
+    monkeypatch.setattr(rules, "RULE_CACHE_VERSION", rules.RULE_CACHE_VERSION + 1)
+    load_rule_pack(str(pack), str(cache_dir))
+    assert len(cached_files(cache_dir)) == 3
+
+
+def test_a_damaged_cache_entry_is_rebuilt(pack, cache_dir):
+    expected = load_rule_pack(str(pack), str(cache_dir))
+    (entry,) = cached_files(cache_dir)
+    (cache_dir / entry).write_text('[{"id": "Acme')
+    assert load_rule_pack(str(pack), str(cache_dir)) == expected
+    assert json.loads((cache_dir / entry).read_text()) == expected
+
+
+def test_an_unwritable_cache_only_costs_speed(pack, tmp_path):
+    blocked = tmp_path / "not-a-directory"
+    blocked.write_text("")
+    assert load_rule_pack(str(pack), str(blocked / "rules"))[0]["id"] == "Acme Token"
+    assert load_rule_pack(str(pack), None)[0]["id"] == "Acme Token"
+
+
+def test_toml_and_json_packs_load_alike(pack, tmp_path):
+    if rules._tomllib() is None:
+        pytest.skip("tomli is not installed")
+    toml = tmp_path / "acme.toml"
+    toml.write_text('[[rules]]\nid = "Acme Token"\nregex = "acme_[0-9a-f]{16}"\nallowlist = ["acme_0{16}"]\n')
+    assert load_rule_pack(str(toml), None) == load_rule_pack(str(pack), None)
+
+
+@pytest.mark.parametrize("pack_rules, message", [
+    ([{"id": "A", "regex": "a("}], "invalid regex"),
+    ([{"id": "A", "regex": "a"}, {"id": "A", "regex": "b"}], "used twice"),
+    ([{"id": "A", "regex": "a", "regexp": "b"}], "unknown keys regexp"),
+    ([{"id": "A", "regex": "a", "entropy": -1}], "'entropy' must be"),
+])
+def test_invalid_packs_are_rejected(tmp_path, pack_rules, message):
+    path = tmp_path / "bad.json"
+    path.write_text(json.dumps({"rules": pack_rules}))
+    with pytest.raises(RulePackError, match=message):
+        load_rule_pack(str(path), str(tmp_path / "cache"))
+    assert not (tmp_path / "cache").exists()
+
+
+def test_active_pack_rules_are_scanned_for(pack, cache_dir, tmp_path):
+    source = tmp_path / "app.py"
+    source.write_text('token = "acme_0123456789abcdef"\nplaceholder = "acme_0000000000000000"\n')
+    try:
+        use_rule_packs([str(pack)], cache_dir=str(cache_dir))
+        assert "AWS Access Key" in SECRET_PATTERNS
+        found = [(f.line_number, f.secret_type) for f in scan_file(str(source))]
+        use_rule_packs([str(pack)], builtin=False, cache_dir=str(cache_dir))
+        assert list(SECRET_PATTERNS) == ["Acme Token"]
+    finally:
+        use_rule_packs([])
+    assert found == [(1, "Acme Token")]
+    assert "Acme Token" not in SECRET_PATTERNS
@@ -0,0 +1,210 @@
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+import pytest
+
+from src.secret_scanner.scanner import walk
+from src.secret_scanner.scanner.walk import PathFilter, iter_files
+
+# (exclude globs, path relative to the scan root, is a directory, excluded)
+# following .gitignore: https://git-scm.com/docs/gitignore#_pattern_format
+GITIGNORE = [
+    # No slash: a name at any depth, file or directory
+    (["debug.log"], "debug.log", False, True),
+    (["debug.log"], "logs/debug.log", False, True),
+    (["logs"], "build/logs", True, True),
+    (["*.log"], "a/b/trace.log", False, True),
+    (["*.log"], "trace.log.txt", False, False),
+    # A leading or middle slash anchors to the root
+    (["/debug.log"], "debug.log", False, True),
+    (["/debug.log"], "logs/debug.log", False, False),
+    (["logs/debug.log"], "logs/debug.log", False, True),
+    (["logs/debug.log"], "build/logs/debug.log", False, False),
+    (["a*/b"], "ab/b", False, True),
+    (["a*/b"], "x/ab/b", False, False),
+    # A trailing slash matches directories only
+    (["logs/"], "logs", True, True),
+    (["logs/"], "src/logs", True, True),
+    (["logs/"], "logs", False, False),
+    # "*" and "?" stay inside one component
+    (["*"], "a/b", False, True),
+    (["src/*.py"], "src/app.py", False, True),
+    (["src/*.py"], "src/pkg/app.py", False, False),
+    (["debug?.log"], "debug0.log", False, True),
+    (["debug?.log"], "debug10.log", False, False),
+    (["debug?.log"], "debug/.log", False, False),
+    # "**" crosses directories
+    (["**/logs"], "logs", True, True),
+    (["**/logs"], "deep/down/logs", True, True),
+    (["**/logs/debug.log"], "build/logs/debug.log", False, True),
+    (["**/logs/debug.log"], "logs/build/debug.log", False, False),
+    (["logs/**/debug.log"], "logs/debug.log", False, True),
+    (["logs/**/debug.log"], "logs/a/b/debug.log", False, True),
+    (["logs/**"], "logs/a/debug.log", False, True),
+    (["logs/**"], "logs", True, False),
+    # Character classes, negated with "!"
+    (["debug[0-9].log"], "debug7.log", False, True),
+    (["debug[0-9].log"], "debugx.log", False, False),
+    (["debug[!01].log"], "debug2.log", False, True),
+    (["debug[!01].log"], "debug1.log", False, False),
+    # A backslash makes the next character literal
+    (["\\*.txt"], "*.txt", False, True),
+    (["\\*.txt"], "notes.txt", False, False),
+    (["\\!keep"], "!keep", False, True),
+    # "!" lets back in what an earlier glob excluded - the last match wins
+    (["*.log", "!important.log"], "debug.log", False, True),
+    (["*.log", "!important.log"], "important.log", False, False),
+    (["*.log", "!important.log"], "logs/important.log", False, False),
+    (["!important.log", "*.log"], "important.log", False, True),
+    (["build/", "!build/"], "build", True, False),
+    (["*.log", "!logs/"], "logs/debug.log", False, True),
+]
+
+
+def excluded(globs, path, is_dir):
+    path_filter = PathFilter(excludes=globs)
+    return path_filter.excludes_dir(path) if is_dir else not path_filter.includes_file(path)
+
+
+@pytest.mark.parametrize("globs, path, is_dir, expected", GITIGNORE)
+def test_globs_follow_gitignore(globs, path, is_dir, expected):
+    assert excluded(globs, path, is_dir) == expected
+
+
+def test_files_below_an_excluded_directory_cannot_be_let_back_in():
+    path_filter = PathFilter(excludes=["logs/", "!logs/important.log"])
+    assert path_filter.includes_file("logs/important.log")  # the glob alone would
+    assert not path_filter.wants("logs/important.log")      # but the directory is never entered
+    assert not path_filter.wants("logs/deep/trace.txt")
+
+
+@pytest.mark.parametrize("includes, path, expected", [
+    (["*.py"], "src/app.py", True),
+    (["*.py"], "src/app.js", False),
+    (["src/"], "src/deep/app.js", True),
+    (["src/"], "lib/src", False),
+    (["config"], "config/prod.env", True),
+    (["/config"], "app/config/prod.env", False),
+])
+def test_includes_let_through_matching_files_and_everything_below_matching_directories(
+        includes, path, expected):
+    assert PathFilter(includes=includes).includes_file(path) == expected
+
+
+def test_default_excludes():
+    path_filter = PathFilter()
+    assert path_filter.excludes_dir(".git")
+    assert path_filter.excludes_dir("web/node_modules")
+    assert not path_filter.includes_file("static/app.min.js")
+    assert path_filter.includes_file("static/app.js")
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+@pytest.mark.parametrize("globs, path, is_dir, expected", GITIGNORE)
+def test_the_table_agrees_with_git(tmp_path, globs, path, is_dir, expected):
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    (tmp_path / ".gitignore").write_text("\n".join(globs) + "\n")
+    target = tmp_path / path
+    if is_dir:
+        target.mkdir(parents=True)
+    else:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text("")
+    ignored = subprocess.run(["git", "-C", str(tmp_path), "check-ignore", "-q", "--no-index", path])
+    assert (ignored.returncode == 0) == expected
+
+
+# -------------------
+# The walk itself
+# -------------------
+
+def make_tree(root, paths):
+    for path in paths:
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text("x\n")
+
+
+def walked(root, **kwargs):
+    return [os.path.relpath(path, root).replace(os.sep, "/") for path, _ in iter_files(str(root), **kwargs)]
+
+
+@pytest.mark.parametrize("prefetch", [0, 3])
+def test_walk_order_matches_os_walk(tmp_path, prefetch):
+    make_tree(tmp_path, ["b.txt", "a/1.txt", "a/z/2.txt", "c/3.txt", "a/0.txt", "d.txt"])
+    expected = [os.path.relpath(os.path.join(root, name), tmp_path).replace(os.sep, "/")
+                for root, _, files in os.walk(tmp_path) for name in files]
+    assert walked(tmp_path, prefetch=prefetch) == expected
+
+
+def test_stats_come_with_the_files(tmp_path):
+    make_tree(tmp_path, ["a.txt"])
+    (path, st), = iter_files(str(tmp_path))
+    assert (st.st_size, st.st_ino) == (os.stat(path).st_size, os.stat(path).st_ino)
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="no symlinks here")
+def test_symlinks(tmp_path):
+    make_tree(tmp_path, ["real/secret.env", "file.txt"])
+    try:
+        os.symlink(tmp_path / "real", tmp_path / "linked_dir")
+    except OSError:
+        pytest.skip("symlinks can't be created here")
+    os.symlink(tmp_path / "file.txt", tmp_path / "linked_file.txt")
+    os.symlink(tmp_path / "missing", tmp_path / "broken")
+    # Linked directories aren't followed, linked files are scanned, broken links skipped
+    assert sorted(walked(tmp_path)) == ["file.txt", "linked_file.txt", "real/secret.env"]
+
+
+def test_unreadable_directories_are_skipped(tmp_path, monkeypatch):
+    make_tree(tmp_path, ["ok/a.txt", "locked/b.txt", "c.txt"])
+    scandir = os.scandir
+
+    def guarded(path):
+        if os.path.basename(path) == "locked":
+            raise PermissionError(13, "Permission denied", path)
+        return scandir(path)
+    monkeypatch.setattr(os, "scandir", guarded)
+    assert sorted(walked(tmp_path)) == ["c.txt", "ok/a.txt"]
+
+
+def test_walk_errors_reach_the_consumer(tmp_path, monkeypatch):
+    make_tree(tmp_path, ["a.txt"])
+
+    def broken(directory, path_filter):
+        yield os.path.join(directory, "a.txt"), None
+        raise RuntimeError("walk failed")
+    monkeypatch.setattr(walk, "_walk", broken)
+    files = iter_files(str(tmp_path), prefetch=2)
+    assert next(files)[1] is None
+    with pytest.raises(RuntimeError, match="walk failed"):
+        next(files)
+
+
+def walk_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "secret-scanner-walk"]
+
+
+def wait_for_no_walk_threads():
+    deadline = time.monotonic() + 5
+    while walk_threads() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return walk_threads()
+
+
+@pytest.mark.parametrize("stop", ["close", "drop"])
+def test_prefetch_thread_ends_when_the_consumer_stops_early(tmp_path, stop):
+    make_tree(tmp_path, [f"d{n}/f{m}.txt" for n in range(20) for m in range(20)])
+    assert wait_for_no_walk_threads() == []
+    files = iter_files(str(tmp_path), prefetch=2)
+    for _ in files:
+        break
+    # The walk is far from done: its thread sits on a full queue
+    assert walk_threads()
+    if stop == "close":
+        files.close()
+    else:
+        del files
+    assert wait_for_no_walk_threads() == []